@@ -1,6 +1,37 @@
 import numpy as np
 import math
 from data import BodyPart
+from data import keypoints_array
+
+# Joint triplets (first point, vertex, end point) of the angles used for yoga
+# pose detection. The neck angle is added in ANGLE_INDICES below.
+ANGLE_DEFINITIONS = [
+    ('left_elbow', (BodyPart.LEFT_SHOULDER, BodyPart.LEFT_ELBOW, BodyPart.LEFT_WRIST)),
+    ('right_elbow', (BodyPart.RIGHT_SHOULDER, BodyPart.RIGHT_ELBOW, BodyPart.RIGHT_WRIST)),
+    ('left_shoulder', (BodyPart.LEFT_ELBOW, BodyPart.LEFT_SHOULDER, BodyPart.LEFT_HIP)),
+    ('right_shoulder', (BodyPart.RIGHT_ELBOW, BodyPart.RIGHT_SHOULDER, BodyPart.RIGHT_HIP)),
+    ('left_hip', (BodyPart.LEFT_SHOULDER, BodyPart.LEFT_HIP, BodyPart.LEFT_KNEE)),
+    ('right_hip', (BodyPart.RIGHT_SHOULDER, BodyPart.RIGHT_HIP, BodyPart.RIGHT_KNEE)),
+    ('left_knee', (BodyPart.LEFT_HIP, BodyPart.LEFT_KNEE, BodyPart.LEFT_ANKLE)),
+    ('right_knee', (BodyPart.RIGHT_HIP, BodyPart.RIGHT_KNEE, BodyPart.RIGHT_ANKLE)),
+]
+
+
+def _angle_between(a, b, c):
+    """Angle in degrees at vertex b for three [x, y] numpy arrays."""
+    # Calculate vectors
+    ba = a - b
+    bc = c - b
+
+    # Calculate dot product
+    cosine_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc))
+
+    # Handle numerical errors to keep cosine_angle between -1 and 1
+    cosine_angle = np.clip(cosine_angle, -1.0, 1.0)
+
+    # Calculate angle in degrees
+    return np.arccos(cosine_angle) * 180 / np.pi
+
 
 def calculate_angle(pointA, pointB, pointC):
     """
@@ -18,91 +49,70 @@ def calculate_angle(pointA, pointB, pointC):
     a = np.array([pointA.x, pointA.y])
     b = np.array([pointB.x, pointB.y])
     c = np.array([pointC.x, pointC.y])
-    
-    # Calculate vectors
-    ba = a - b
-    bc = c - b
-    
-    # Calculate dot product
-    cosine_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc))
-    
-    # Handle numerical errors to keep cosine_angle between -1 and 1
-    cosine_angle = np.clip(cosine_angle, -1.0, 1.0)
-    
-    # Calculate angle in degrees
-    angle = np.arccos(cosine_angle) * 180 / np.pi
-    
-    return angle
+    return _angle_between(a, b, c)
+
+
+# Order of the angle features, as used by the classifiers
+ANGLE_KEYS = [name for name, _ in ANGLE_DEFINITIONS] + ['neck']
+
+# Index of the shoulder midpoint appended to the keypoints as an 18th row,
+# which is the vertex of the neck angle
+_NECK_MIDPOINT = len(BodyPart)
+
+# [9, 3] (start, vertex, end) keypoint rows of every angle in ANGLE_KEYS order
+ANGLE_INDICES = np.array(
+    [[joint.value for joint in joints] for _, joints in ANGLE_DEFINITIONS] +
+    [[BodyPart.LEFT_SHOULDER.value, _NECK_MIDPOINT, BodyPart.RIGHT_SHOULDER.value]],
+    dtype=np.intp)
+
+
+def angles_from_keypoints(keypoints, confidence_threshold=0.2, dtype=np.float32):
+    """
+    Calculate all angles of one pose or a batch of poses at once.
+
+    Args:
+        keypoints: [17, 3] or [N, 17, 3] (x, y, score) keypoints.
+        confidence_threshold: Angles with a joint scored below this are 0.
+        dtype: Output dtype. The angles are computed in float64 either way.
+
+    Returns:
+        numpy.ndarray: [9] or [N, 9] angles in degrees, in ANGLE_KEYS order.
+    """
+    keypoints = np.asarray(keypoints)
+    coordinates = keypoints[..., :2].astype(np.float64)
+    visible = keypoints[..., 2] >= confidence_threshold
+
+    # Append the shoulder midpoint, visible when both shoulders are
+    left, right = BodyPart.LEFT_SHOULDER.value, BodyPart.RIGHT_SHOULDER.value
+    midpoint = (coordinates[..., left, :] + coordinates[..., right, :]) / 2
+    coordinates = np.concatenate([coordinates, midpoint[..., np.newaxis, :]], axis=-2)
+    visible = np.concatenate(
+        [visible, (visible[..., left] & visible[..., right])[..., np.newaxis]], axis=-1)
+
+    # [..., 9, 3, 2] joint triplets and [..., 9] masks
+    triplets = coordinates[..., ANGLE_INDICES, :]
+    mask = visible[..., ANGLE_INDICES].all(axis=-1)
+
+    ba = triplets[..., 0, :] - triplets[..., 1, :]
+    bc = triplets[..., 2, :] - triplets[..., 1, :]
+    # Coincident joints give NaN, as with calculate_angle
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cosine_angle = np.einsum('...i,...i->...', ba, bc) / (
+            np.sqrt(np.einsum('...i,...i->...', ba, ba)) *
+            np.sqrt(np.einsum('...i,...i->...', bc, bc)))
+    angles = np.arccos(np.clip(cosine_angle, -1.0, 1.0)) * 180 / np.pi
+    return np.where(mask, angles, 0).astype(dtype)
+
 
 def extract_angles_from_person(person):
     """
     Extract important angles for yoga pose detection from a Person object.
     
     Args:
-        person: A Person object containing keypoints from MoveNet.
+        person: A Person or PoseArray containing keypoints from MoveNet.
     
     Returns:
-        Dictionary of angles
+        Dictionary of angles, 0 where keypoints are missing
     """
-    # Dictionary to store keypoints by body part for easier access
-    keypoints_dict = {keypoint.body_part: keypoint for keypoint in person.keypoints}
-
-    angles = {}
-    confidence_threshold = 0.2  # Ensure keypoints have sufficient confidence
-    
-    # Define the angles we want to calculate (joint triplets)
-    angle_definitions = [
-        {'name': 'left_elbow', 'points': [BodyPart.LEFT_SHOULDER, BodyPart.LEFT_ELBOW, BodyPart.LEFT_WRIST]},
-        {'name': 'right_elbow', 'points': [BodyPart.RIGHT_SHOULDER, BodyPart.RIGHT_ELBOW, BodyPart.RIGHT_WRIST]},
-        {'name': 'left_shoulder', 'points': [BodyPart.LEFT_ELBOW, BodyPart.LEFT_SHOULDER, BodyPart.LEFT_HIP]},
-        {'name': 'right_shoulder', 'points': [BodyPart.RIGHT_ELBOW, BodyPart.RIGHT_SHOULDER, BodyPart.RIGHT_HIP]},
-        {'name': 'left_hip', 'points': [BodyPart.LEFT_SHOULDER, BodyPart.LEFT_HIP, BodyPart.LEFT_KNEE]},
-        {'name': 'right_hip', 'points': [BodyPart.RIGHT_SHOULDER, BodyPart.RIGHT_HIP, BodyPart.RIGHT_KNEE]},
-        {'name': 'left_knee', 'points': [BodyPart.LEFT_HIP, BodyPart.LEFT_KNEE, BodyPart.LEFT_ANKLE]},
-        {'name': 'right_knee', 'points': [BodyPart.RIGHT_HIP, BodyPart.RIGHT_KNEE, BodyPart.RIGHT_ANKLE]}
-    ]
-    
-    # Calculate each angle if all required keypoints exist with good confidence
-    for angle_def in angle_definitions:
-        name = angle_def['name']
-        points = angle_def['points']
-        
-        if all(point in keypoints_dict and keypoints_dict[point].score >= confidence_threshold for point in points):
-            angles[name] = calculate_angle(
-                keypoints_dict[points[0]].coordinate,
-                keypoints_dict[points[1]].coordinate,
-                keypoints_dict[points[2]].coordinate
-            )
-        else:
-            angles[name] = 0  # Default to 0 if keypoints are missing
-
-    # ✅ **Corrected Neck Angle Calculation**
-    if (
-        BodyPart.LEFT_SHOULDER in keypoints_dict and keypoints_dict[BodyPart.LEFT_SHOULDER].score >= confidence_threshold and
-        BodyPart.RIGHT_SHOULDER in keypoints_dict and keypoints_dict[BodyPart.RIGHT_SHOULDER].score >= confidence_threshold
-    ):
-        # Calculate midpoint of shoulders as the neck reference
-        left_shoulder = keypoints_dict[BodyPart.LEFT_SHOULDER].coordinate
-        right_shoulder = keypoints_dict[BodyPart.RIGHT_SHOULDER].coordinate
-        
-        # Create a virtual midpoint class
-        class VirtualPoint:
-            def __init__(self, x, y):
-                self.x = x
-                self.y = y
-        
-        neck_midpoint = VirtualPoint(
-            (left_shoulder.x + right_shoulder.x) / 2,
-            (left_shoulder.y + right_shoulder.y) / 2
-        )
-        
-        # Compute the neck angle
-        angles['neck'] = calculate_angle(
-            left_shoulder,
-            neck_midpoint,  # Neck reference point
-            right_shoulder
-        )
-    else:
-        angles['neck'] = 0  # Default if keypoints are missing
-
-    return angles
\ No newline at end of file
+    angles = angles_from_keypoints(keypoints_array(person), dtype=np.float64)
+    return dict(zip(ANGLE_KEYS, angles))
@@ -0,0 +1,162 @@
+"""Micro-benchmark of the MoveNet crop region tracker.
+
+Compares the vectorised crop region logic in movenet.py against the previous
+per-joint Python loops on random keypoints.
+
+Usage:
+    python benchmark_crop_region.py [--iterations N]
+"""
+import argparse
+import timeit
+
+import numpy as np
+
+from data import BodyPart
+from movenet import Movenet
+
+MIN_CROP_KEYPOINT_SCORE = 0.2
+TORSO_EXPANSION_RATIO = 3.0
+BODY_EXPANSION_RATIO = 2.5
+
+
+def legacy_init_crop_region(image_height, image_width):
+    """Previous full-frame crop region (unchanged in movenet.py)."""
+    if image_width > image_height:
+        x_min, box_width = 0.0, 1.0
+        y_min = (image_height / 2 - image_width / 2) / image_height
+        box_height = image_width / image_height
+    else:
+        y_min, box_height = 0.0, 1.0
+        x_min = (image_width / 2 - image_height / 2) / image_width
+        box_width = image_height / image_width
+    return {'y_min': y_min, 'x_min': x_min, 'y_max': y_min + box_height,
+            'x_max': x_min + box_width, 'height': box_height, 'width': box_width}
+
+
+def legacy_torso_visible(keypoints):
+    """Previous scalar torso visibility check."""
+    def visible(part):
+        return keypoints[part.value, 2] > MIN_CROP_KEYPOINT_SCORE
+    return ((visible(BodyPart.LEFT_HIP) or visible(BodyPart.RIGHT_HIP)) and
+            (visible(BodyPart.LEFT_SHOULDER) or visible(BodyPart.RIGHT_SHOULDER))) or \
+        visible(BodyPart.LEFT_WRIST) or visible(BodyPart.RIGHT_WRIST)
+
+
+def legacy_determine_crop_region(keypoints, image_height, image_width):
+    """Previous dict-of-lists crop region computation.
+
+    The body range loop uses the current joint rather than the stale torso
+    joint, so both implementations return the same crop region.
+    """
+    target_keypoints = {}
+    for idx in range(len(BodyPart)):
+        target_keypoints[BodyPart(idx)] = [
+            keypoints[idx, 0] * image_height, keypoints[idx, 1] * image_width
+        ]
+
+    if not legacy_torso_visible(keypoints):
+        return legacy_init_crop_region(image_height, image_width)
+
+    center_y = (target_keypoints[BodyPart.LEFT_HIP][0] +
+                target_keypoints[BodyPart.RIGHT_HIP][0]) / 2
+    center_x = (target_keypoints[BodyPart.LEFT_HIP][1] +
+                target_keypoints[BodyPart.RIGHT_HIP][1]) / 2
+
+    torso_joints = [BodyPart.LEFT_SHOULDER, BodyPart.RIGHT_SHOULDER,
+                    BodyPart.LEFT_HIP, BodyPart.RIGHT_HIP]
+    max_torso_yrange = max_torso_xrange = 0.0
+    for joint in torso_joints:
+        max_torso_yrange = max(max_torso_yrange,
+                               abs(center_y - target_keypoints[joint][0]))
+        max_torso_xrange = max(max_torso_xrange,
+                               abs(center_x - target_keypoints[joint][1]))
+
+    max_body_yrange = max_body_xrange = 0.0
+    for idx in range(len(BodyPart)):
+        if keypoints[BodyPart(idx).value, 2] < MIN_CROP_KEYPOINT_SCORE:
+            continue
+        joint = BodyPart(idx)
+        max_body_yrange = max(max_body_yrange,
+                              abs(center_y - target_keypoints[joint][0]))
+        max_body_xrange = max(max_body_xrange,
+                              abs(center_x - target_keypoints[joint][1]))
+
+    crop_length_half = np.amax([
+        max_torso_xrange * TORSO_EXPANSION_RATIO + 0.2,
+        max_torso_yrange * TORSO_EXPANSION_RATIO + 0.2,
+        max_body_yrange * BODY_EXPANSION_RATIO + 0.2,
+        max_body_xrange * BODY_EXPANSION_RATIO + 0.2
+    ])
+    distances_to_border = np.array(
+        [center_x, image_width - center_x, center_y, image_height - center_y])
+    crop_length_half = np.amin([crop_length_half, np.amax(distances_to_border)])
+    if crop_length_half > max(image_width, image_height) / 2:
+        return legacy_init_crop_region(image_height, image_width)
+    crop_length = crop_length_half * 2
+    y_min = (center_y - crop_length_half) / image_height
+    x_min = (center_x - crop_length_half) / image_width
+    return {'y_min': y_min, 'x_min': x_min,
+            'y_max': y_min + crop_length / image_height,
+            'x_max': x_min + crop_length / image_width,
+            'height': crop_length / image_height,
+            'width': crop_length / image_width}
+
+
+def legacy_to_image_coordinates(keypoints, crop_region):
+    """Previous 17-step coordinate remap."""
+    for idx in range(len(BodyPart)):
+        keypoints[idx, 0] = crop_region['y_min'] + crop_region['height'] * keypoints[idx, 0]
+        keypoints[idx, 1] = crop_region['x_min'] + crop_region['width'] * keypoints[idx, 1]
+    return keypoints
+
+
+def make_tracker(crop_smoothing=0.0):
+    """Creates a Movenet instance with only the crop tracker state set up.
+
+    The tracker methods do not touch the interpreter, so no model is needed.
+    """
+    tracker = Movenet.__new__(Movenet)
+    tracker._crop_smoothing = crop_smoothing
+    return tracker
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    image_height, image_width = 480, 640
+    rng = np.random.default_rng(0)
+    samples = rng.uniform(0.2, 0.8, size=(64, len(BodyPart), 3)).astype(np.float32)
+    tracker = make_tracker()
+    smoothed_tracker = make_tracker(crop_smoothing=0.5)
+    crop_region = legacy_init_crop_region(image_height, image_width)
+
+    def run_legacy():
+        for keypoints in samples:
+            legacy_to_image_coordinates(keypoints.copy(), crop_region)
+            legacy_determine_crop_region(keypoints, image_height, image_width)
+
+    def run_vectorised():
+        for keypoints in samples:
+            tracker._to_image_coordinates(keypoints.copy(), crop_region)
+            tracker._determine_crop_region(keypoints, image_height, image_width)
+
+    def run_smoothed():
+        previous = crop_region
+        for keypoints in samples:
+            smoothed_tracker._to_image_coordinates(keypoints.copy(), crop_region)
+            previous = smoothed_tracker._determine_crop_region(
+                keypoints, image_height, image_width, previous)
+
+    number = max(1, args.iterations // len(samples))
+    frames = number * len(samples)
+    for name, func in [('legacy loops', run_legacy),
+                       ('vectorised', run_vectorised),
+                       ('vectorised + smoothing', run_smoothed)]:
+        seconds = min(timeit.repeat(func, number=number, repeat=3))
+        print(f"{name:>24}: {seconds / frames * 1e6:8.2f} us/frame")
+
+
+if __name__ == '__main__':
+    main()
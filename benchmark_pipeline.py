@@ -0,0 +1,157 @@
+"""Headless benchmark of the pose pipeline on recorded or synthetic frames.
+
+Runs the MoveNet -> classifier -> feedback -> render path of the pose
+execution window without Tk, from any frame source. With --realtime the
+source is paced at its frame rate and the threaded Pipeline drops frames
+like it does with a webcam; otherwise every frame is processed in order as
+fast as possible, so two runs on the same recording are comparable.
+
+Usage:
+    python benchmark_pipeline.py session.mp4 --pose Vrksasana [--realtime]
+    python benchmark_pipeline.py ./session_frames --frames 500
+    python benchmark_pipeline.py synthetic --model movenet_lightning.tflite
+    python benchmark_pipeline.py class.mp4 --multipose --model movenet_multipose.tflite
+
+With --multipose every tracked person is classified and gets their own
+feedback, as for a studio class in front of one camera.
+"""
+import argparse
+import os
+import time
+
+from data import has_keypoints
+from feedback import FeedbackStabilizer
+from feedback import TrackedFeedback
+from frame_source import open_source
+from keypoint_filter import PoseFilter
+from movenet import Movenet
+from movenet import PoseOverlay
+from movenet import draw_pose
+from movenet_multipose import MovenetMultiPose
+from pipeline import Pipeline
+from pose_classifier import load_classifier
+from pose_thresholds import DEFAULT_THRESHOLD
+from pose_thresholds import load_thresholds
+from preprocess import PosePreprocessor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', help='Camera index, video file, image directory or "synthetic"')
+    parser.add_argument('--model', default='movenet_thunder.tflite', help='MoveNet TFLite model')
+    parser.add_argument('--pose', default='Vrksasana', help='Pose to classify and give feedback for')
+    parser.add_argument('--models', default='./pose_models', help='Directory of the pose classifiers')
+    parser.add_argument('--detect-every', type=int, default=3, help='MoveNet runs every N frames on holds')
+    parser.add_argument('--frames', type=int, default=None, help='Stop after this many frames')
+    parser.add_argument('--realtime', action='store_true', help='Pace the source at its frame rate')
+    parser.add_argument('--multipose', action='store_true',
+                        help='--model is a MultiPose model, give feedback per tracked person')
+    args = parser.parse_args()
+
+    if args.multipose:
+        multipose = MovenetMultiPose(args.model, bgr_input=True)
+    else:
+        pose_filter = PoseFilter(Movenet(args.model, bgr_input=True), detect_every=args.detect_every)
+    preprocessor = PosePreprocessor()
+    stabilizer = FeedbackStabilizer()
+    overlay = PoseOverlay()
+    classifier_path = os.path.join(args.models, args.pose.lower(), 'model.h5')
+    classifier = load_classifier(classifier_path) if os.path.exists(classifier_path) else None
+    if classifier is None:
+        print(f"No classifier at {classifier_path}, every pose counts as incorrect")
+    threshold = load_thresholds().get(args.pose, DEFAULT_THRESHOLD)
+
+    totals = {'frames': 0, 'poses': 0, 'correct': 0, 'feedback changes': 0}
+
+    def classify(pose):
+        keypoints_input, angles_input, angles = preprocessor.features_from_pose(pose)
+        correct = False
+        if classifier is not None:
+            correct = classifier.predict([keypoints_input, angles_input])[0][0] > threshold
+        return bool(correct), angles
+
+    tracked_feedback = TrackedFeedback(classify)
+
+    def process(frame):
+        pose = pose_filter.detect(frame)
+        if not has_keypoints(pose):
+            state, changed = stabilizer.no_pose()
+        else:
+            correct, angles = classify(pose)
+            state, changed = stabilizer.update(args.pose, angles, correct)
+            totals['poses'] += 1
+            totals['correct'] += correct
+        totals['frames'] += 1
+        totals['feedback changes'] += changed
+        return frame, pose, state
+
+    def process_multipose(frame):
+        persons = multipose.detect(frame)
+        results = tracked_feedback.update(args.pose, persons, multipose.track_ids)
+        totals['frames'] += 1
+        totals['poses'] += len(persons)
+        totals['correct'] += sum(state.pose_correct for state, _ in results.values())
+        totals['feedback changes'] += sum(changed for _, changed in results.values())
+        return frame, persons, results
+
+    def render(result):
+        frame, pose, state = result
+        return overlay.draw(frame, pose, state.pose_correct, state.highlighted)
+
+    def render_multipose(result):
+        frame, persons, results = result
+        for person in persons:
+            state, _ = results[person.id]
+            draw_pose(frame, person, state.pose_correct, state.highlighted)
+        return frame
+
+    if args.multipose:
+        process, render = process_multipose, render_multipose
+
+    source = open_source(args.source, realtime=args.realtime)
+    if not source.open():
+        parser.error(f"Could not open {args.source}")
+
+    start = time.perf_counter()
+    try:
+        if args.realtime:
+            pipeline = Pipeline(source.read, process, render)
+            pipeline.start()
+            while pipeline.running and (args.frames is None or pipeline.displayed < args.frames):
+                pipeline.poll()
+                time.sleep(0.005)
+            pipeline.stop()
+            if pipeline.displayed:
+                print(pipeline.report())
+        else:
+            stage_seconds = {'read': 0.0, 'process': 0.0, 'render': 0.0}
+            while args.frames is None or totals['frames'] < args.frames:
+                t0 = time.perf_counter()
+                ret, frame, _ = source.read()
+                if not ret:
+                    break
+                t1 = time.perf_counter()
+                result = process(frame)
+                t2 = time.perf_counter()
+                render(result)
+                t3 = time.perf_counter()
+                stage_seconds['read'] += t1 - t0
+                stage_seconds['process'] += t2 - t1
+                stage_seconds['render'] += t3 - t2
+            frames = max(totals['frames'], 1)
+            print(", ".join(f"{name} {seconds / frames * 1000:.2f} ms"
+                            for name, seconds in stage_seconds.items()))
+    finally:
+        source.release()
+
+    elapsed = time.perf_counter() - start
+    stats = source.stats()
+    detection_ratio = 1.0 if args.multipose else pose_filter.detection_ratio
+    print(f"{totals['frames']} frames in {elapsed:.1f}s ({totals['frames'] / elapsed:.1f} FPS), "
+          f"MoveNet on {detection_ratio:.0%} of them; source {stats.width}x{stats.height}, "
+          f"{stats.dropped} dropped, {stats.duplicated} duplicated")
+    print(", ".join(f"{name}: {count}" for name, count in totals.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -69,12 +69,165 @@ class Person(NamedTuple):
   id: int = None
 
 
+class PoseArray(object):
+  """A pose backed by a single [17, 3] float32 array.
+
+  Each row holds the (x, y, score) of the keypoint whose BodyPart value is the
+  row index, with x and y in image pixels. `pose[BodyPart.LEFT_HIP]` returns a
+  row in O(1). The `keypoints` property builds the same List[KeyPoint] a
+  Person has, on first access only, so code written for Person keeps working.
+  """
+
+  __slots__ = ('data', 'bounding_box', 'score', 'id', '_keypoints')
+
+  def __init__(self,
+               data: np.ndarray,
+               bounding_box: Rectangle,
+               score: float,
+               id: int = None) -> None:  # pylint: disable=redefined-builtin
+    self.data = data
+    self.bounding_box = bounding_box
+    self.score = score
+    self.id = id
+    self._keypoints = None
+
+  def __getitem__(self, body_part) -> np.ndarray:
+    """Returns the (x, y, score) row of a BodyPart or keypoint index."""
+    if isinstance(body_part, BodyPart):
+      body_part = body_part.value
+    return self.data[body_part]
+
+  def __len__(self) -> int:
+    return self.data.shape[0]
+
+  @property
+  def coordinates(self) -> np.ndarray:
+    """A [17, 2] view of the keypoint (x, y) pixel coordinates."""
+    return self.data[:, :2]
+
+  @property
+  def scores(self) -> np.ndarray:
+    """A [17] view of the keypoint scores."""
+    return self.data[:, 2]
+
+  @property
+  def keypoints(self) -> List[KeyPoint]:
+    """Compatibility view of the keypoints as in Person.keypoints."""
+    if self._keypoints is None:
+      self._keypoints = [
+          KeyPoint(BodyPart(i), Point(int(x), int(y)), score)
+          for i, (x, y, score) in enumerate(self.data)
+      ]
+    return self._keypoints
+
+  def _replace(self, **kwargs) -> 'PoseArray':
+    """Returns a copy with some fields replaced, like NamedTuple._replace."""
+    fields = {
+        'data': self.data,
+        'bounding_box': self.bounding_box,
+        'score': self.score,
+        'id': self.id
+    }
+    fields.update(kwargs)
+    return PoseArray(**fields)
+
+  def to_person(self) -> Person:
+    """Converts to a Person NamedTuple."""
+    return Person(self.keypoints, self.bounding_box, self.score, self.id)
+
+  def __repr__(self) -> str:
+    return 'PoseArray(score={}, id={}, bounding_box={})'.format(
+        self.score, self.id, self.bounding_box)
+
+
+def has_keypoints(pose) -> bool:
+  """Whether `pose` is a detected pose with keypoints.
+
+  Unlike hasattr(pose, 'keypoints'), this does not build the keypoint list
+  of a PoseArray.
+  """
+  if pose is None:
+    return False
+  if isinstance(pose, PoseArray):
+    return True
+  return hasattr(pose, 'keypoints')
+
+
+def keypoints_array(person) -> np.ndarray:
+  """Returns the [17, 3] (x, y, score) pixel keypoint array of a pose.
+
+  This is the array itself for a PoseArray and a new array for a Person.
+  """
+  if isinstance(person, PoseArray):
+    return person.data
+  return np.array([[kp.coordinate.x, kp.coordinate.y, kp.score]
+                   for kp in person.keypoints],
+                  dtype=np.float32)
+
+
+def pose_from_keypoint_array(keypoints: np.ndarray,
+                             keypoint_score_threshold: float = 0.1,
+                             id: int = None) -> PoseArray:  # pylint: disable=redefined-builtin
+  """Creates a PoseArray from a [17, 3] array of pixel (x, y, score).
+
+  Args:
+    keypoints: Keypoints in image pixels. The array is used as is when it is
+      already float32.
+    keypoint_score_threshold: Only use keypoints with above this threshold to
+      calculate the person average score.
+    id: Optional track id.
+
+  Returns:
+    A PoseArray instance.
+  """
+  keypoints = np.asarray(keypoints, dtype=np.float32)
+  mins = keypoints[:, :2].min(axis=0)
+  maxs = keypoints[:, :2].max(axis=0)
+  bounding_box = Rectangle(
+      Point(int(mins[0]), int(mins[1])), Point(int(maxs[0]), int(maxs[1])))
+
+  # Calculate person score by averaging keypoint scores.
+  scores = keypoints[:, 2]
+  above_threshold = scores > keypoint_score_threshold
+  person_score = scores[above_threshold].mean() if above_threshold.any(
+  ) else np.float32(np.nan)
+
+  return PoseArray(keypoints, bounding_box, person_score, id)
+
+
+def keypoints_to_pixels(keypoints_with_scores: np.ndarray,
+                        image_height: float,
+                        image_width: float,
+                        out: np.ndarray = None) -> np.ndarray:
+  """Converts [17, 3] model output to pixel (x, y, score) keypoints.
+
+  Args:
+    keypoints_with_scores: Rows of normalized [y, x, score].
+    image_height: height of the image in pixels.
+    image_width: width of the image in pixels.
+    out: Optional float32 [17, 3] array to write the result into.
+
+  Returns:
+    The float32 pixel keypoints.
+  """
+  if out is None:
+    out = np.empty((keypoints_with_scores.shape[0], 3), dtype=np.float32)
+
+  # Convert keypoints to the input image coordinate system. Coordinates are
+  # truncated to whole pixels like the Point values of a Person.
+  np.multiply(keypoints_with_scores[:, 1], image_width, out=out[:, 0])
+  np.multiply(keypoints_with_scores[:, 0], image_height, out=out[:, 1])
+  np.trunc(out[:, :2], out=out[:, :2])
+  out[:, 2] = keypoints_with_scores[:, 2]
+  return out
+
+
 def person_from_keypoints_with_scores(
     keypoints_with_scores: np.ndarray,
     image_height: float,
     image_width: float,
-    keypoint_score_threshold: float = 0.1) -> Person:
-  """Creates a Person instance from single pose estimation model output.
+    keypoint_score_threshold: float = 0.1) -> PoseArray:
+  """Creates a pose instance from single pose estimation model output.
 
   Args:
     keypoints_with_scores: Output of the TFLite pose estimation model. A numpy
@@ -85,35 +238,11 @@ def person_from_keypoints_with_scores(
       calculate the person average score.
 
   Returns:
-    A Person instance.
+    A PoseArray instance, which can be used wherever a Person is expected.
   """
-
-  kpts_x = keypoints_with_scores[:, 1]
-  kpts_y = keypoints_with_scores[:, 0]
-  scores = keypoints_with_scores[:, 2]
-
-  # Convert keypoints to the input image coordinate system.
-  keypoints = []
-  for i in range(scores.shape[0]):
-    keypoints.append(
-        KeyPoint(
-            BodyPart(i),
-            Point(int(kpts_x[i] * image_width), int(kpts_y[i] * image_height)),
-            scores[i]))
-
-  # Calculate bounding box as SinglePose models don't return bounding box.
-  start_point = Point(
-      int(np.amin(kpts_x) * image_width), int(np.amin(kpts_y) * image_height))
-  end_point = Point(
-      int(np.amax(kpts_x) * image_width), int(np.amax(kpts_y) * image_height))
-  bounding_box = Rectangle(start_point, end_point)
-
-  # Calculate person score by averaging keypoint scores.
-  scores_above_threshold = list(
-      filter(lambda x: x > keypoint_score_threshold, scores))
-  person_score = np.average(scores_above_threshold)
-
-  return Person(keypoints, bounding_box, person_score)
+  keypoints = keypoints_to_pixels(keypoints_with_scores, image_height,
+                                  image_width)
+  return pose_from_keypoint_array(keypoints, keypoint_score_threshold)
 
 
 class Category(NamedTuple):
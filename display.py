@@ -0,0 +1,104 @@
+"""Tk video display that reuses its buffers and a single PhotoImage.
+
+The render stage resizes every frame into a preallocated buffer at display
+resolution, where the overlays are drawn, and converts it to RGB into one of
+a few preallocated output buffers. On the Tk main thread, `show` copies the
+newest buffer into a persistent PIL image and pastes it into the one
+PhotoImage of the label, so no image is allocated per frame.
+"""
+import threading
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+from PIL import Image
+from PIL import ImageTk
+
+
+class DisplayFrame(NamedTuple):
+    """A rendered frame waiting in one of the output buffers."""
+    buffer: int
+    sequence: int
+
+
+class TkVideoDisplay:
+    """Display sink of the pipeline for a Tk label.
+
+    Args:
+        label: Tk label showing the video. Create the display on the main thread.
+        width, height: Display size in pixels, fixed for the display.
+        buffers: Number of output buffers. Rendering never writes to the
+            buffer being shown, and a frame whose buffer was reused before
+            it was shown is dropped.
+    """
+
+    def __init__(self, label, width, height, buffers=3):
+        self.label = label
+        self.size = (int(width), int(height))
+        shape = (self.size[1], self.size[0], 3)
+        # Only touched by the render stage
+        self._resized = np.empty(shape, dtype=np.uint8)
+        self._buffers = [np.empty(shape, dtype=np.uint8) for _ in range(buffers)]
+        self._sequences = [0] * buffers
+        self._next = 0
+        self._showing = None
+        self._lock = threading.Lock()
+        # Only touched by the main thread
+        self._image = Image.new("RGB", self.size)
+        self._photo = ImageTk.PhotoImage(self._image)
+        self._attached = False
+        self.shown = 0
+        self.dropped = 0
+
+    def resize(self, frame):
+        """Resizes a BGR frame into the display buffer and returns the buffer.
+
+        Draw the overlays into it before calling `render`.
+        """
+        return cv2.resize(frame, self.size, dst=self._resized)
+
+    def render(self):
+        """Converts the display buffer to RGB into a free output buffer.
+
+        Returns:
+            DisplayFrame to pass to `show` on the main thread.
+        """
+        with self._lock:
+            index = self._next
+            if index == self._showing:
+                index = (index + 1) % len(self._buffers)
+            self._next = (index + 1) % len(self._buffers)
+            # Invalidates a frame still waiting in this buffer
+            self._sequences[index] += 1
+            sequence = self._sequences[index]
+        cv2.cvtColor(self._resized, cv2.COLOR_BGR2RGB, dst=self._buffers[index])
+        return DisplayFrame(index, sequence)
+
+    def show(self, frame):
+        """Pastes a rendered frame into the label, on the Tk main thread.
+
+        Returns:
+            False when the frame was dropped because its buffer was reused.
+        """
+        with self._lock:
+            if self._sequences[frame.buffer] != frame.sequence:
+                self.dropped += 1
+                return False
+            self._showing = frame.buffer
+        try:
+            self._image.frombytes(self._buffers[frame.buffer])
+        finally:
+            with self._lock:
+                self._showing = None
+        self._photo.paste(self._image)
+        if not self._attached:
+            self.label.configure(image=self._photo)
+            self.label.image = self._photo
+            self._attached = True
+        self.shown += 1
+        return True
+
+    def clear(self):
+        """Removes the video from the label, until the next `show`."""
+        self.label.configure(image='')
+        self._attached = False
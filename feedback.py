@@ -1,643 +1,540 @@
 # feedback.py
+"""
+Pose feedback as a declarative rule table.
 
-def feedback_adhomukhasvanasana(angles):
-    """
-    Feedback for Adhomukhasvanasana (Downward-Facing Dog).
-    angles: Dictionary containing key angles.
-    Returns:
-        - feedback_messages: List with a single feedback instruction or 'Perfect pose!'
-        - highlighted_keypoints: Set of keypoints to highlight.
-    """
-    feedback_items = []
-    highlighted_keypoints = set()
-
-    left_shoulder = angles.get('left_shoulder', 0)
-    right_shoulder = angles.get('right_shoulder', 0)
-    left_hip = angles.get('left_hip', 0)
-    right_hip = angles.get('right_hip', 0)
-    left_knee = angles.get('left_knee', 0)
-    right_knee = angles.get('right_knee', 0)
-
-    # Shoulder angle: ideally open between 110°–130° (arms aligned with spine)
-    if not (110 <= left_shoulder <= 130):
-        deviation = abs(120 - left_shoulder)
-        message = "Relax left shoulder and lengthen spine."
-        feedback_items.append((message, 'left_shoulder', deviation))
-
-    if not (110 <= right_shoulder <= 130):
-        deviation = abs(120 - right_shoulder)
-        message = "Relax right shoulder and lengthen spine."
-        feedback_items.append((message, 'right_shoulder', deviation))
-
-    # Hips: should be high (angle at hip around 90°)
-    if not (70 <= left_hip <= 90):
-        deviation = abs(90 - left_hip)
-        message = "Push your hips up and back."
-        feedback_items.append((message, 'left_hip', deviation))
-
-    if not (70 <= right_hip <= 90):
-        deviation = abs(90 - right_hip)
-        message = "Push your hips up and back."
-        feedback_items.append((message, 'right_hip', deviation))
-    
-    # Knees: ideally straight (angle 170°–180°)
-    if not (170 <= left_knee <= 180):
-        deviation = abs(175 - left_knee)
-        message = "Try to straighten your left leg."
-        feedback_items.append((message, 'left_knee', deviation))
-        
-    if not (170 <= right_knee <= 180):
-        deviation = abs(175 - right_knee)
-        message = "Try to straighten your right leg."
-        feedback_items.append((message, 'right_knee', deviation))
-
-    # Perfect pose check
-    if not feedback_items:
-        return ["Perfect pose!"], set()
-
-    # Take top feedback by deviation
-    feedback_items.sort(key=lambda x: x[2], reverse=True)
-    top_item = feedback_items[0]
-
-    feedback_messages = [top_item[0]]
-    highlighted_keypoints = {top_item[1]}
-
-    return feedback_messages, highlighted_keypoints
-
-def feedback_virabhadrasana(angles):
-    """
-    Feedback for Virabhadrasana (Warrior Pose).
-    angles: Dictionary containing key angles.
-    Returns:
-        - feedback_messages: Single feedback instruction.
-        - highlighted_keypoints: Set of keypoints to highlight.
-    """
-    feedback_items = []
-    highlighted_keypoints = set()
-
-    left_knee = angles.get('left_knee', 0)
-    right_knee = angles.get('right_knee', 0)
-    left_shoulder = angles.get('left_shoulder', 0)
-    right_shoulder = angles.get('right_shoulder', 0)
-
-    # Legs (front and back)
-    if not (85 <= left_knee <= 95):
-        deviation = abs(90 - left_knee)
-        message = "Bend your left knee to form a right angle." if left_knee < 85 else "Don't extend your left leg too much."
-        feedback_items.append((message, 'left_knee', deviation))
-
-    if not (170 <= right_knee <= 180):
-        deviation = abs(175 - right_knee)
-        message = "Keep your back leg straight and strong."
-        feedback_items.append((message, 'right_knee', deviation))
-
-    # Arms (shoulder extension)
-    if not (160 <= left_shoulder <= 180):
-        deviation = abs(170 - left_shoulder)
-        message = "Stretch your left arm fully in line with your shoulders."
-        feedback_items.append((message, 'left_shoulder', deviation))
-
-    if not (160 <= right_shoulder <= 180):
-        deviation = abs(170 - right_shoulder)
-        message = "Stretch your right arm fully in line with your shoulders."
-        feedback_items.append((message, 'right_shoulder', deviation))
-
-    # Sort and select top feedback based on max deviation
-    if not feedback_items:
-        return [], set()
-
-    feedback_items.sort(key=lambda x: x[2], reverse=True)
-    top_item = feedback_items[0]
-
-    return [top_item[0]], {top_item[1]}
-
-def feedback_bhujangasana(angles):
-    """
-    Feedback for Bhujangasana (Cobra Pose).
-    angles: Dictionary containing key angles.
-    Returns:
-        - feedback_messages: Single feedback instruction.
-        - highlighted_keypoints: Set of keypoints to highlight.
-    """
-    feedback_items = []
-    highlighted_keypoints = set()
-
-    left_elbow = angles.get('left_elbow', 0)
-    right_elbow = angles.get('right_elbow', 0)
-    neck = angles.get('neck', 0)  # Simulating spinal extension
-    left_knee = angles.get('left_knee', 0)
-    right_knee = angles.get('right_knee', 0)
-
-    # Arms (elbows)
-    if not (150 <= left_elbow <= 170):
-        deviation = abs(160 - left_elbow)
-        message = "Straighten your left arm to lift your upper body."
-        feedback_items.append((message, 'left_elbow', deviation))
-
-    if not (150 <= right_elbow <= 170):
-        deviation = abs(160 - right_elbow)
-        message = "Straighten your right arm to lift your upper body."
-        feedback_items.append((message, 'right_elbow', deviation))
-
-    # Spine (using neck angle)
-    if not (160 <= neck <= 180):
-        deviation = abs(170 - neck)
-        message = "Arch your spine and lift your chest higher."
-        feedback_items.append((message, 'neck', deviation))
-
-    # Legs (knees should be straight)
-    if not (170 <= left_knee <= 180):
-        deviation = abs(175 - left_knee)
-        message = "Keep your left leg extended and firm on the mat."
-        feedback_items.append((message, 'left_knee', deviation))
-
-    if not (170 <= right_knee <= 180):
-        deviation = abs(175 - right_knee)
-        message = "Keep your right leg extended and firm on the mat."
-        feedback_items.append((message, 'right_knee', deviation))
-
-    # Prioritize top 1 feedback
-    feedback_items.sort(key=lambda x: x[2], reverse=True)
-    top_item = feedback_items[0]
-
-    return [top_item[0]], {top_item[1]}
-
-
-def feedback_trikonasana(angles):
-    """
-    Feedback for Trikonasana (Triangle Pose).
-    angles: Dictionary containing key angles.
-    Returns:
-        - feedback_messages: Single feedback instruction.
-        - highlighted_keypoints: Set of keypoints to highlight.
-    """
-    feedback_items = []
-    highlighted_keypoints = set()
-
-    left_knee = angles.get('left_knee', 0)
-    right_knee = angles.get('right_knee', 0)
-    left_hip = angles.get('left_hip', 0)
-    right_hip = angles.get('right_hip', 0)
-    left_shoulder = angles.get('left_shoulder', 0)
-    right_shoulder = angles.get('right_shoulder', 0)
-
-    # Legs straight
-    if not (170 <= left_knee <= 180):
-        deviation = abs(175 - left_knee)
-        message = "Straighten your left leg."
-        feedback_items.append((message, 'left_knee', deviation))
-
-    if not (170 <= right_knee <= 180):
-        deviation = abs(175 - right_knee)
-        message = "Straighten your right leg."
-        feedback_items.append((message, 'right_knee', deviation))
-
-    # Hips: rotation and leg distance (angle between hips)
-    if not (140 <= left_hip <= 160):
-        deviation = abs(150 - left_hip)
-        message = "Rotate your left hip more to open the body."
-        feedback_items.append((message, 'left_hip', deviation))
-
-    if not (140 <= right_hip <= 160):
-        deviation = abs(150 - right_hip)
-        message = "Rotate your right hip more to open the body."
-        feedback_items.append((message, 'right_hip', deviation))
-
-    # Shoulders: arms should align vertically
-    if not (160 <= left_shoulder <= 180):
-        deviation = abs(170 - left_shoulder)
-        message = "Raise your left arm straight above your shoulder."
-        feedback_items.append((message, 'left_shoulder', deviation))
-
-    if not (160 <= right_shoulder <= 180):
-        deviation = abs(170 - right_shoulder)
-        message = "Align your right arm vertically with the lower one."
-        feedback_items.append((message, 'right_shoulder', deviation))
-
-    # Sort and return top 1 feedback only
-    feedback_items.sort(key=lambda x: x[2], reverse=True)
-    top_item = feedback_items[0]
-
-    return [top_item[0]], {top_item[1]}
-
-def feedback_vrksasana(angles):
-    """
-    Feedback for Vrksasana (Tree Pose).
-    angles: Dictionary containing key angles.
-    Returns:
-        - feedback_messages: Single feedback instruction (highest priority).
-        - highlighted_keypoints: Set of keypoints to highlight.
-    """
-    feedback_items = []
-    leg_items = []
-    arm_items = []
-    highlighted_keypoints = set()
-
-    left_knee = angles.get('left_knee', 0)
-    right_knee = angles.get('right_knee', 0)
-    left_elbow = angles.get('left_elbow', 0)
-    right_elbow = angles.get('right_elbow', 0)
-    left_shoulder = angles.get('left_shoulder', 0)
-    right_shoulder = angles.get('right_shoulder', 0)
-
-    # ----- LEG FEEDBACK -----
-    if not (170 <= left_knee <= 180):
-        deviation = abs(175 - left_knee)
-        leg_items.append(("Keep your left leg strong and straight.", 'left_knee', deviation))
-
-    if not (170 <= right_knee <= 180):
-        deviation = abs(175 - right_knee)
-        leg_items.append(("Keep your right leg strong and straight.", 'right_knee', deviation))
-
-    if not (80 <= left_knee <= 100) and not (170 <= left_knee <= 180):
-        deviation = abs(90 - left_knee)
-        leg_items.append(("Lift your left foot to bend knee properly.", 'left_knee', deviation))
-
-    if not (80 <= right_knee <= 100) and not (170 <= right_knee <= 180):
-        deviation = abs(90 - right_knee)
-        leg_items.append(("Lift your right foot to bend knee properly.", 'right_knee', deviation))
-
-    # ----- ARM FEEDBACK -----
-    if not (160 <= left_elbow <= 180):
-        deviation = abs(170 - left_elbow)
-        arm_items.append(("Straighten your left arm upward.", 'left_elbow', deviation))
-
-    if not (160 <= right_elbow <= 180):
-        deviation = abs(170 - right_elbow)
-        arm_items.append(("Straighten your right arm upward.", 'right_elbow', deviation))
+Every rule checks one angle against its correct range. When the angle is
+outside the range the rule fires with a deviation of |target - angle|, and
+the rules with the largest deviations give the feedback. The table is
+compiled once per pose: a single frame is checked against plain tuples,
+which is cheapest for a handful of rules, and a batch of frames, e.g. every
+tracked person, against NumPy arrays in one vectorised comparison.
 
-    if not (150 <= left_shoulder <= 180):
-        deviation = abs(165 - left_shoulder)
-        arm_items.append(("Raise your left arm to align with shoulder.", 'left_shoulder', deviation))
+`FeedbackStabilizer` sits between the rules and the UI: per-rule hysteresis,
+a majority vote over the last frames and a minimum dwell time keep the
+feedback from flipping when an angle hovers near a range boundary.
+`TrackedFeedback` keeps one stabilizer per tracked person.
+"""
+import math
+import time
+from collections import Counter
+from collections import deque
+from typing import FrozenSet, NamedTuple, Optional, Tuple, Union
 
-    if not (150 <= right_shoulder <= 180):
-        deviation = abs(165 - right_shoulder)
-        arm_items.append(("Raise your right arm to align with shoulder.", 'right_shoulder', deviation))
+import numpy as np
 
-    if left_shoulder < 90 and right_shoulder < 90:
-        deviation = abs(90 - (left_shoulder + right_shoulder) / 2)
-        arm_items.append(("Raise your both arms and form Namaste overhead.", 'left_shoulder', deviation))
+from angle_calculator import ANGLE_KEYS
 
-    # Combine legs first (priority), then arms
-    feedback_items = leg_items + arm_items
 
-    if not feedback_items:
-        return [], set()
-
-    # Sort and return top feedback item
-    feedback_items.sort(key=lambda x: x[2], reverse=True)
-    top_item = feedback_items[0]
+class FeedbackRule(NamedTuple):
+    """
+    joint: Angle key, or a tuple of angle keys. With several keys the rule
+        fires only when all of them are out of range, and the deviation uses
+        their mean.
+    lo, hi: Correct range of the angle (inclusive).
+    target: Ideal angle the deviation is measured from.
+    message: Feedback when the rule fires.
+    message_above: Feedback instead of `message` when the angle is above `lo`.
+    also_correct: Optional second (lo, hi) range that is also correct.
+    highlight: Keypoint to highlight, the first joint by default.
+    hysteresis: Degrees an angle must move past the range boundary before
+        the rule starts or stops firing, when evaluated with hysteresis.
+        DEFAULT_HYSTERESIS by default, at most a quarter of the range.
+    """
+    joint: Union[str, Tuple[str, ...]]
+    lo: float
+    hi: float
+    target: float
+    message: str
+    message_above: Optional[str] = None
+    also_correct: Optional[Tuple[float, float]] = None
+    highlight: Optional[str] = None
+    hysteresis: Optional[float] = None
+
+
+class PoseRules(NamedTuple):
+    """
+    rules: FeedbackRules of the pose, ties are broken by this order.
+    top_k: Number of feedback messages returned.
+    correct_messages: Messages returned when no rule fires.
+    """
+    rules: Tuple[FeedbackRule, ...]
+    top_k: int = 1
+    correct_messages: Tuple[str, ...] = ()
+
+
+FEEDBACK_RULES = {
+    # Downward-Facing Dog
+    "Adhomukhasvanasana": PoseRules((
+        # Shoulder angle: ideally open between 110°–130° (arms aligned with spine)
+        FeedbackRule('left_shoulder', 110, 130, 120, "Relax left shoulder and lengthen spine."),
+        FeedbackRule('right_shoulder', 110, 130, 120, "Relax right shoulder and lengthen spine."),
+        # Hips: should be high (angle at hip around 90°)
+        FeedbackRule('left_hip', 70, 90, 90, "Push your hips up and back."),
+        FeedbackRule('right_hip', 70, 90, 90, "Push your hips up and back."),
+        # Knees: ideally straight (angle 170°–180°)
+        FeedbackRule('left_knee', 170, 180, 175, "Try to straighten your left leg."),
+        FeedbackRule('right_knee', 170, 180, 175, "Try to straighten your right leg."),
+    ), correct_messages=("Perfect pose!",)),
+
+    # Warrior Pose
+    "Virabhadrasana": PoseRules((
+        # Legs (front and back)
+        FeedbackRule('left_knee', 85, 95, 90, "Bend your left knee to form a right angle.",
+                     message_above="Don't extend your left leg too much."),
+        FeedbackRule('right_knee', 170, 180, 175, "Keep your back leg straight and strong."),
+        # Arms (shoulder extension)
+        FeedbackRule('left_shoulder', 160, 180, 170, "Stretch your left arm fully in line with your shoulders."),
+        FeedbackRule('right_shoulder', 160, 180, 170, "Stretch your right arm fully in line with your shoulders."),
+    )),
+
+    # Cobra Pose
+    "Bhujangasana": PoseRules((
+        # Arms (elbows)
+        FeedbackRule('left_elbow', 150, 170, 160, "Straighten your left arm to lift your upper body."),
+        FeedbackRule('right_elbow', 150, 170, 160, "Straighten your right arm to lift your upper body."),
+        # Spine (using neck angle)
+        FeedbackRule('neck', 160, 180, 170, "Arch your spine and lift your chest higher."),
+        # Legs (knees should be straight)
+        FeedbackRule('left_knee', 170, 180, 175, "Keep your left leg extended and firm on the mat."),
+        FeedbackRule('right_knee', 170, 180, 175, "Keep your right leg extended and firm on the mat."),
+    )),
+
+    # Triangle Pose
+    "Trikonasana": PoseRules((
+        # Legs straight
+        FeedbackRule('left_knee', 170, 180, 175, "Straighten your left leg."),
+        FeedbackRule('right_knee', 170, 180, 175, "Straighten your right leg."),
+        # Hips: rotation and leg distance (angle between hips)
+        FeedbackRule('left_hip', 140, 160, 150, "Rotate your left hip more to open the body."),
+        FeedbackRule('right_hip', 140, 160, 150, "Rotate your right hip more to open the body."),
+        # Shoulders: arms should align vertically
+        FeedbackRule('left_shoulder', 160, 180, 170, "Raise your left arm straight above your shoulder."),
+        FeedbackRule('right_shoulder', 160, 180, 170, "Align your right arm vertically with the lower one."),
+    )),
+
+    # Tree Pose, leg feedback before arm feedback
+    "Vrksasana": PoseRules((
+        FeedbackRule('left_knee', 170, 180, 175, "Keep your left leg strong and straight."),
+        FeedbackRule('right_knee', 170, 180, 175, "Keep your right leg strong and straight."),
+        FeedbackRule('left_knee', 80, 100, 90, "Lift your left foot to bend knee properly.",
+                     also_correct=(170, 180)),
+        FeedbackRule('right_knee', 80, 100, 90, "Lift your right foot to bend knee properly.",
+                     also_correct=(170, 180)),
+        FeedbackRule('left_elbow', 160, 180, 170, "Straighten your left arm upward."),
+        FeedbackRule('right_elbow', 160, 180, 170, "Straighten your right arm upward."),
+        FeedbackRule('left_shoulder', 150, 180, 165, "Raise your left arm to align with shoulder."),
+        FeedbackRule('right_shoulder', 150, 180, 165, "Raise your right arm to align with shoulder."),
+        # Both shoulders below 90°
+        FeedbackRule(('left_shoulder', 'right_shoulder'), 90, np.inf, 90,
+                     "Raise your both arms and form Namaste overhead."),
+    )),
+
+    # Chair Pose
+    "Utkatasana": PoseRules((
+        # Arms Overhead (shoulders)
+        FeedbackRule('left_shoulder', 150, 180, 165, "Raise your left arm fully overhead."),
+        FeedbackRule('right_shoulder', 150, 180, 165, "Raise your right arm fully overhead."),
+        # Straight Back (torso alignment via shoulders)
+        FeedbackRule('left_shoulder', 140, 160, 150, "Keep your back straighter; avoid leaning forward."),
+        FeedbackRule('right_shoulder', 140, 160, 150, "Keep your back straighter; avoid leaning forward."),
+        # Leg Bending (knees)
+        FeedbackRule('left_knee', 90, 110, 100, "Bend your left knee to sit deeper."),
+        FeedbackRule('right_knee', 90, 110, 100, "Bend your right knee to sit deeper."),
+        # Leg Bending (hips)
+        FeedbackRule('left_hip', 100, 120, 110, "Lower your hips more."),
+        FeedbackRule('right_hip', 100, 120, 110, "Lower your hips more."),
+    )),
+
+    # Dancer Pose, assuming the right leg is lifted and the left arm extended
+    "Natarajasana": PoseRules((
+        # Back Arch via neck
+        FeedbackRule('neck', 20, 40, 30, "Arch your back more to deepen the pose.",
+                     message_above="Reduce the arch in your back slightly."),
+        # Leg Bending (lifted leg)
+        FeedbackRule('right_knee', 130, 160, 145,
+                     "Bend your lifted leg more to bring your foot closer to your head.",
+                     message_above="Ease off the leg stretch slightly."),
+        # Arm Straightness (arm extended forward)
+        FeedbackRule('left_shoulder', 160, 180, 170, "Straighten your arm fully forward to balance the pose."),
+        # Standing leg should be straight
+        FeedbackRule('left_knee', 170, 180, 175, "Keep your standing leg straighter for better stability."),
+    )),
+
+    # Half Lord of the Fishes Pose, assuming the left hand is over the right knee
+    "Ardhamatsyendrasana": PoseRules((
+        # Hip rotation check
+        FeedbackRule('left_hip', 70, 110, 90, "Rotate your hip slightly more to support the twist.",
+                     message_above="Relax the hip to avoid over-twisting."),
+        FeedbackRule('right_hip', 70, 110, 90, "Rotate your hip slightly more to support the twist.",
+                     message_above="Relax the hip to avoid over-twisting."),
+        # Arm raised and placed on opposite knee
+        FeedbackRule('left_elbow', 70, 110, 90,
+                     "Raise your left arm and press it against your right knee to deepen the twist."),
+        # Bent knee check
+        FeedbackRule('right_knee', 50, 90, 70,
+                     "Bend your right knee properly to ground the foot beside your thigh."),
+        # Shoulder alignment (for spinal twist)
+        FeedbackRule('left_shoulder', 30, 60, 45, "Twist your torso more from the waist to align your shoulders."),
+        # Neck rotation
+        FeedbackRule('neck', 40, 60, 50, "Gently turn your head to follow the direction of the twist."),
+    )),
+
+    # Plank Pose
+    "Kumbhakasana": PoseRules((
+        # Arm straightness
+        FeedbackRule('left_elbow', 170, 180, 175, "Keep your left arm straight and avoid locking the elbow."),
+        FeedbackRule('right_elbow', 170, 180, 175, "Keep your right arm straight and avoid locking the elbow."),
+        # Shoulder alignment
+        FeedbackRule('left_shoulder', 160, 180, 170, "Stack your left shoulder over the wrist and engage the core."),
+        FeedbackRule('right_shoulder', 160, 180, 170, "Stack your right shoulder over the wrist and engage the core."),
+        # Back straightness (hips)
+        FeedbackRule('left_hip', 165, 180, 172, "Keep your back flat — don’t let your hips drop or lift too high."),
+        FeedbackRule('right_hip', 165, 180, 172, "Keep your back flat — engage glutes and core to align hips."),
+        # Neck alignment (head)
+        FeedbackRule('neck', 160, 180, 170,
+                     "Keep your neck in line with your spine — avoid looking up or dropping your head."),
+    )),
+
+    # Goddess Pose
+    "Utkatakonasana": PoseRules((
+        # Knee bending
+        FeedbackRule('left_knee', 85, 100, 92, "Bend your left knee more to reach a right angle.",
+                     message_above="Slightly straighten your left knee to form 90 degrees."),
+        FeedbackRule('right_knee', 85, 100, 92, "Bend your right knee more to reach a right angle.",
+                     message_above="Slightly straighten your right knee to form 90 degrees."),
+        # Hip position (sinking down)
+        FeedbackRule('left_hip', 95, 115, 105, "Sink your hips lower for a deeper squat.",
+                     message_above="Lift your hips slightly to avoid over-sinking."),
+        FeedbackRule('right_hip', 95, 115, 105, "Sink your hips lower for a deeper squat.",
+                     message_above="Lift your hips slightly to avoid over-sinking."),
+        # Shoulder position (torso upright)
+        FeedbackRule('left_shoulder', 165, 180, 172, "Keep your torso upright — avoid leaning forward."),
+        FeedbackRule('right_shoulder', 165, 180, 172, "Keep your torso upright — avoid leaning forward."),
+        # Arms raised and bent at the elbow (Goddess style)
+        FeedbackRule('left_elbow', 85, 100, 92, "Raise your left arm and bend it to form a right angle at the elbow."),
+        FeedbackRule('right_elbow', 85, 100, 92, "Raise your right arm and bend it to form a right angle at the elbow."),
+    )),
+}
 
-    return [top_item[0]], {top_item[1]}
+DEFAULT_HYSTERESIS = 3.0
+
+# Poses that have feedback rules
+FEEDBACK_POSES = list(FEEDBACK_RULES)
+
+_ANGLE_INDEX = {key: i for i, key in enumerate(ANGLE_KEYS)}
+
+
+class CompiledRules:
+    """The rules of one pose as tuples for one frame and arrays for a batch."""
+
+    def __init__(self, pose_rules):
+        rules = pose_rules.rules
+        # [R, 2] angle indices; single-joint rules use their joint twice
+        joints = [(rule.joint, rule.joint) if isinstance(rule.joint, str) else rule.joint for rule in rules]
+        self.joint_indices = np.array([[_ANGLE_INDEX[j] for j in pair] for pair in joints], dtype=np.intp)
+        # [R, 1, 2] correct ranges, an empty second range for rules without one
+        ranges = [((rule.lo, rule.hi), rule.also_correct or (np.inf, -np.inf)) for rule in rules]
+        self.lo = np.array([[[r[0] for r in pair]] for pair in ranges], dtype=np.float64)
+        self.hi = np.array([[[r[1] for r in pair]] for pair in ranges], dtype=np.float64)
+        self.first_lo = self.lo[:, 0, 0]
+        # Narrow ranges get a smaller margin so that they can still be reached
+        self.margin = np.array([
+            min(DEFAULT_HYSTERESIS if rule.hysteresis is None else rule.hysteresis, (rule.hi - rule.lo) / 4)
+            for rule in rules], dtype=np.float64)
+        self.target = np.array([rule.target for rule in rules], dtype=np.float64)
+        self.messages_below = [rule.message for rule in rules]
+        self.messages_above = [rule.message_above or rule.message for rule in rules]
+        self.highlights = [rule.highlight or pair[0] for rule, pair in zip(rules, joints)]
+        self.top_k = pose_rules.top_k
+        self.correct_messages = list(pose_rules.correct_messages)
+        # Per rule for a single frame: (key, second key or None, lo, hi,
+        # second lo, second hi, margin, target) as plain Python numbers
+        self._checks = [
+            (pair[0], pair[1] if pair[1] != pair[0] else None, *first, *second, float(margin), rule.target)
+            for rule, pair, (first, second), margin in zip(rules, joints, ranges, self.margin)]
+
+    def deviations(self, angle_values, firing=None):
+        """Deviation of every rule, -1 for the rules that do not fire.
+
+        Args:
+            angle_values: [9] or [N, 9] angles in ANGLE_KEYS order.
+            firing: Optional [..., R] boolean mask of the rules that fired
+                last time, to apply hysteresis: a firing rule stops once the
+                angle is its margin inside a range, the others start once it
+                is their margin outside all ranges.
+
+        Returns:
+            ([..., R] deviations, [..., R] rule angles)
+        """
+        values = angle_values[..., self.joint_indices]
+        lo, hi = self.lo, self.hi
+        if firing is not None:
+            offset = np.where(firing, self.margin, -self.margin)[..., np.newaxis, np.newaxis]
+            lo, hi = lo + offset, hi - offset
+        # A rule fires when none of its joints is inside any of its ranges
+        within = (lo <= values[..., np.newaxis]) & (values[..., np.newaxis] <= hi)
+        fires = ~within.any(axis=(-2, -1))
+        value = (values[..., 0] + values[..., 1]) * 0.5
+        deviation = np.abs(self.target - value)
+        # A NaN angle, e.g. of two coinciding joints, cannot be judged and
+        # never fires, otherwise argmax would pick it
+        fires &= ~np.isnan(deviation)
+        return np.where(fires, deviation, -1.0), value
+
+    def evaluate(self, angles, firing=None):
+        """Feedback of one frame, checked rule by rule without NumPy.
+
+        Args:
+            angles: Dictionary of key angles.
+            firing: Optional sequence of the rules that fired last time, to
+                apply hysteresis like `deviations`.
+
+        Returns:
+            (feedback_messages, highlighted_keypoints, [R] rules that fired)
+        """
+        fired = []
+        now_firing = []
+        for i, (key, key2, rule_lo, hi, lo2, hi2, margin, target) in enumerate(self._checks):
+            lo = rule_lo
+            if firing is not None:
+                offset = margin if firing[i] else -margin
+                lo, hi, lo2, hi2 = lo + offset, hi - offset, lo2 + offset, hi2 - offset
+            value = angles.get(key, 0)
+            fires = not (lo <= value <= hi or lo2 <= value <= hi2)
+            if fires and key2 is not None:
+                value2 = angles.get(key2, 0)
+                fires = not (lo <= value2 <= hi or lo2 <= value2 <= hi2)
+                value = (value + value2) * 0.5
+            if fires:
+                deviation = abs(target - value)
+                # A NaN angle never fires, as in `deviations`
+                fires = not math.isnan(deviation)
+            now_firing.append(fires)
+            if fires:
+                fired.append((deviation, i, value < rule_lo))
+        if not fired:
+            return list(self.correct_messages), set(), now_firing
+
+        if self.top_k == 1:
+            # max returns the first rule among equal deviations
+            top = [max(fired, key=lambda f: f[0])]
+        else:
+            top = sorted(fired, key=lambda f: -f[0])[:self.top_k]
+        feedback_messages = [self.messages_below[i] if below else self.messages_above[i] for _, i, below in top]
+        highlighted_keypoints = {self.highlights[i] for _, i, _ in top}
+        return feedback_messages, highlighted_keypoints, now_firing
+
+    def evaluate_batch(self, angle_values):
+        """Feedback of [N, 9] angles, e.g. every tracked person, in one check."""
+        deviations, value = self.deviations(angle_values)
+        return [self.select(d, v) for d, v in zip(deviations, value)]
+
+    def select(self, deviations, value):
+        """(feedback_messages, highlighted_keypoints) of the top rules."""
+        if self.top_k == 1:
+            # argmax returns the first rule among equal deviations
+            top = [int(np.argmax(deviations))]
+            if deviations[top[0]] < 0:
+                top = []
+        else:
+            fired = np.flatnonzero(deviations >= 0)
+            if len(fired) > self.top_k:
+                # Keep every rule tied with the k-th largest, then sort stably
+                kth = -np.partition(-deviations[fired], self.top_k - 1)[self.top_k - 1]
+                fired = fired[deviations[fired] >= kth]
+            order = np.lexsort((fired, -deviations[fired]))
+            top = fired[order[:self.top_k]].tolist()
+        if not top:
+            return list(self.correct_messages), set()
+
+        feedback_messages = [self.messages_below[i] if value[i] < self.first_lo[i] else self.messages_above[i]
+                             for i in top]
+        highlighted_keypoints = {self.highlights[i] for i in top}
+        return feedback_messages, highlighted_keypoints
+
+
+COMPILED_RULES = {pose: CompiledRules(rules) for pose, rules in FEEDBACK_RULES.items()}
+
+# Every static feedback message, e.g. to pre-render the speech
+FEEDBACK_MESSAGES = list(dict.fromkeys(
+    message
+    for pose_rules in FEEDBACK_RULES.values()
+    for message in [m for rule in pose_rules.rules for m in (rule.message, rule.message_above) if m] +
+    list(pose_rules.correct_messages)))
+
+
+def angle_values(angles):
+    """[9] angle array in ANGLE_KEYS order from an angle dictionary."""
+    return np.array([angles.get(key, 0) for key in ANGLE_KEYS], dtype=np.float64)
 
 
-def feedback_utkatasana(angles):
-    """
-    Feedback for Utkatasana (Chair Pose).
-    angles: Dictionary containing key angles.
-    Returns:
-        - feedback_messages: Single feedback instruction.
-        - highlighted_keypoints: Set of keypoints to highlight.
-    """
-    feedback_items = []
-
-    left_knee = angles.get('left_knee', 0)
-    right_knee = angles.get('right_knee', 0)
-    left_hip = angles.get('left_hip', 0)
-    right_hip = angles.get('right_hip', 0)
-    left_shoulder = angles.get('left_shoulder', 0)
-    right_shoulder = angles.get('right_shoulder', 0)
-
-    # Arms Overhead (shoulders)
-    if not (150 <= left_shoulder <= 180):
-        deviation = abs(165 - left_shoulder)
-        message = "Raise your left arm fully overhead."
-        feedback_items.append((message, 'left_shoulder', deviation))
-
-    if not (150 <= right_shoulder <= 180):
-        deviation = abs(165 - right_shoulder)
-        message = "Raise your right arm fully overhead."
-        feedback_items.append((message, 'right_shoulder', deviation))
-
-    # Straight Back (torso alignment via shoulders)
-    if not (140 <= left_shoulder <= 160):
-        deviation = abs(150 - left_shoulder)
-        message = "Keep your back straighter; avoid leaning forward."
-        feedback_items.append((message, 'left_shoulder', deviation))
-
-    if not (140 <= right_shoulder <= 160):
-        deviation = abs(150 - right_shoulder)
-        message = "Keep your back straighter; avoid leaning forward."
-        feedback_items.append((message, 'right_shoulder', deviation))
-
-    # Leg Bending (knees)
-    if not (90 <= left_knee <= 110):
-        deviation = abs(100 - left_knee)
-        message = "Bend your left knee to sit deeper."
-        feedback_items.append((message, 'left_knee', deviation))
-
-    if not (90 <= right_knee <= 110):
-        deviation = abs(100 - right_knee)
-        message = "Bend your right knee to sit deeper."
-        feedback_items.append((message, 'right_knee', deviation))
-
-    # Leg Bending (hips)
-    if not (100 <= left_hip <= 120):
-        deviation = abs(110 - left_hip)
-        message = "Lower your hips more."
-        feedback_items.append((message, 'left_hip', deviation))
-
-    if not (100 <= right_hip <= 120):
-        deviation = abs(110 - right_hip)
-        message = "Lower your hips more."
-        feedback_items.append((message, 'right_hip', deviation))
-
-    # Return only the most important feedback
-    feedback_items.sort(key=lambda x: x[2], reverse=True)
-    top_item = feedback_items[0]
-
-    return [top_item[0]], {top_item[1]}
-
-
-def feedback_natarajasana(angles):
+def get_feedback(pose_name, angles):
     """
-    Feedback for Natarajasana (Dancer Pose).
-    angles: Dictionary containing key angles.
+    Get feedback for a specific pose.
+    pose_name: Name of the pose.
+    angles: Dictionary of key angles.
     Returns:
-        - feedback_messages: Single feedback instruction.
+        - feedback_messages: List of feedback instructions (max 3).
         - highlighted_keypoints: Set of keypoints to highlight.
     """
-    feedback_items = []
-
-    neck = angles.get('neck', 0)
-    back_leg_knee = angles.get('right_knee', 0)  # assuming right leg is lifted
-    standing_leg_knee = angles.get('left_knee', 0)
-    arm_angle = angles.get('left_shoulder', 0)  # assuming left arm is extended forward
+    compiled = COMPILED_RULES.get(pose_name)
+    if compiled:
+        feedback_messages, highlighted_keypoints, _ = compiled.evaluate(angles)
+        return feedback_messages, highlighted_keypoints
+    else:
+        return ["No feedback available for this pose."], set()
 
-    # 1. Back Arch via neck
-    if not (20 <= neck <= 40):
-        deviation = abs(30 - neck)
-        message = "Arch your back more to deepen the pose." if neck < 20 else "Reduce the arch in your back slightly."
-        feedback_items.append((message, 'neck', deviation))
 
-    # 2. Leg Bending (lifted leg, e.g., right knee)
-    if not (130 <= back_leg_knee <= 160):
-        deviation = abs(145 - back_leg_knee)
-        message = "Bend your lifted leg more to bring your foot closer to your head." if back_leg_knee < 130 else "Ease off the leg stretch slightly."
-        feedback_items.append((message, 'right_knee', deviation))
+class FeedbackState(NamedTuple):
+    """Feedback shown to the user. Two states are the same when their
+    detection, correctness and messages are, whatever the highlights. The
+    messages of a correct pose are not shown, so they do not count."""
+    pose_detected: bool
+    pose_correct: bool
+    messages: Tuple[str, ...]
+    highlighted: FrozenSet[str] = frozenset()
 
-    # 3. Arm Straightness (arm extended forward)
-    if not (160 <= arm_angle <= 180):
-        deviation = abs(170 - arm_angle)
-        message = "Straighten your arm fully forward to balance the pose."
-        feedback_items.append((message, 'left_shoulder', deviation))
+    @property
+    def key(self):
+        return self.pose_detected, self.pose_correct, () if self.pose_correct else self.messages
 
-    # 4. Standing leg should be straight
-    if not (170 <= standing_leg_knee <= 180):
-        deviation = abs(175 - standing_leg_knee)
-        message = "Keep your standing leg straighter for better stability."
-        feedback_items.append((message, 'left_knee', deviation))
 
-    # Sort and select most deviated feedback
-    feedback_items.sort(key=lambda x: x[2], reverse=True)
-    top_item = feedback_items[0]
+NO_POSE = FeedbackState(False, False, ())
 
-    return [top_item[0]], {top_item[1]}
 
+class FeedbackStabilizer:
+    """Debounces the per-frame feedback before it reaches the UI and speech.
 
-def feedback_ardhamatsyendrasana(angles):
-    """
-    Feedback for Ardhamatsyendrasana (Half Lord of the Fishes Pose).
-    angles: Dictionary containing key angles.
-    Returns:
-        - feedback_messages: List of feedback instructions (max 3).
-        - highlighted_keypoints: Set of keypoints to highlight.
-    """
-    feedback_items = []
-
-    neck = angles.get('neck', 0)
-    left_hip = angles.get('left_hip', 0)
-    right_hip = angles.get('right_hip', 0)
-    left_knee = angles.get('left_knee', 0)
-    right_knee = angles.get('right_knee', 0)
-    left_elbow = angles.get('left_elbow', 0)
-    right_elbow = angles.get('right_elbow', 0)
-    left_shoulder = angles.get('left_shoulder', 0)
-    right_shoulder = angles.get('right_shoulder', 0)
-
-    # 1. Hip rotation check
-    if not (70 <= left_hip <= 110):
-        deviation = abs(90 - left_hip)
-        message = "Rotate your hip slightly more to support the twist." if left_hip < 70 else "Relax the hip to avoid over-twisting."
-        feedback_items.append((message, 'left_hip', deviation))
-    
-    if not (70 <= right_hip <= 110):
-        deviation = abs(90 - right_hip)
-        message = "Rotate your hip slightly more to support the twist." if right_hip < 70 else "Relax the hip to avoid over-twisting."
-        feedback_items.append((message, 'right_hip', deviation))
-
-    # 2. Arm raised and placed on opposite knee (assume left hand over right knee)
-    if not (70 <= left_elbow <= 110):
-        deviation = abs(90 - left_elbow)
-        message = "Raise your left arm and press it against your right knee to deepen the twist."
-        feedback_items.append((message, 'left_elbow', deviation))
-
-    # 3. Bent knee check
-    if not (50 <= right_knee <= 90):
-        deviation = abs(70 - right_knee)
-        message = "Bend your right knee properly to ground the foot beside your thigh."
-        feedback_items.append((message, 'right_knee', deviation))
-
-    # 4. Shoulder alignment (for spinal twist)
-    if not (30 <= left_shoulder <= 60):
-        deviation = abs(45 - left_shoulder)
-        message = "Twist your torso more from the waist to align your shoulders."
-        feedback_items.append((message, 'left_shoulder', deviation))
-
-    # 5. Neck rotation
-    if not (40 <= neck <= 60):
-        deviation = abs(50 - neck)
-        message = "Gently turn your head to follow the direction of the twist."
-        feedback_items.append((message, 'neck', deviation))
-
-    # Sort and select top 3 feedbacks based on deviation
-    feedback_items.sort(key=lambda x: x[2], reverse=True)
-    top_items = feedback_items[:1]
-
-    # Extract messages and keypoints
-    feedback_messages = [item[0] for item in top_items]
-    highlighted_keypoints = set(item[1] for item in top_items)
-
-    return feedback_messages, highlighted_keypoints
-
-def feedback_kumbhakasana(angles):
-    """
-    Feedback for Kumbhakasana (Plank Pose).
-    angles: Dictionary containing key angles.
-    Returns:
-        - feedback_messages: List of feedback instructions (max 3).
-        - highlighted_keypoints: Set of keypoints to highlight.
-    """
-    feedback_items = []
-    highlighted_keypoints = set()
-
-    left_shoulder = angles.get('left_shoulder', 0)
-    right_shoulder = angles.get('right_shoulder', 0)
-    left_hip = angles.get('left_hip', 0)
-    right_hip = angles.get('right_hip', 0)
-    left_elbow = angles.get('left_elbow', 0)
-    right_elbow = angles.get('right_elbow', 0)
-    neck = angles.get('neck', 0)  # New angle for head/neck alignment
-
-    # --- ARM STRAIGHTNESS ---
-    if not (170 <= left_elbow <= 180):
-        deviation = abs(175 - left_elbow)
-        message = "Keep your left arm straight and avoid locking the elbow."
-        feedback_items.append((message, 'left_elbow', deviation))
-
-    if not (170 <= right_elbow <= 180):
-        deviation = abs(175 - right_elbow)
-        message = "Keep your right arm straight and avoid locking the elbow."
-        feedback_items.append((message, 'right_elbow', deviation))
-
-    # --- SHOULDER ALIGNMENT ---
-    if not (160 <= left_shoulder <= 180):
-        deviation = abs(170 - left_shoulder)
-        message = "Stack your left shoulder over the wrist and engage the core."
-        feedback_items.append((message, 'left_shoulder', deviation))
-
-    if not (160 <= right_shoulder <= 180):
-        deviation = abs(170 - right_shoulder)
-        message = "Stack your right shoulder over the wrist and engage the core."
-        feedback_items.append((message, 'right_shoulder', deviation))
-
-    # --- BACK STRAIGHTNESS (HIPS) ---
-    if not (165 <= left_hip <= 180):
-        deviation = abs(172 - left_hip)
-        message = "Keep your back flat — don’t let your hips drop or lift too high."
-        feedback_items.append((message, 'left_hip', deviation))
-
-    if not (165 <= right_hip <= 180):
-        deviation = abs(172 - right_hip)
-        message = "Keep your back flat — engage glutes and core to align hips."
-        feedback_items.append((message, 'right_hip', deviation))
-
-    # --- NECK ALIGNMENT (HEAD) ---
-    if not (160 <= neck <= 180):
-        deviation = abs(170 - neck)
-        message = "Keep your neck in line with your spine — avoid looking up or dropping your head."
-        feedback_items.append((message, 'neck', deviation))
-
-    # Sort by deviation and take top 3
-    feedback_items.sort(key=lambda x: x[2], reverse=True)
-    top_items = feedback_items[:1]
-
-    # Extract messages and keypoints
-    feedback_messages = [item[0] for item in top_items]
-    highlighted_keypoints = set(item[1] for item in top_items)
-
-    return feedback_messages, highlighted_keypoints
-
-
-def feedback_utkatakonasana(angles):
+    Every frame is evaluated with per-rule hysteresis, then the last `window`
+    frames vote on the state. The shown state changes to the majority only
+    after it was held for `min_dwell` seconds, so `update` reports a change
+    only when the feedback really changed.
     """
-    Feedback for Utkatakonasana (Goddess Pose).
-    angles: Dictionary containing key angles.
-    Returns:
-        - feedback_messages: List of feedback instructions (max 3).
-        - highlighted_keypoints: Set of keypoints to highlight.
-    """
-    feedback_items = []
-    highlighted_keypoints = set()
-
-    left_knee = angles.get('left_knee', 0)
-    right_knee = angles.get('right_knee', 0)
-    left_hip = angles.get('left_hip', 0)
-    right_hip = angles.get('right_hip', 0)
-    left_shoulder = angles.get('left_shoulder', 0)
-    right_shoulder = angles.get('right_shoulder', 0)
-    left_elbow = angles.get('left_elbow', 0)
-    right_elbow = angles.get('right_elbow', 0)
-
-    # --- KNEE BENDING ---
-    if not (85 <= left_knee <= 100):
-        deviation = abs(92 - left_knee)
-        message = "Bend your left knee more to reach a right angle." if left_knee < 85 else "Slightly straighten your left knee to form 90 degrees."
-        feedback_items.append((message, 'left_knee', deviation))
-
-    if not (85 <= right_knee <= 100):
-        deviation = abs(92 - right_knee)
-        message = "Bend your right knee more to reach a right angle." if right_knee < 85 else "Slightly straighten your right knee to form 90 degrees."
-        feedback_items.append((message, 'right_knee', deviation))
-
-    # --- HIP POSITION (SINKING DOWN) ---
-    if not (95 <= left_hip <= 115):
-        deviation = abs(105 - left_hip)
-        message = "Sink your hips lower for a deeper squat." if left_hip < 95 else "Lift your hips slightly to avoid over-sinking."
-        feedback_items.append((message, 'left_hip', deviation))
-
-    if not (95 <= right_hip <= 115):
-        deviation = abs(105 - right_hip)
-        message = "Sink your hips lower for a deeper squat." if right_hip < 95 else "Lift your hips slightly to avoid over-sinking."
-        feedback_items.append((message, 'right_hip', deviation))
-
-    # --- SHOULDER POSITION (TORSO UPRIGHT) ---
-    if not (165 <= left_shoulder <= 180):
-        deviation = abs(172 - left_shoulder)
-        message = "Keep your torso upright — avoid leaning forward."
-        feedback_items.append((message, 'left_shoulder', deviation))
-
-    if not (165 <= right_shoulder <= 180):
-        deviation = abs(172 - right_shoulder)
-        message = "Keep your torso upright — avoid leaning forward."
-        feedback_items.append((message, 'right_shoulder', deviation))
-
-    # --- ARMS RAISED & BENT AT ELBOW (Goddess style) ---
-    if not (85 <= left_elbow <= 100):
-        deviation = abs(92 - left_elbow)
-        message = "Raise your left arm and bend it to form a right angle at the elbow."
-        feedback_items.append((message, 'left_elbow', deviation))
-
-    if not (85 <= right_elbow <= 100):
-        deviation = abs(92 - right_elbow)
-        message = "Raise your right arm and bend it to form a right angle at the elbow."
-        feedback_items.append((message, 'right_elbow', deviation))
-
-    # Sort by deviation and select top 3 issues
-    feedback_items.sort(key=lambda x: x[2], reverse=True)
-    top_items = feedback_items[:1]
-
-    # Prepare results
-    feedback_messages = [item[0] for item in top_items]
-    highlighted_keypoints = set(item[1] for item in top_items)
-
-    return feedback_messages, highlighted_keypoints
-
-# Dictionary to map pose names to feedback functions
-POSE_FEEDBACK_FUNCTIONS = {
-    "Adhomukhasvanasana": feedback_adhomukhasvanasana,
-    "Virabhadrasana": feedback_virabhadrasana,
-    "Bhujangasana": feedback_bhujangasana,
-    "Trikonasana": feedback_trikonasana,
-    "Vrksasana": feedback_vrksasana,
-    "Utkatasana": feedback_utkatasana,
-    "Natarajasana": feedback_natarajasana,
-    "Ardhamatsyendrasana": feedback_ardhamatsyendrasana,
-    "Kumbhakasana": feedback_kumbhakasana,
-    "Utkatakonasana": feedback_utkatakonasana,
-}
 
-def get_feedback(pose_name, angles):
+    def __init__(self, window=7, min_dwell=0.75, clock=time.monotonic):
+        """
+        Args:
+            window: Number of frames in the majority vote.
+            min_dwell: Minimum time in seconds between two state changes.
+            clock: Time source, in seconds.
+        """
+        self.window = window
+        self.min_dwell = min_dwell
+        self.clock = clock
+        self.reset()
+
+    def reset(self):
+        self.state = NO_POSE
+        self.changed_at = None
+        self._pose_name = None
+        self._firing = None
+        self._votes = deque(maxlen=self.window)
+        # Newest state of every key in the window, for its highlights
+        self._latest = {}
+
+    def update(self, pose_name, angles, pose_correct):
+        """Evaluates the feedback of one frame.
+
+        Args:
+            pose_name: Pose the feedback is for. The rule state starts over
+                when it changes, e.g. in free practice.
+            angles: Dictionary of key angles.
+            pose_correct: Whether the classifier accepted the pose.
+
+        Returns:
+            (FeedbackState to show, whether it changed)
+        """
+        compiled = COMPILED_RULES.get(pose_name)
+        if pose_name != self._pose_name:
+            self._pose_name = pose_name
+            self._firing = None
+        if compiled is None:
+            messages, highlighted = get_feedback(pose_name, angles)
+        else:
+            messages, highlighted, self._firing = compiled.evaluate(angles, self._firing)
+        return self._vote(FeedbackState(True, bool(pose_correct), tuple(messages), frozenset(highlighted)))
+
+    def no_pose(self):
+        """Records a frame without a detected pose, see `update`."""
+        self._firing = None
+        return self._vote(NO_POSE)
+
+    def _vote(self, state):
+        if len(self._votes) == self._votes.maxlen:
+            oldest = self._votes[0]
+            if self._votes.count(oldest) == 1:
+                del self._latest[oldest]
+        self._votes.append(state.key)
+        self._latest[state.key] = state
+
+        counts = Counter(self._votes)
+        best = max(counts.values())
+        # Ties keep the shown state, otherwise the most recent of them wins
+        if counts.get(self.state.key, 0) == best:
+            winner = self.state.key
+        else:
+            winner = next(key for key in reversed(self._votes) if counts[key] == best)
+
+        now = self.clock()
+        if winner == self.state.key:
+            # Same feedback, follow the highlights of the newest frame
+            self.state = self._latest[winner]
+            return self.state, False
+        if self.changed_at is not None and now - self.changed_at < self.min_dwell:
+            return self.state, False
+        self.state = self._latest[winner]
+        self.changed_at = now
+        return self.state, True
+
+
+class TrackedFeedback:
+    """Feedback for every tracked person in front of one camera.
+
+    Keeps one FeedbackStabilizer per track id, e.g. of MovenetMultiPose, and
+    drops it when the track expires.
     """
-    Get feedback for a specific pose.
-    pose_name: Name of the pose.
-    angles: Dictionary of key angles.
-    Returns:
-        - feedback_messages: List of feedback instructions (max 3).
-        - highlighted_keypoints: Set of keypoints to highlight.
-    """
-    feedback_function = POSE_FEEDBACK_FUNCTIONS.get(pose_name)
-    if feedback_function:
-        return feedback_function(angles)
-    else:
-        return ["No feedback available for this pose."], set()
\ No newline at end of file
+
+    def __init__(self, classify, window=7, min_dwell=0.75, clock=time.monotonic):
+        """
+        Args:
+            classify: Callable returning (pose_correct, angles) for a Person.
+            window, min_dwell, clock: As for FeedbackStabilizer.
+        """
+        self.classify = classify
+        self.window = window
+        self.min_dwell = min_dwell
+        self.clock = clock
+        self._stabilizers = {}
+
+    def __len__(self):
+        return len(self._stabilizers)
+
+    def reset(self):
+        self._stabilizers.clear()
+
+    def update(self, pose_name, persons, track_ids=None):
+        """Classifies every person of a frame and evaluates their feedback.
+
+        Args:
+            pose_name: Pose the feedback is for.
+            persons: Persons of the frame with their track `id` set.
+            track_ids: Ids of the live tracks, e.g. MovenetMultiPose.track_ids.
+                The stabilizers of the other ids are dropped. Defaults to the
+                ids of `persons`.
+
+        Returns:
+            Dictionary of Person.id to (FeedbackState, whether it changed).
+        """
+        live = {person.id for person in persons} if track_ids is None else set(track_ids)
+        for track_id in [track_id for track_id in self._stabilizers if track_id not in live]:
+            del self._stabilizers[track_id]
+
+        results = {}
+        for person in persons:
+            stabilizer = self._stabilizers.get(person.id)
+            if stabilizer is None:
+                stabilizer = self._stabilizers[person.id] = FeedbackStabilizer(
+                    self.window, self.min_dwell, self.clock)
+            pose_correct, angles = self.classify(person)
+            results[person.id] = stabilizer.update(pose_name, angles, pose_correct)
+        return results
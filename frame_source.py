@@ -0,0 +1,481 @@
+"""Frame sources for the pipeline: webcam, video file, image directory and
+a synthetic pattern.
+
+Every source reads or decodes on a background thread, and `read` returns
+(ret, image, capture_time) as expected by `Pipeline`. The webcam always
+serves its newest frame. The other sources replay their frames with either
+a real-time clock, which paces them at their frame rate and drops the frames
+a slow consumer misses just like a camera would, or as fast as possible,
+which serves every frame in order. With them the MoveNet, classifier and
+feedback path can run headless on recorded sessions, e.g. for benchmarks.
+"""
+import abc
+import collections
+import glob
+import os
+import queue
+import threading
+import time
+from typing import NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class Frame(NamedTuple):
+    index: int
+    timestamp: float  # time.perf_counter() when the frame was captured or is due
+    image: np.ndarray
+
+
+class SourceStats(NamedTuple):
+    captured: int  # Frames read or decoded
+    served: int
+    dropped: int  # Frames that were never served
+    duplicated: int  # Frames served more than once
+    fps: float
+    width: int
+    height: int
+    fourcc: str = ""
+
+
+class FrameSource(abc.ABC):
+    """Interface of the frame sources.
+
+    `open` starts the background thread, `read` returns the next frame as
+    (ret, image, capture_time) with ret False at the end, and `release`
+    stops the thread and frees the source.
+    """
+
+    _SMOOTHING = 0.1
+
+    def __init__(self):
+        self._width = self._height = 0
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.captured = 0
+        self.served = 0
+        self.dropped = 0
+        self.duplicated = 0
+        self.measured_fps = 0.0
+        self._last_timestamp = None
+
+    def _measure(self, timestamp):
+        """Tracks the frame rate from consecutive frame timestamps."""
+        if self._last_timestamp is not None:
+            fps = 1.0 / max(timestamp - self._last_timestamp, 1e-6)
+            self.measured_fps = fps if not self.measured_fps else (
+                self.measured_fps + self._SMOOTHING * (fps - self.measured_fps))
+        self._last_timestamp = timestamp
+
+    @abc.abstractmethod
+    def open(self):
+        """Starts reading. Returns False if the source cannot be opened."""
+
+    @abc.abstractmethod
+    def read(self):
+        """Returns the next frame as (ret, image, capture_time)."""
+
+    @abc.abstractmethod
+    def release(self):
+        """Stops reading and frees the source."""
+
+    def stats(self):
+        return SourceStats(self.captured, self.served, self.dropped, self.duplicated,
+                           self.measured_fps, self._width, self._height)
+
+
+class CameraSource(FrameSource):
+    """Webcam read on a background thread into a ring buffer.
+
+    `cv2.VideoCapture.read` blocks, and when the reader falls behind the
+    driver keeps handing out buffered frames that are hundreds of
+    milliseconds old, so `read` always serves the newest frame instead.
+
+    Args:
+        device: Camera index or device path, as for cv2.VideoCapture.
+        width, height: Requested resolution, None for the driver default.
+        fps: Requested frame rate, None for the driver default.
+        fourcc: Requested pixel format, e.g. "MJPG", which most USB cameras
+            need for high resolutions at full frame rate. None for the
+            driver default.
+        buffer_size: Number of recent frames kept.
+    """
+
+    def __init__(self, device=0, width=None, height=None, fps=None, fourcc="MJPG", buffer_size=3):
+        super().__init__()
+        self.device = device
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.fourcc = fourcc
+        self._frames = collections.deque(maxlen=buffer_size)
+        self._condition = threading.Condition()
+        self._capture = None
+        self._thread = None
+        self._stopped = False
+        self._served_index = -1
+
+    def open(self):
+        capture = cv2.VideoCapture(self.device)
+        if not capture.isOpened():
+            return False
+        # The pixel format has to be set before the resolution
+        if self.fourcc:
+            capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self.fourcc))
+        if self.width:
+            capture.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        if self.height:
+            capture.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        if self.fps:
+            capture.set(cv2.CAP_PROP_FPS, self.fps)
+        # Not every backend supports it, the reader thread keeps up anyway
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        self._capture = capture
+        self._frames.clear()
+        self._stopped = False
+        self._served_index = -1
+        self._reset_stats()
+        self._thread = threading.Thread(target=self._run, name="camera", daemon=True)
+        self._thread.start()
+        stats = self.stats()
+        print(f"Camera {self.device}: {stats.width}x{stats.height} {stats.fourcc} "
+              f"at {capture.get(cv2.CAP_PROP_FPS):.0f} FPS")
+        return True
+
+    def is_opened(self):
+        return self._capture is not None and not self._stopped
+
+    def _run(self):
+        while not self._stopped:
+            ret, image = self._capture.read()
+            timestamp = time.perf_counter()
+            if not ret:
+                print("Camera stopped delivering frames.")
+                break
+            with self._condition:
+                newest = self._frames[-1] if self._frames else None
+                if newest is not None and newest.index > self._served_index:
+                    self.dropped += 1
+                self._frames.append(Frame(self.captured, timestamp, image))
+                self.captured += 1
+                self._measure(timestamp)
+                self._condition.notify_all()
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def latest(self) -> Optional[Frame]:
+        """Newest captured frame, without waiting or counting it as served."""
+        with self._condition:
+            return self._frames[-1] if self._frames else None
+
+    def read(self, timeout=0.5):
+        """Waits up to `timeout` seconds for a frame newer than the last one served.
+
+        Returns:
+            (ret, image, timestamp). Without a new frame in time the last one
+            is served again; ret is False once the camera stopped. Before the
+            first frame, which can take a while after setting the pixel format
+            and resolution, it waits until the camera delivers or stops.
+        """
+        with self._condition:
+            while not self._frames and not self._stopped:
+                self._condition.wait(timeout)
+            self._condition.wait_for(
+                lambda: self._stopped or (self._frames and self._frames[-1].index > self._served_index),
+                timeout)
+            if not self._frames or (self._stopped and self._frames[-1].index <= self._served_index):
+                return False, None, None
+            frame = self._frames[-1]
+            if frame.index <= self._served_index:
+                self.duplicated += 1
+            self._served_index = frame.index
+            self.served += 1
+            return True, frame.image, frame.timestamp
+
+    def stats(self):
+        capture = self._capture
+        if capture is None:
+            return super().stats()
+        code = int(capture.get(cv2.CAP_PROP_FOURCC))
+        fourcc = "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00")
+        return SourceStats(self.captured, self.served, self.dropped, self.duplicated, self.measured_fps,
+                           int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                           int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)), fourcc)
+
+    def release(self):
+        """Stops the reader thread and releases the camera."""
+        self._stopped = True
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        if self._capture is not None:
+            self._capture.release()
+            self._capture = None
+        with self._condition:
+            self._condition.notify_all()
+
+
+class PrefetchSource(FrameSource):
+    """Source whose frames are decoded ahead on a background thread.
+
+    Subclasses implement `_start` and `_decode`, which returns the next
+    image or None at the end.
+
+    Args:
+        fps: Frame rate of the real-time clock.
+        realtime: Pace the frames at `fps` and drop the frames the consumer
+            is too late for, as a camera does. Otherwise every frame is
+            served in order, as fast as it is read.
+        prefetch: Number of frames decoded ahead.
+        loop: Start over at the end.
+    """
+
+    _END = None
+
+    def __init__(self, fps=30.0, realtime=True, prefetch=8, loop=False):
+        super().__init__()
+        self.fps = fps
+        self.realtime = realtime
+        self.loop = loop
+        self._queue = queue.Queue(maxsize=prefetch)
+        self._thread = None
+        self._stopped = threading.Event()
+        self._start_time = None
+        self._ended = False
+
+    @abc.abstractmethod
+    def _start(self):
+        """Opens the underlying source, returns False if it cannot be opened."""
+
+    @abc.abstractmethod
+    def _decode(self):
+        """Returns the next image, or None at the end."""
+
+    def _rewind(self):
+        """Restarts the source for `loop`, returns False if it cannot."""
+        return False
+
+    def open(self):
+        if not self._start():
+            return False
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+        self._stopped.clear()
+        self._start_time = None
+        self._ended = False
+        self._reset_stats()
+        self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return True
+
+    def _run(self):
+        index = 0
+        while not self._stopped.is_set():
+            image = self._decode()
+            if image is None and self.loop and index and self._rewind():
+                continue
+            if image is not None:
+                self._height, self._width = image.shape[:2]
+                self.captured += 1
+            frame = Frame(index, 0.0, image) if image is not None else self._END
+            # Blocks while the prefetched frames are not consumed
+            while not self._stopped.is_set():
+                try:
+                    self._queue.put(frame, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if frame is self._END:
+                break
+            index += 1
+
+    def _next(self):
+        while not self._stopped.is_set():
+            try:
+                return self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return self._END
+
+    def read(self):
+        if self._ended:
+            return False, None, None
+        frame = self._next()
+        if frame is self._END:
+            self._ended = True
+            return False, None, None
+
+        if not self.realtime:
+            timestamp = time.perf_counter()
+        else:
+            # Frame i is due `i / fps` seconds after the first one was served
+            now = time.perf_counter()
+            if self._start_time is None:
+                self._start_time = now - frame.index / self.fps
+            due = int((now - self._start_time) * self.fps)
+            # Skip the late frames that are already decoded
+            while frame.index < due:
+                try:
+                    later = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if later is self._END:
+                    self._ended = True
+                    break
+                self.dropped += 1
+                frame = later
+            timestamp = self._start_time + frame.index / self.fps
+            if timestamp > now:
+                time.sleep(timestamp - now)
+        self.served += 1
+        self._measure(time.perf_counter())
+        return True, frame.image, timestamp
+
+    def release(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        self._close()
+
+    def _close(self):
+        pass
+
+
+class VideoFileSource(PrefetchSource):
+    """Frames of a video file, replayed at its own frame rate by default."""
+
+    def __init__(self, path, fps=None, **kwargs):
+        super().__init__(fps=fps or 30.0, **kwargs)
+        self.path = path
+        self._requested_fps = fps
+        self._capture = None
+
+    def _start(self):
+        self._capture = cv2.VideoCapture(self.path)
+        if not self._capture.isOpened():
+            print(f"Could not open video {self.path}")
+            return False
+        if not self._requested_fps:
+            self.fps = self._capture.get(cv2.CAP_PROP_FPS) or 30.0
+        return True
+
+    def _decode(self):
+        ret, image = self._capture.read()
+        return image if ret else None
+
+    def _rewind(self):
+        return self._capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def _close(self):
+        if self._capture is not None:
+            self._capture.release()
+            self._capture = None
+
+
+class ImageDirectorySource(PrefetchSource):
+    """Images of a directory in file name order, e.g. an exported session."""
+
+    def __init__(self, directory, fps=30.0, **kwargs):
+        super().__init__(fps=fps, **kwargs)
+        self.directory = directory
+        self._paths = []
+        self._position = 0
+
+    def _start(self):
+        self._paths = sorted(path for path in glob.glob(os.path.join(self.directory, "*"))
+                             if path.lower().endswith(IMAGE_EXTENSIONS))
+        self._position = 0
+        if not self._paths:
+            print(f"No images in {self.directory}")
+            return False
+        return True
+
+    def _decode(self):
+        while self._position < len(self._paths):
+            path = self._paths[self._position]
+            self._position += 1
+            image = cv2.imread(path)
+            if image is not None:
+                return image
+            print(f"Skipping unreadable image {path}")
+        return None
+
+    def _rewind(self):
+        self._position = 0
+        return True
+
+
+class SyntheticSource(PrefetchSource):
+    """Generated frames of a stick figure swinging its arms, for runs
+    without recordings. MoveNet may not find a pose in them, but the
+    pipeline does the same work per frame.
+
+    Args:
+        frames: Number of frames, None for endless.
+        width, height: Frame size.
+    """
+
+    def __init__(self, frames=300, width=640, height=480, fps=30.0, **kwargs):
+        super().__init__(fps=fps, **kwargs)
+        self.frames = frames
+        self.size = (width, height)
+        self._index = 0
+
+    def _start(self):
+        self._index = 0
+        return True
+
+    def _decode(self):
+        if self.frames is not None and self._index >= self.frames:
+            return None
+        width, height = self.size
+        image = np.full((height, width, 3), 200, dtype=np.uint8)
+        cx, top = width // 2, height // 6
+        unit = height / 12
+        # Arms swing once every two seconds at 30 FPS
+        swing = np.sin(self._index * np.pi / 30)
+        neck = (cx, int(top + 1.5 * unit))
+        hip = (cx, int(top + 5 * unit))
+        color = (60, 60, 60)
+        cv2.circle(image, (cx, int(top + 0.7 * unit)), int(0.7 * unit), color, -1)
+        cv2.line(image, neck, hip, color, int(unit / 2))
+        for side in (-1, 1):
+            hand = (int(cx + side * 3 * unit), int(neck[1] - swing * 2 * unit))
+            foot = (int(cx + side * 1.5 * unit), int(top + 9.5 * unit))
+            cv2.line(image, neck, hand, color, int(unit / 3))
+            cv2.line(image, hip, foot, color, int(unit / 3))
+        self._index += 1
+        return image
+
+    def _rewind(self):
+        self._index = 0
+        return True
+
+
+def open_source(spec, realtime=True, **camera_settings):
+    """Creates a frame source from a command line or config value.
+
+    Args:
+        spec: A camera index ("0"), "synthetic", a directory of images or a
+            video file.
+        realtime: Playback clock of the recorded and synthetic sources.
+        camera_settings: CameraSource arguments, used for cameras.
+
+    Returns:
+        The FrameSource, not opened yet.
+    """
+    spec = str(spec)
+    if spec.isdigit():
+        camera_settings.pop("device", None)
+        return CameraSource(int(spec), **camera_settings)
+    if spec == "synthetic":
+        return SyntheticSource(realtime=realtime)
+    if os.path.isdir(spec):
+        return ImageDirectorySource(spec, realtime=realtime)
+    return VideoFileSource(spec, realtime=realtime)
@@ -0,0 +1,101 @@
+"""Cheap motion and presence gate in front of the pose pipeline.
+
+During a long hold, or when the user has walked away from the mat, running
+MoveNet, preprocessing, the classifier and the feedback rules on every frame
+gives the same answer again and again. `MotionGate` decides per frame whether
+the pipeline needs to run at all, by differencing a small grayscale thumbnail
+of the last crop region against the one seen at the last processed frame.
+After many frames without a person it switches to a low-FPS idle mode.
+"""
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Decides which frames need the full pose pipeline."""
+
+    def __init__(self, thumbnail_size=32, motion_threshold=3.0, max_skipped_frames=15,
+                 min_person_score=0.2, idle_after=45, idle_interval=0.5, idle_frame_delay=0.2):
+        """
+        Args:
+            thumbnail_size: Side of the grayscale thumbnail the crop region is
+                downsampled to before differencing.
+            motion_threshold: Mean absolute thumbnail difference (0-255) above
+                which the frame counts as changed.
+            max_skipped_frames: Process a frame at least this often even when
+                nothing moved, so the results never get too old.
+            min_person_score: Person score below which a frame counts as empty.
+            idle_after: Number of consecutive empty frames before idling.
+            idle_interval: Seconds between processed frames while idle.
+            idle_frame_delay: Seconds the capture loop should sleep per frame
+                while idle, to lower the frame rate.
+        """
+        self._thumbnail_size = (thumbnail_size, thumbnail_size)
+        self._motion_threshold = motion_threshold
+        self._max_skipped_frames = max_skipped_frames
+        self._min_person_score = min_person_score
+        self._idle_after = idle_after
+        self.idle_interval = idle_interval
+        self.idle_frame_delay = idle_frame_delay
+        self.reset()
+
+    def reset(self):
+        self._reference = None
+        self._skipped_frames = 0
+        self._empty_frames = 0
+        self._last_processed_time = 0.0
+        self.idle = False
+        self.frames = 0
+        self.processed_frames = 0
+
+    def _thumbnail(self, frame, crop_region):
+        """Downsampled grayscale view of the crop region (or the whole frame)."""
+        height, width = frame.shape[:2]
+        if crop_region is not None:
+            top = min(max(int(crop_region['y_min'] * height), 0), height - 1)
+            bottom = max(min(int(crop_region['y_max'] * height), height), top + 1)
+            left = min(max(int(crop_region['x_min'] * width), 0), width - 1)
+            right = max(min(int(crop_region['x_max'] * width), width), left + 1)
+            frame = frame[top:bottom, left:right]
+        small = cv2.resize(frame, self._thumbnail_size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+    def should_process(self, frame, crop_region=None):
+        """Returns whether the pipeline must run on this frame.
+
+        Args:
+            frame: The BGR camera frame.
+            crop_region: The crop region MoveNet will use next
+                (Movenet.crop_region), or None for the whole frame.
+        """
+        self.frames += 1
+        thumbnail = self._thumbnail(frame, crop_region)
+        moved = (self._reference is None or thumbnail.shape != self._reference.shape or
+                 np.mean(np.abs(thumbnail - self._reference)) > self._motion_threshold)
+
+        if self.idle:
+            process = moved or time.monotonic() - self._last_processed_time >= self.idle_interval
+        else:
+            process = moved or self._skipped_frames >= self._max_skipped_frames
+
+        if process:
+            self._reference = thumbnail
+            self._skipped_frames = 0
+            self._last_processed_time = time.monotonic()
+            self.processed_frames += 1
+        else:
+            self._skipped_frames += 1
+        return process
+
+    def observe(self, person):
+        """Records the result of a processed frame to track presence."""
+        # A NaN score (no confident keypoint) also counts as empty.
+        if person is not None and person.score >= self._min_person_score:
+            self._empty_frames = 0
+            self.idle = False
+        else:
+            self._empty_frames += 1
+            if self._empty_frames >= self._idle_after:
+                self.idle = True
@@ -0,0 +1,191 @@
+"""One-time TFLite interpreter calibration with a persisted device profile.
+
+`calibrate` benchmarks a model with different `num_threads` values and the
+available CPU delegate settings on synthetic input, and stores the fastest
+configuration in a small JSON profile keyed by model hash and CPU.
+`create_tuned_interpreter` then builds interpreters from that profile instead of
+guessing, falling back to 4 threads for models that were never calibrated.
+
+Usage:
+    python interpreter_tuning.py movenet_thunder.tflite [movenet_lightning.tflite ...]
+"""
+import argparse
+import functools
+import hashlib
+import json
+import os
+import platform
+import time
+
+import numpy as np
+
+# pylint: disable=g-import-not-at-top
+try:
+    # Import TFLite interpreter from tflite_runtime package if it's available.
+    from tflite_runtime import interpreter as tflite
+    Interpreter = tflite.Interpreter
+except ImportError:
+    # If not, fallback to use the TFLite interpreter from the full TF package.
+    import tensorflow as tf
+    tflite = tf.lite.experimental
+    Interpreter = tf.lite.Interpreter
+# pylint: enable=g-import-not-at-top
+
+DEFAULT_PROFILE_PATH = "./interpreter_profile.json"
+DEFAULT_NUM_THREADS = 4
+
+# Delegate settings that can be benchmarked. 'xnnpack' is the interpreter
+# default on CPU; 'builtin' disables the default delegates and runs the
+# reference kernels, which is faster for some quantized models.
+DELEGATE_XNNPACK = "xnnpack"
+DELEGATE_BUILTIN = "builtin"
+
+
+def _op_resolver_types():
+    """Returns the available delegate settings and their op resolver types."""
+    resolver = getattr(tflite, "OpResolverType", None)
+    if resolver is None:
+        return {DELEGATE_XNNPACK: None}
+    return {
+        DELEGATE_XNNPACK: resolver.AUTO,
+        DELEGATE_BUILTIN: resolver.BUILTIN_WITHOUT_DEFAULT_DELEGATES,
+    }
+
+
+def cpu_key():
+    """Identifies the host CPU for the profile."""
+    processor = platform.processor() or platform.machine()
+    return f"{platform.system()}-{processor}-{os.cpu_count()}cpu"
+
+
+@functools.lru_cache(maxsize=None)
+def _file_hash(path, mtime, size):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def model_hash(model_path):
+    """Returns a short content hash of the model file, cached by mtime."""
+    stat = os.stat(model_path)
+    return _file_hash(os.path.abspath(model_path), stat.st_mtime, stat.st_size)
+
+
+def profile_key(model_path):
+    return f"{model_hash(model_path)}:{cpu_key()}"
+
+
+def load_profile(profile_path=DEFAULT_PROFILE_PATH):
+    """Loads the whole profile, or an empty one if there is none."""
+    try:
+        with open(profile_path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def load_config(model_path, profile_path=DEFAULT_PROFILE_PATH):
+    """Returns the calibrated configuration for a model on this CPU, or None."""
+    if not os.path.exists(model_path):
+        return None
+    return load_profile(profile_path).get(profile_key(model_path))
+
+
+def create_interpreter(model_path, num_threads=None, delegate=None):
+    """Creates and allocates an interpreter with the given configuration."""
+    kwargs = {"model_path": model_path,
+              "num_threads": num_threads or DEFAULT_NUM_THREADS}
+    resolver_type = _op_resolver_types().get(delegate or DELEGATE_XNNPACK)
+    if resolver_type is not None:
+        kwargs["experimental_op_resolver_type"] = resolver_type
+    interpreter = Interpreter(**kwargs)
+    interpreter.allocate_tensors()
+    return interpreter
+
+
+def create_tuned_interpreter(model_path, profile_path=DEFAULT_PROFILE_PATH):
+    """Creates an interpreter using the calibrated profile when available."""
+    config = load_config(model_path, profile_path) or {}
+    return create_interpreter(model_path, config.get("num_threads"),
+                              config.get("delegate"))
+
+
+def benchmark(interpreter, runs=20, warmup=3):
+    """Returns the median invoke latency in milliseconds on synthetic input."""
+    input_details = interpreter.get_input_details()[0]
+    dtype = input_details["dtype"]
+    shape = input_details["shape"]
+    if np.issubdtype(dtype, np.integer):
+        synthetic = np.random.randint(0, 255, size=shape).astype(dtype)
+    else:
+        synthetic = np.random.uniform(0, 255, size=shape).astype(dtype)
+
+    latencies = []
+    for i in range(warmup + runs):
+        interpreter.set_tensor(input_details["index"], synthetic)
+        start = time.perf_counter()
+        interpreter.invoke()
+        if i >= warmup:
+            latencies.append((time.perf_counter() - start) * 1000)
+    return float(np.median(latencies))
+
+
+def calibrate(model_path, profile_path=DEFAULT_PROFILE_PATH, thread_counts=None, runs=20):
+    """Benchmarks the model configurations and saves the fastest one.
+
+    Args:
+        model_path: Path of the TFLite model.
+        profile_path: JSON profile to update.
+        thread_counts: `num_threads` values to try. Defaults to 1, 2, 4, ...
+            up to the number of CPUs.
+        runs: Number of timed invocations per configuration.
+
+    Returns:
+        dict: The saved configuration with its measured latency.
+    """
+    if thread_counts is None:
+        cpu_count = os.cpu_count() or DEFAULT_NUM_THREADS
+        thread_counts = sorted({min(2 ** i, cpu_count) for i in range(cpu_count.bit_length() + 1)})
+
+    results = []
+    for delegate in _op_resolver_types():
+        for num_threads in thread_counts:
+            try:
+                interpreter = create_interpreter(model_path, num_threads, delegate)
+            except (RuntimeError, ValueError) as e:
+                print(f"Skipping {delegate} with {num_threads} threads: {e}")
+                continue
+            latency = benchmark(interpreter, runs=runs)
+            print(f"{os.path.basename(model_path)}: {delegate}, {num_threads} threads -> {latency:.2f} ms")
+            results.append({"num_threads": num_threads, "delegate": delegate, "latency_ms": latency})
+
+    if not results:
+        raise RuntimeError(f"No interpreter configuration could run {model_path}")
+
+    best = min(results, key=lambda r: r["latency_ms"])
+    best["calibrated_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+
+    profile = load_profile(profile_path)
+    profile[profile_key(model_path)] = best
+    with open(profile_path, "w") as f:
+        json.dump(profile, f, indent=4)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate TFLite interpreter settings for this device.")
+    parser.add_argument("models", nargs="+", help="TFLite models to calibrate")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE_PATH, help="Profile file to update")
+    parser.add_argument("--threads", type=int, nargs="*", help="num_threads values to try")
+    parser.add_argument("--runs", type=int, default=20, help="Timed runs per configuration")
+    args = parser.parse_args()
+
+    for model in args.models:
+        best = calibrate(model, args.profile, args.threads, args.runs)
+        print(f"Saved {model}: {best['delegate']}, {best['num_threads']} threads ({best['latency_ms']:.2f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Temporal keypoint filtering with detector frame-skipping.
+
+Yoga poses are mostly static holds, so running MoveNet on every webcam frame
+wastes most of the work. `PoseFilter` sits between `Movenet` and the rest of
+the pipeline: a One-Euro filter per joint coordinate smooths the detector
+jitter and estimates each joint's velocity, which is used to extrapolate the
+keypoints on frames where the detector is skipped. The detector only runs
+every `detect_every` frames, or sooner when the predicted keypoints could have
+drifted too far from the last detection.
+"""
+import math
+import time
+
+import numpy as np
+
+from data import keypoints_array
+from data import pose_from_keypoint_array
+
+
+class OneEuroFilter:
+    """Vectorised One-Euro filter over an array of values.
+
+    The cutoff frequency grows with the estimated speed, so slow movements
+    (holding a pose) are smoothed strongly while fast ones keep little lag.
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=0.01, d_cutoff=1.0):
+        """
+        Args:
+            min_cutoff: Cutoff frequency in Hz at zero speed. Lower means smoother.
+            beta: Increase of the cutoff per unit of speed. Higher means less lag.
+            d_cutoff: Cutoff frequency in Hz used to smooth the speed estimate.
+        """
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self.value = None
+        self.velocity = None
+        self.timestamp = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, value, timestamp):
+        """Filters a new measurement taken at `timestamp` (seconds)."""
+        value = np.asarray(value, dtype=np.float64)
+        if self.value is None:
+            self.value = value.copy()
+            self.velocity = np.zeros_like(value)
+            self.timestamp = timestamp
+            return self.value
+
+        dt = max(timestamp - self.timestamp, 1e-6)
+        velocity = (value - self.value) / dt
+        self.velocity += self._alpha(self.d_cutoff, dt) * (velocity - self.velocity)
+
+        cutoff = self.min_cutoff + self.beta * np.abs(self.velocity)
+        self.value += self._alpha(cutoff, dt) * (value - self.value)
+        self.timestamp = timestamp
+        return self.value
+
+    def predict(self, timestamp):
+        """Extrapolates the filtered value to `timestamp` with the current velocity."""
+        return self.value + self.velocity * (timestamp - self.timestamp)
+
+
+class PoseFilter:
+    """Smooths MoveNet keypoints and skips the detector on static frames.
+
+    Call `detect` instead of `Movenet.detect` for every frame. It returns a
+    Person with filtered keypoints, either from a fresh detection or
+    extrapolated from the last one.
+    """
+
+    def __init__(self, movenet, detect_every=3, max_prediction_error=8.0, min_person_score=0.2,
+                 min_cutoff=1.0, beta=0.01, d_cutoff=1.0, keypoint_score_threshold=0.2):
+        """
+        Args:
+            movenet: The Movenet instance that runs the detector.
+            detect_every: Run the detector at least once every this many frames.
+            max_prediction_error: Run the detector as soon as a confident joint
+                may have moved more than this many pixels since the last detection.
+            min_person_score: Always run the detector on the next frame when the
+                last detection scored below this value.
+            min_cutoff, beta, d_cutoff: One-Euro filter parameters.
+            keypoint_score_threshold: Joints below this score are ignored when
+                estimating the prediction error.
+        """
+        if detect_every < 1:
+            raise ValueError("detect_every must be at least 1.")
+        self._movenet = movenet
+        self._detect_every = detect_every
+        self._max_prediction_error = max_prediction_error
+        self._min_person_score = min_person_score
+        self._keypoint_score_threshold = keypoint_score_threshold
+        self._filter = OneEuroFilter(min_cutoff, beta, d_cutoff)
+        self._scores = None
+        self._last_person = None
+        self._frames_since_detection = 0
+        self.frames = 0
+        self.detections = 0
+
+    def reset(self):
+        """Forgets the filter state, e.g. when the camera restarts."""
+        self._filter.reset()
+        self._scores = None
+        self._last_person = None
+        self._frames_since_detection = 0
+
+    @property
+    def detection_ratio(self):
+        """Fraction of the frames on which the detector actually ran."""
+        return self.detections / self.frames if self.frames else 0.0
+
+    def _prediction_error(self, timestamp):
+        """Largest distance a confident joint may have drifted since the last detection."""
+        confident = self._scores >= self._keypoint_score_threshold
+        if not confident.any():
+            return math.inf
+        elapsed = timestamp - self._filter.timestamp
+        speed = np.hypot(self._filter.velocity[:, 0], self._filter.velocity[:, 1])
+        return float(np.max(speed[confident])) * elapsed
+
+    def _should_detect(self, timestamp):
+        # The frame being decided counts too, so detect_every=1 detects on every frame
+        if self._last_person is None or self._frames_since_detection + 1 >= self._detect_every:
+            return True
+        # Also catches the NaN score of a frame without confident keypoints.
+        if not self._last_person.score >= self._min_person_score:
+            return True
+        return self._prediction_error(timestamp) > self._max_prediction_error
+
+    def detect(self, image, timestamp=None):
+        """Returns the filtered or predicted Person for a frame.
+
+        Args:
+            image: The [height, width, 3] frame, in the format Movenet expects.
+            timestamp: Capture time of the frame in seconds. Defaults to now.
+        """
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        self.frames += 1
+
+        if self._should_detect(timestamp):
+            person = self._movenet.detect(image)
+            self.detections += 1
+            self._frames_since_detection = 0
+            keypoints = keypoints_array(person)
+            self._scores = keypoints[:, 2].copy()
+            coordinates = self._filter(keypoints[:, :2], timestamp)
+            self._last_person = person
+        else:
+            self._frames_since_detection += 1
+            coordinates = self._filter.predict(timestamp)
+
+        # Whole pixels, like the coordinates of a detected pose
+        keypoints = np.column_stack([np.trunc(coordinates), self._scores])
+        return pose_from_keypoint_array(keypoints)
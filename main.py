@@ -2,34 +2,56 @@ import tkinter as tk
 from tkinter import PhotoImage, Toplevel
 from PIL import Image, ImageTk
 import threading
-from threading import Thread
 import cv2
 from movenet import Movenet  # Import the MoveNet class
-from movenet import draw_pose
+from movenet import PoseOverlay
 import tensorflow as tf
-import pyttsx3
 import time  # Add this import at the top of the file
-from preprocess import preprocess_for_prediction
+from preprocess import PosePreprocessor
 from tkinter import messagebox
 import requests
 import json
 import os
 from datetime import date, timedelta
 import subprocess
+from angle_calculator import ANGLE_KEYS
 from angle_calculator import extract_angles_from_person
-tts_engine = pyttsx3.init()
-
-from feedback import get_feedback
+from data import has_keypoints
+from frame_source import open_source
+from display import TkVideoDisplay
+from keypoint_filter import PoseFilter
+from inference_gate import MotionGate
+from pipeline import Pipeline
+from pose_classifier import BACKEND_TFLITE
+from pose_classifier import PoseModelRegistry
+from pose_classifier import load_classifier
+from pose_classifier import load_multi_classifier
+from pose_thresholds import DEFAULT_THRESHOLD
+from pose_thresholds import load_thresholds
+from speech import SpeechWorker
+
+from feedback import FEEDBACK_MESSAGES
+from feedback import FEEDBACK_POSES
+from feedback import FeedbackStabilizer
 # Load the model in an older compatible version
 
 
-angle_keys = [
-    'left_elbow', 'right_elbow',
-    'left_shoulder', 'right_shoulder',
-    'left_hip', 'right_hip',
-    'left_knee', 'right_knee',
-    'neck'
-]
+# "tflite" runs a cached TFLite conversion of each classifier, "keras" the
+# original .h5 model (slower, for debugging)
+CLASSIFIER_BACKEND = os.environ.get("POSE_CLASSIFIER_BACKEND", BACKEND_TFLITE)
+
+# Classifier score above which a pose counts as correct, calibrated with
+# pose_thresholds.py
+POSE_THRESHOLDS = load_thresholds(pose_names=FEEDBACK_POSES)
+
+# Pseudo pose name of the mode that recognises whichever pose is held
+FREE_PRACTICE = "Free Practice"
+
+def pose_threshold(pose_name):
+    return POSE_THRESHOLDS.get(pose_name, DEFAULT_THRESHOLD)
+
+# Order of the raw angles returned by the preprocessor
+angle_keys = ANGLE_KEYS
 
 def convert_to_angle_dict(raw_angles, angle_keys):
     """
@@ -42,21 +64,74 @@ def convert_to_angle_dict(raw_angles, angle_keys):
     return {key: angle for key, angle in zip(angle_keys, raw_angles)}
 
 
-def load_pose_model(pose_name):
+def pose_model_path(pose_name):
+    return f"./pose_models/{pose_name.lower()}/model.h5"
+
+def load_pose_model(pose_name, backend=CLASSIFIER_BACKEND):
     """Load the appropriate model for the given pose"""
     print(tf.__version__)
-    model_path = f"./pose_models/{pose_name.lower()}/model.h5"
     try:
-        model = tf.keras.models.load_model(model_path)
+        if pose_name == FREE_PRACTICE:
+            # One merged classifier scoring every pose that has a model
+            model_paths = {name: pose_model_path(name) for name in FEEDBACK_POSES
+                           if os.path.exists(pose_model_path(name))}
+            model = load_multi_classifier(model_paths, backend)
+        else:
+            model = load_classifier(pose_model_path(pose_name), backend)
         
         print(f"Successfully loaded model for {pose_name}")
         return model
     except Exception as e:
         print(f"Error loading model for {pose_name}: {e}")
         return None
+
+CORRECT_POSE_MESSAGE = "Correct Pose!"
+
+# Speaks the feedback on one thread, common phrases are pre-rendered to disk
+speech = SpeechWorker(phrases=[CORRECT_POSE_MESSAGE] + FEEDBACK_MESSAGES)
+speech.start()
+
+# Loaded pose classifiers. The likely next ones are loaded in the background
+# while the selection and disclaimer windows are open.
+pose_models = PoseModelRegistry(load_pose_model, max_models=3)
+
+def classify_person(model, person, threshold, preprocessor):
+    """
+    Classify one detected person.
+    preprocessor: The PosePreprocessor of the session.
+    Returns:
+        - pose_correct: Whether the classifier score is above the threshold.
+        - angle_dict: The raw angles, for the feedback rules.
+    """
+    keypoints_input, angles_input, angle_dict = preprocessor.features_from_pose(person)
+    predictions = model.predict([keypoints_input, angles_input])
+    print(f"Raw predictions: {predictions}, Shape: {predictions.shape}")
+    print(f"no. of Raw angles : {len(angle_dict)}")
+    return predictions[0][0] > threshold, angle_dict
+
+
+def recognise_person(model, person, preprocessor):
+    """
+    Find the pose held by a person with the merged classifier of all poses.
+    Returns:
+        - pose_name: The recognised pose (the closest one when none is correct).
+        - pose_correct: Whether its score is above its threshold.
+        - angle_dict: The raw angles, for the feedback rules.
+    """
+    keypoints_input, angles_input, angle_dict = preprocessor.features_from_pose(person)
+    thresholds = [pose_threshold(name) for name in model.pose_names]
+    pose_name, pose_correct, scores = model.recognise([keypoints_input, angles_input], thresholds)
+    return pose_name, pose_correct, angle_dict
+
+
 # Path to your local model folder (contains saved_model.pb and variables folder)
-model_path = ".\movenet_thunder.tflite"  # Update this to the path of your saved model
-movenet = Movenet(model_path)
+model_path = r".\movenet_thunder.tflite"  # Update this to the path of your saved model
+# Lightning is used instead of Thunder when a frame takes longer than the budget
+fast_model_path = r".\movenet_lightning.tflite"
+LATENCY_BUDGET_MS = 60
+movenet = Movenet(model_path, bgr_input=True,  # Frames come from cv2.VideoCapture
+                  fast_model_name=fast_model_path if os.path.exists(fast_model_path) else None,
+                  latency_budget_ms=LATENCY_BUDGET_MS)
 
 # Splash Screen
 def splash_screen():
@@ -76,7 +151,7 @@ def splash_screen():
     gif_label = tk.Label(splash, bg="white")
     gif_label.pack(expand=True, fill="both")
 
-    gif_image = Image.open(".\yoga_welcome.gif")  # Replace with your path
+    gif_image = Image.open(r".\yoga_welcome.gif")  # Replace with your path
     frames = []
     try:
         while True:
@@ -124,7 +199,7 @@ def login_window():
     root.geometry(f"600x400+{x_cordinate}+{y_cordinate}")
 
     # Load Image
-    image_path = ".\yoga_logo.jpg"  # Replace with the actual image path
+    image_path = r".\yoga_logo.jpg"  # Replace with the actual image path
     bg_image = Image.open(image_path)
     bg_image = bg_image.resize((250, 250), Image.Resampling.LANCZOS)
     bg_photo = ImageTk.PhotoImage(bg_image)
@@ -373,6 +448,9 @@ def pose_selection_window():
         root.destroy()
         login_window()  # Call your login function here
 
+    # The poses practised last are the most likely to be picked again
+    pose_models.preload(pose_models.recent())
+
     def open_profile():
         try:
             with open("current_user.json", "r") as f:
@@ -494,7 +572,7 @@ def pose_selection_window():
     right_frame.pack(side="right", fill="both", expand=True, padx=20, pady=20)
     
     # Load and display the yoga image
-    yoga_image_path = ".\yoga_image.png"  # Ensure correct file path
+    yoga_image_path = r".\yoga_image.png"  # Ensure correct file path
     img = Image.open(yoga_image_path)  
     img = img.resize((400, 500))  
     yoga_image = ImageTk.PhotoImage(img)  # Keep reference global
@@ -523,8 +601,8 @@ def pose_selection_window():
         "height": 2,
     }
 
-    # Grid Layout for Buttons (2 columns)
-    rows = (len(poses) + 1) // 2  # Distribute buttons evenly
+    # Grid Layout for Buttons (2 columns), with free practice after the poses
+    rows = (len(poses) + 2) // 2  # Distribute buttons evenly
     for i, pose in enumerate(poses):
         row, col = divmod(i, 2)
         btn = tk.Button(
@@ -534,6 +612,19 @@ def pose_selection_window():
             **button_style
         )
         btn.grid(row=row, column=col, padx=10, pady=5, sticky="ew")
+        # Start loading the classifier as soon as the pointer is on the button
+        btn.bind("<Enter>", lambda event, pose=pose: pose_models.preload([pose]))
+
+    # Free practice recognises the pose, so there is no single disclaimer to show
+    row, col = divmod(len(poses), 2)
+    free_practice_btn = tk.Button(
+        left_frame,
+        text=FREE_PRACTICE,
+        command=lambda: [root.destroy(), pose_execution_window(FREE_PRACTICE)],
+        **button_style
+    )
+    free_practice_btn.grid(row=row, column=col, padx=10, pady=5, sticky="ew")
+    free_practice_btn.bind("<Enter>", lambda event: pose_models.preload([FREE_PRACTICE]))
 
     # Exit Button at the bottom
     exit_btn = tk.Button(
@@ -618,6 +709,9 @@ pose_disclaimers = {
 }
 
 def show_disclaimer(pose):
+    # Load the classifier while the user reads the disclaimer
+    pose_models.preload([pose])
+
     # Create a new Toplevel window
     disclaimer_window = tk.Tk()
     disclaimer_window.title("Disclaimer")
@@ -693,154 +787,203 @@ def show_disclaimer(pose):
 
 # Declare global variables at the top
 camera_running = False  # Initialize as False
-cap = None  # Initialize the video capture object
+
+# Requested webcam format, MJPG gives the full frame rate on most USB cameras
+CAMERA_SETTINGS = dict(width=640, height=480, fps=30, fourcc="MJPG")
+# Camera index, video file, image directory or "synthetic", replayed in real time
+FRAME_SOURCE = os.environ.get("POSE_FRAME_SOURCE", "0")
 
 
 # Initialize the camera
 # Pose Execution Window with integrated MoveNet
 
-is_speaking = False
 import numpy as np 
 def pose_execution_window(pose_name):
-    global camera_running, cap
+    global camera_running
     camera_running = False
-    cap = None
+    # Read on its own thread, so the pipeline always gets the newest frame
+    camera = open_source(FRAME_SOURCE, **CAMERA_SETTINGS)
     
-    model=load_pose_model(pose_name)
+    model = pose_models.get(pose_name)
+    for stats in pose_models.stats():
+        print(f"Classifier {stats.pose_name}: loaded in {stats.load_seconds:.2f}s, "
+              f"{stats.memory_bytes / 1e6:.1f} MB")
     if model is None:
         print(f"Failed to load model for {pose_name}. Exiting.")
         return
-    # Initialize the text-to-speech engine
-    engine = pyttsx3.init()
-    # Function to speak feedback in a separate thread
-    def speak_feedback(feedback):
-        global is_speaking
-        is_speaking = True
-        tts_engine.say(feedback)
-        tts_engine.runAndWait()
-        is_speaking = False
-
-    engine.setProperty('rate', 150)  # Speed of speech (words per minute)
-    engine.setProperty('volume', 1.0)  # Volume level (0.0 to 1.0)
-    
     # Variable to store the last spoken feedback
     last_spoken_feedback = None
     last_spoken_time = 0  # Track the last time feedback was spoken
 
+    # Smooths keypoints and only runs MoveNet every few frames during holds
+    pose_filter = PoseFilter(movenet, detect_every=3)
+    # Skips the whole pipeline when nothing moves and idles when nobody is there
+    motion_gate = MotionGate()
+    # Loads the angle scaler once for the session
+    preprocessor = PosePreprocessor()
+    # Only lets real feedback changes through to the label and the speech
+    stabilizer = FeedbackStabilizer()
+    # Skeleton layer, only redrawn when the pose changes
+    pose_overlay = PoseOverlay()
+
+    # State shared by the pipeline stages of the session
+    last_result = None
+    active_model = initial_model = movenet.active_model
+    recognised_pose = None
+    # What the header and the feedback label currently show, updated from the main thread
+    shown_title = shown_reference = shown_feedback = None
+
+    pipeline = None
+
+    def process_frame(frame):
+        """Inference stage: pose, classification and feedback of one frame."""
+        nonlocal last_spoken_feedback, last_spoken_time, last_result, active_model, recognised_pose
+        if motion_gate.idle:
+            # Nobody on the mat, lower the frame rate
+            time.sleep(motion_gate.idle_frame_delay)
+
+        # Reuse the last results when nothing moved in the crop region
+        if last_result is not None and not motion_gate.should_process(frame, movenet.crop_region):
+            return dict(last_result, frame=frame)
+
+        # Detect keypoints using movenet, smoothed and skipped on static frames
+        detected_pose = pose_filter.detect(frame)
+        if movenet.active_model != active_model:
+            active_model = movenet.active_model
+            switch = movenet.switch_events[-1]
+            print(f"MoveNet switched from {switch.from_model} to {switch.to_model} "
+                  f"({switch.latency_ms:.1f} ms/frame)")
+
+        motion_gate.observe(detected_pose)
+
+        # Check if a pose is detected
+        if not has_keypoints(detected_pose):
+            state, _ = stabilizer.no_pose()
+        elif pose_name == FREE_PRACTICE:
+            # Score all poses at once and give feedback for the held one
+            recognised_pose, pose_correct, angle_dict = recognise_person(model, detected_pose, preprocessor)
+            state, _ = stabilizer.update(recognised_pose, angle_dict, pose_correct)
+        else:
+            # Predict the pose
+            pose_correct, angle_dict = classify_person(
+                model, detected_pose, pose_threshold(pose_name), preprocessor)
+            state, _ = stabilizer.update(pose_name, angle_dict, pose_correct)
+
+        if not state.pose_detected:
+            feedback = ("No Pose Detected", "white")
+        elif state.pose_correct:
+            feedback = (CORRECT_POSE_MESSAGE, "green")
+        else:
+            feedback = (list(state.messages), "red")
+
+        # Speak the feedback once it changed, and repeat corrections every 10 seconds.
+        # The speech queue only keeps the newest message, "Correct Pose!" first.
+        current_time = time.time()
+        if state.pose_detected and (
+                state.key != last_spoken_feedback or
+                (not state.pose_correct and not speech.speaking and current_time - last_spoken_time >= 10)):
+            if state.pose_correct:
+                speech.say(CORRECT_POSE_MESSAGE, priority=True)
+            elif state.messages:
+                speech.say(" ".join(state.messages))
+            last_spoken_feedback = state.key
+            last_spoken_time = current_time
+
+        last_result = {"pose": detected_pose, "correct": state.pose_correct,
+                       "highlighted": set(state.highlighted), "feedback": feedback}
+        return dict(last_result, frame=frame)
+
+    def render_frame(result):
+        """Render stage: draws the pose and converts the frame for Tkinter."""
+        # Resize for display first, so the pose is drawn at display resolution
+        frame = result["frame"]
+        resized_frame = display.resize(frame)
+        display_width, display_height = display.size
+
+        # Draw keypoints based on whether the pose is correct
+        pose_overlay.draw(resized_frame, result["pose"], detected=result["correct"],
+                          highlighted_keypoints=result["highlighted"],
+                          scale=(display_width / frame.shape[1], display_height / frame.shape[0]))
+
+        # Convert frame to RGB for Tkinter
+        return display.render(), result["feedback"], active_model, recognised_pose
+
+    def show_results():
+        """Shows the newest rendered frame, on the Tk main thread."""
+        nonlocal shown_title, shown_reference, shown_feedback
+        if not camera_running or pipeline is None:
+            return
+        # Pastes the frame into the label, dropped when it was already overwritten
+        packet = pipeline.poll()
+        if packet is not None:
+            _, feedback, model_path, held_pose = packet.data
+
+            # The frame carrying a feedback change may have been replaced,
+            # so compare with what is shown rather than waiting for a change
+            if feedback != shown_feedback:
+                shown_feedback = feedback
+                text, color = feedback
+                feedback_label.config(text=text, fg=color)
+
+            if pose_name == FREE_PRACTICE and held_pose is not None:
+                title = f"Pose: {FREE_PRACTICE} - {held_pose}"
+                if held_pose != shown_reference:
+                    shown_reference = held_pose
+                    show_reference_image(held_pose)
+            else:
+                title = f"Pose: {pose_name}"
+            if model_path != initial_model:
+                title += f"  [{os.path.basename(model_path)}]"
+            if title != shown_title:
+                shown_title = title
+                title_label.config(text=title)
+
+            if pipeline.displayed % 100 == 0:
+                print(pipeline.report())
+        elif not pipeline.running:
+            print(pipeline.report() if pipeline.displayed else "No frames were shown.")
+            return
+        window.after(10, show_results)
+
     def start_camera():
-        global camera_running, cap
-        camera_running = True
+        global camera_running
+        nonlocal pipeline, last_result, active_model, recognised_pose, shown_title, shown_reference, shown_feedback
+        if camera_running:
+            return
         update_streak()
-
-        def update_frame():
-            global camera_running
-            nonlocal last_spoken_feedback, last_spoken_time
-            while camera_running:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-
-                try:
-                    # Detect keypoints using movenet
-                    detected_pose = movenet.detect(frame)
-
-                    # Check if a pose is detected
-                    if detected_pose and hasattr(detected_pose, 'keypoints'):
-                        # Preprocess keypoints
-                        # Get the preprocessed inputs correctly
-                        threshold=0.4
-                        keypoints_input,angles_input,raw_angles=preprocess_for_prediction(detected_pose)
-                        if pose_name == "Bhujangasana":
-                            threshold=0.75
-                        elif pose_name =="Kumbhakasana":
-                            threshold=0.46
-                        elif pose_name=="Virabhadrasana":
-                            threshold=0.3
-                        elif pose_name=="Natarajasana":
-                            threshold=0.092
-                        elif pose_name=="Vrksasana":
-                            threshold=0.83
-                        elif pose_name=="Adhomukhasvanasana":
-                            threshold=0.93
-                        elif pose_name=="Trikonasana":
-                            threshold=0.98
-                        elif pose_name=="UtkataKonasana":
-                            threshold=0.85
-                    # Predict the pose
-                   
-                        predictions = model.predict([keypoints_input, angles_input])
-                        print(f"Raw predictions: {predictions}, Shape: {predictions.shape}")
-                        print(f"no. of Raw angles : {raw_angles.shape}")
-                        pose_correct = predictions[0][0] > threshold
-
-                        raw_angles = raw_angles.flatten()
-                        angle_dict = convert_to_angle_dict(raw_angles, angle_keys)
-                        feedback_messages, highlighted_keypoints = get_feedback(pose_name, angle_dict)
-
-
-                    # Use after method to update UI from thread
-                        window.after(0, lambda p=pose_correct: 
-                        feedback_label.config(text="Correct Pose!" if p else feedback_messages, 
-                                             fg="green" if p else "red"))
-
-                    # Draw keypoints based on whether the pose is correct
-                        frame_with_pose = draw_pose(frame, detected_pose, detected=pose_correct, highlighted_keypoints=highlighted_keypoints)
-
-                        # Provide audio feedback every 10 seconds or when feedback changes
-                        current_time = time.time()
-
-                        # Prioritize 'Correct Pose!' and interrupt with short message
-                        if pose_correct and not is_speaking:
-                            Thread(target=speak_feedback, args=("Correct Pose!",)).start()
-                            last_spoken_feedback = "Correct Pose!"
-                            last_spoken_time = current_time
-
-                        # Otherwise, speak feedback if it's different or enough time has passed
-                        elif not pose_correct and (feedback_messages != last_spoken_feedback or (current_time - last_spoken_time) >= 10):
-                            Thread(target=speak_feedback, args=(feedback_messages,)).start()
-                            last_spoken_feedback = feedback_messages
-                            last_spoken_time = current_time
-
-                        
-                    else:
-                        frame_with_pose = draw_pose(frame, detected_pose, detected=False)
-                        feedback_label.config(text="No Pose Detected", fg="white")
-
-                    # Convert frame to RGB for Tkinter
-                    frame_rgb = cv2.cvtColor(frame_with_pose, cv2.COLOR_BGR2RGB)
-
-                    # Resize and display
-                    resized_frame = cv2.resize(frame_rgb, 
-                                               (int(window.winfo_screenwidth() * 0.7), 
-                                                int(window.winfo_screenheight() * 0.7)))
-                    img = ImageTk.PhotoImage(Image.fromarray(resized_frame))
-                    camera_label.configure(image=img)
-                    camera_label.image = img
-
-                except Exception as e:
-                    print(f"Error in pose detection: {e}")
-
-                # Small delay for smoother performance
-                window.update()
-                window.after(10)
+        pose_filter.reset()
+        motion_gate.reset()
+        stabilizer.reset()
+        last_result = None
+        active_model = movenet.active_model
+        recognised_pose = shown_title = shown_reference = shown_feedback = None
 
         # Open camera
-        cap = cv2.VideoCapture(0)
-
-        # Rest of the code...
-        if not cap.isOpened():
+        if not camera.open():
             print("Error: Could not open camera.")
             return
 
-        # Start frame update in a separate thread
-        threading.Thread(target=update_frame, daemon=True).start()
+        # Capture, inference and render run on their own threads; the
+        # results are shown from the Tk main thread
+        camera_running = True
+        pipeline = Pipeline(camera.read, process_frame, render_frame,
+                            display=lambda rendered: display.show(rendered[0]))
+        pipeline.start()
+        show_results()
 
     def stop_camera():
         global camera_running
+        nonlocal pipeline
         camera_running = False
-        if cap is not None:
-            cap.release()
-        camera_label.configure(image='')
+        if pipeline is not None:
+            pipeline.stop()
+            pipeline = None
+        stats = camera.stats()
+        if stats.captured:
+            print(f"Frame source: {stats.captured} frames at {stats.fps:.1f} FPS, "
+                  f"{stats.dropped} dropped, {stats.duplicated} duplicated")
+        camera.release()
+        display.clear()
 
     def resize_with_aspect_ratio(image, target_width, target_height):
         """Resize image maintaining aspect ratio to fit within target dimensions"""
@@ -895,24 +1038,35 @@ def pose_execution_window(pose_name):
 
     camera_label = tk.Label(camera_frame, bg="black")
     camera_label.pack(fill="both", expand=True)
+    # Frames are resized and converted into preallocated buffers and pasted into one PhotoImage
+    display = TkVideoDisplay(camera_label, screen_width * 0.7, screen_height * 0.7)
 
     # Reference Image
     reference_frame = tk.Frame(video_ref_frame, bg="#f0f0f0", width=int(screen_width * 0.3), height=int(screen_height * 0.7))
     reference_frame.pack(side="right", padx=5)
     reference_frame.pack_propagate(False)
 
-    # Load the reference image
-    reference_image = Image.open(f"./images/{pose_name.lower()}.jpg")
-    target_width = int(screen_width * 0.3)
-    target_height = int(screen_height * 0.7)
+    # Create the label of the reference image
+    reference_label = tk.Label(reference_frame, bg="#f0f0f0")
+    reference_label.pack(expand=True)
 
-    resized_image = resize_with_aspect_ratio(reference_image, target_width, target_height)
-    photo_image = ImageTk.PhotoImage(resized_image)
+    def show_reference_image(name):
+        image_path = f"./images/{name.lower()}.jpg"
+        if not os.path.exists(image_path):
+            # e.g. free practice before a pose is recognised
+            reference_label.configure(image='')
+            reference_label.image = None
+            return
+        reference_image = Image.open(image_path)
+        target_width = int(screen_width * 0.3)
+        target_height = int(screen_height * 0.7)
 
-    # Create the label and store a reference to the image
-    reference_label = tk.Label(reference_frame, image=photo_image, bg="#f0f0f0")
-    reference_label.image = photo_image  # Keep a reference to avoid garbage collection
-    reference_label.pack(expand=True)
+        resized_image = resize_with_aspect_ratio(reference_image, target_width, target_height)
+        photo_image = ImageTk.PhotoImage(resized_image)
+        reference_label.configure(image=photo_image)
+        reference_label.image = photo_image  # Keep a reference to avoid garbage collection
+
+    show_reference_image(pose_name)
 
     # Feedback Frame with enhanced visibility
     feedback_frame = tk.Frame(window, bg="#2c3e50", height=int(screen_height * 0.1))
@@ -978,6 +1132,8 @@ def pose_execution_window(pose_name):
     def quit_application():
         stop_camera()
         window.destroy()
+        pose_models.shutdown()
+        speech.stop()
 
     quit_btn = tk.Button(
         button_container,
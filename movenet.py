@@ -15,24 +15,38 @@
 # limitations under the License.
 """Code to run a pose estimation with a TFLite MoveNet model."""
 
+import collections
 import os
-from typing import Dict, List
+import time
+from typing import Dict, List, NamedTuple
 
 import cv2
 from data import BodyPart
+from data import has_keypoints
+from data import keypoints_array
 from data import Person
 from data import person_from_keypoints_with_scores
+from interpreter_tuning import DEFAULT_PROFILE_PATH
+from interpreter_tuning import Interpreter
+from interpreter_tuning import create_tuned_interpreter
 import numpy as np
 from typing import Tuple
-# pylint: disable=g-import-not-at-top
-try:
-  # Import TFLite interpreter from tflite_runtime package if it's available.
-  from tflite_runtime.interpreter import Interpreter
-except ImportError:
-  # If not, fallback to use the TFLite interpreter from the full TF package.
-  import tensorflow as tf
-  Interpreter = tf.lite.Interpreter
-# pylint: enable=g-import-not-at-top
+
+# Keypoint index tables used by the crop region tracker.
+_HIP_JOINTS = np.array([BodyPart.LEFT_HIP.value, BodyPart.RIGHT_HIP.value])
+_SHOULDER_JOINTS = np.array(
+    [BodyPart.LEFT_SHOULDER.value, BodyPart.RIGHT_SHOULDER.value])
+_WRIST_JOINTS = np.array(
+    [BodyPart.LEFT_WRIST.value, BodyPart.RIGHT_WRIST.value])
+_TORSO_JOINTS = np.concatenate([_SHOULDER_JOINTS, _HIP_JOINTS])
+
+
+class ModelSwitchEvent(NamedTuple):
+  """A runtime switch between the accurate and the fast MoveNet model."""
+  timestamp: float
+  from_model: str
+  to_model: str
+  latency_ms: float
 
 
 class Movenet(object):
@@ -43,23 +57,88 @@ class Movenet(object):
   _MIN_CROP_KEYPOINT_SCORE = 0.2
   _TORSO_EXPANSION_RATIO = 3.0
   _BODY_EXPANSION_RATIO = 2.5
-
-  def __init__(self, model_name: str) -> None:
+  # How much the previous crop grows on a frame without a visible torso when
+  # crop smoothing is enabled.
+  _CROP_MISS_EXPANSION = 1.25
+
+  # Adaptive model switching: weight of the newest frame in the rolling
+  # latency estimate, fraction of the budget the fast model must stay under
+  # before switching back to the accurate one, and minimum number of frames
+  # between two switches. Each time the accurate model is switched out again
+  # right after being restored, the wait before the next attempt doubles up
+  # to _MAX_FRAMES_BEFORE_SWITCH_BACK.
+  _LATENCY_SMOOTHING = 0.1
+  _SWITCH_BACK_RATIO = 0.5
+  _MIN_FRAMES_BETWEEN_SWITCHES = 30
+  _MAX_FRAMES_BEFORE_SWITCH_BACK = 3000
+  _MAX_SWITCH_EVENTS = 100
+
+  def __init__(self,
+               model_name: str,
+               bgr_input: bool = False,
+               crop_smoothing: float = 0.0,
+               fast_model_name: str = None,
+               latency_budget_ms: float = None,
+               profile_path: str = DEFAULT_PROFILE_PATH) -> None:
     """Initialize a MoveNet pose estimation model.
 
     Args:
-      model_name: Name of the TFLite MoveNet model.
+      model_name: Name of the TFLite MoveNet model, e.g. Thunder.
+      bgr_input: Whether the images passed to detect are BGR, as returned by
+        OpenCV. They are converted to RGB while being cropped.
+      crop_smoothing: Weight in [0, 1) of the previous crop region when
+        computing the next one (exponential smoothing). 0 disables smoothing.
+      fast_model_name: Optional faster model, e.g. Lightning, to switch to
+        when `model_name` does not fit in the latency budget.
+      latency_budget_ms: Target per-frame latency of detect in milliseconds.
+        Only used together with `fast_model_name`.
+      profile_path: Device profile written by interpreter_tuning.calibrate.
+        Models found in it use their calibrated thread count and delegate.
     """
+    if not 0.0 <= crop_smoothing < 1.0:
+      raise ValueError('crop_smoothing must be in [0, 1).')
 
+    self._profile_path = profile_path
+    self._interpreters = collections.OrderedDict()
+    self._interpreters[model_name] = self._load_interpreter(model_name)
+    if fast_model_name is not None:
+      self._interpreters[fast_model_name] = self._load_interpreter(
+          fast_model_name)
+
+    self._crop_region = None
+    self._crop_smoothing = crop_smoothing
+
+    # Reusable buffers for the per-frame crop so that no new arrays are
+    # allocated while preparing the model input.
+    self._bgr_input = bgr_input
+    self._warp_matrix = np.zeros((2, 3), dtype=np.float64)
+    self._warp_buffer = None
+
+    # Adaptive model switching state.
+    self._accurate_model = model_name
+    self._fast_model = fast_model_name
+    self._latency_budget_ms = latency_budget_ms
+    self._latency_ms = None
+    self._frames_since_switch = 0
+    self._frames_before_switch_back = Movenet._MIN_FRAMES_BETWEEN_SWITCHES
+    self._switch_events = collections.deque(
+        maxlen=Movenet._MAX_SWITCH_EVENTS)
+
+    self._activate_model(model_name)
+
+  def _load_interpreter(self, model_name: str) -> Interpreter:
+    """Creates the TFLite interpreter of a MoveNet model."""
     # Append TFLITE extension to model_name if there's no extension
     _, ext = os.path.splitext(model_name)
     if not ext:
       model_name += '.tflite'
 
-    # Initialize model
-    interpreter = Interpreter(model_path=model_name, num_threads=4)
-    interpreter.allocate_tensors()
+    # Initialize model with the calibrated settings for this device, if any
+    return create_tuned_interpreter(model_name, self._profile_path)
 
+  def _activate_model(self, model_name: str) -> None:
+    """Makes `model_name` the interpreter used by detect and detect_batch."""
+    interpreter = self._interpreters[model_name]
     self._input_index = interpreter.get_input_details()[0]['index']
     self._output_index = interpreter.get_output_details()[0]['index']
 
@@ -67,7 +146,89 @@ class Movenet(object):
     self._input_width = interpreter.get_input_details()[0]['shape'][2]
 
     self._interpreter = interpreter
-    self._crop_region = None
+    self._active_model = model_name
+
+    input_shape = (self._input_height, self._input_width, 3)
+    if self._warp_buffer is None or self._warp_buffer.shape != input_shape:
+      self._warp_buffer = np.zeros(input_shape, dtype=np.uint8)
+      self._input_buffer = np.zeros_like(self._warp_buffer)
+
+    # State for batched inference (see detect_batch). Each slot of the batch
+    # keeps its own crop region so that N independent streams can be pushed
+    # through the interpreter together. The input is resized again on the
+    # next call because the interpreter may have been used with another
+    # batch size.
+    self._batch_size = None
+    self._batch_input = None
+    self._batch_crop_regions = []
+    self._supports_batch = True
+
+  @property
+  def crop_region(self) -> Dict[(str, float)]:
+    """The crop region the next call to detect will use, or None."""
+    return self._crop_region
+
+  @property
+  def active_model(self) -> str:
+    """Name of the model currently used for detection."""
+    return self._active_model
+
+  @property
+  def latency_ms(self) -> float:
+    """Rolling estimate of the detect latency in milliseconds."""
+    return self._latency_ms
+
+  @property
+  def switch_events(self) -> List[ModelSwitchEvent]:
+    """The most recent model switches, oldest first."""
+    return list(self._switch_events)
+
+  def _update_latency(self, latency_ms: float) -> None:
+    """Updates the rolling latency and switches models if needed.
+
+    The accurate model is replaced by the fast one as soon as the rolling
+    latency exceeds the budget. The accurate model is only restored once the
+    fast one has stayed well below the budget, and never sooner than
+    _MIN_FRAMES_BETWEEN_SWITCHES frames after the last switch (longer if the
+    previous attempt failed), so the two models do not keep alternating.
+    """
+    if self._latency_ms is None:
+      self._latency_ms = latency_ms
+    else:
+      self._latency_ms += Movenet._LATENCY_SMOOTHING * (
+          latency_ms - self._latency_ms)
+    self._frames_since_switch += 1
+
+    if (self._fast_model is None or self._latency_budget_ms is None or
+        self._frames_since_switch < Movenet._MIN_FRAMES_BETWEEN_SWITCHES):
+      return
+
+    if self._active_model == self._accurate_model:
+      if self._latency_ms > self._latency_budget_ms:
+        # Back off if the accurate model did not last after being restored.
+        if (self._switch_events and self._frames_since_switch <
+            2 * Movenet._MIN_FRAMES_BETWEEN_SWITCHES):
+          self._frames_before_switch_back = min(
+              self._frames_before_switch_back * 2,
+              Movenet._MAX_FRAMES_BEFORE_SWITCH_BACK)
+        else:
+          self._frames_before_switch_back = (
+              Movenet._MIN_FRAMES_BETWEEN_SWITCHES)
+        self._switch_model(self._fast_model)
+    elif (self._frames_since_switch >= self._frames_before_switch_back and
+          self._latency_ms <
+          self._latency_budget_ms * Movenet._SWITCH_BACK_RATIO):
+      self._switch_model(self._accurate_model)
+
+  def _switch_model(self, model_name: str) -> None:
+    """Switches to another model and records the switch event."""
+    self._switch_events.append(
+        ModelSwitchEvent(time.time(), self._active_model, model_name,
+                         self._latency_ms))
+    self._activate_model(model_name)
+    # The latency of the new model is measured from scratch.
+    self._latency_ms = None
+    self._frames_since_switch = 0
 
   def init_crop_region(self, image_height: int,
                        image_width: int) -> Dict[(str, float)]:
@@ -110,7 +271,8 @@ class Movenet(object):
     """Checks whether there are enough torso keypoints.
 
     This function checks whether the model is confident at predicting one of
-    the shoulders/hips which is required to determine a good crop region.
+    the shoulders/hips (or one of the wrists) which is required to determine a
+    good crop region.
 
     Args:
       keypoints: Detection result of Movenet model.
@@ -118,81 +280,65 @@ class Movenet(object):
     Returns:
       True/False
     """
-    left_hip_score = keypoints[BodyPart.LEFT_HIP.value, 2]
-    right_hip_score = keypoints[BodyPart.RIGHT_HIP.value, 2]
-    left_shoulder_score = keypoints[BodyPart.LEFT_SHOULDER.value, 2]
-    right_shoulder_score = keypoints[BodyPart.RIGHT_SHOULDER.value, 2]
-
-    left_hip_visible = left_hip_score > Movenet._MIN_CROP_KEYPOINT_SCORE
-    right_hip_visible = right_hip_score > Movenet._MIN_CROP_KEYPOINT_SCORE
-    left_shoulder_visible = left_shoulder_score > Movenet._MIN_CROP_KEYPOINT_SCORE
-    right_shoulder_visible = right_shoulder_score > Movenet._MIN_CROP_KEYPOINT_SCORE
-
-    left_wrist_score = keypoints[BodyPart.LEFT_WRIST.value, 2]
-    right_wrist_score = keypoints[BodyPart.RIGHT_WRIST.value, 2]
-    hands_joined = (left_wrist_score > Movenet._MIN_CROP_KEYPOINT_SCORE and
-                    right_wrist_score > Movenet._MIN_CROP_KEYPOINT_SCORE)
-    
-    left_wrist_visible = left_wrist_score > Movenet._MIN_CROP_KEYPOINT_SCORE
-    right_wrist_visible = right_wrist_score > Movenet._MIN_CROP_KEYPOINT_SCORE
-    
-    return ((left_hip_visible or right_hip_visible) and
-            (left_shoulder_visible or right_shoulder_visible)) or \
-           hands_joined or left_wrist_visible or right_wrist_visible
+    visible = keypoints[:, 2] > Movenet._MIN_CROP_KEYPOINT_SCORE
+    return bool((visible[_HIP_JOINTS].any() and visible[_SHOULDER_JOINTS].any())
+                or visible[_WRIST_JOINTS].any())
 
   def _determine_torso_and_body_range(self, keypoints: np.ndarray,
-                                      target_keypoints: Dict[(str, float)],
+                                      target_keypoints: np.ndarray,
                                       center_y: float,
                                       center_x: float) -> List[float]:
     """Calculates the maximum distance from each keypoints to the center.
 
     The function returns the maximum distances from the two sets of keypoints:
-    full 17 keypoints and 4 torso keypoints. The returned information will
-    be used to determine the crop size. See determine_crop_region for more
-    details.
+    all confidently detected keypoints and the 4 torso keypoints. The returned
+    information will be used to determine the crop size. See
+    determine_crop_region for more details.
 
     Args:
       keypoints: Detection result of Movenet model.
-      target_keypoints: The 4 torso keypoints.
+      target_keypoints: A [17, 2] array of keypoint (y, x) pixel coordinates.
       center_y (float): Vertical coordinate of the body center.
       center_x (float): Horizontal coordinate of the body center.
 
     Returns:
       The maximum distance from each keypoints to the center location.
     """
-    torso_joints = [
-        BodyPart.LEFT_SHOULDER, BodyPart.RIGHT_SHOULDER, BodyPart.LEFT_HIP,
-        BodyPart.RIGHT_HIP
-    ]
-    max_torso_yrange = 0.0
-    max_torso_xrange = 0.0
-    for joint in torso_joints:
-      dist_y = abs(center_y - target_keypoints[joint][0])
-      dist_x = abs(center_x - target_keypoints[joint][1])
-      if dist_y > max_torso_yrange:
-        max_torso_yrange = dist_y
-      if dist_x > max_torso_xrange:
-        max_torso_xrange = dist_x
-
-    max_body_yrange = 0.0
-    max_body_xrange = 0.0
-    for idx in range(len(BodyPart)):
-      if keypoints[BodyPart(idx).value, 2] < Movenet._MIN_CROP_KEYPOINT_SCORE:
-        continue
-      dist_y = abs(center_y - target_keypoints[joint][0])
-      dist_x = abs(center_x - target_keypoints[joint][1])
-      if dist_y > max_body_yrange:
-        max_body_yrange = dist_y
-
-      if dist_x > max_body_xrange:
-        max_body_xrange = dist_x
+    distances = np.abs(target_keypoints - np.array([center_y, center_x]))
+    max_torso_yrange, max_torso_xrange = distances[_TORSO_JOINTS].max(axis=0)
+
+    visible = keypoints[:, 2] >= Movenet._MIN_CROP_KEYPOINT_SCORE
+    if visible.any():
+      max_body_yrange, max_body_xrange = distances[visible].max(axis=0)
+    else:
+      max_body_yrange, max_body_xrange = 0.0, 0.0
 
     return [
         max_torso_yrange, max_torso_xrange, max_body_yrange, max_body_xrange
     ]
 
-  def _determine_crop_region(self, keypoints: np.ndarray, image_height: int,
-                             image_width: int) -> Dict[(str, float)]:
+  def _crop_region_from_box(self, center_y: float, center_x: float,
+                            crop_length_half: float, image_height: int,
+                            image_width: int) -> Dict[(str, float)]:
+    """Builds a normalized crop region from a square box in pixels."""
+    crop_length = crop_length_half * 2
+    y_min = (center_y - crop_length_half) / image_height
+    x_min = (center_x - crop_length_half) / image_width
+    return {
+        'y_min': y_min,
+        'x_min': x_min,
+        'y_max': y_min + crop_length / image_height,
+        'x_max': x_min + crop_length / image_width,
+        'height': crop_length / image_height,
+        'width': crop_length / image_width
+    }
+
+  def _determine_crop_region(
+      self,
+      keypoints: np.ndarray,
+      image_height: int,
+      image_width: int,
+      previous_crop_region: Dict[(str, float)] = None) -> Dict[(str, float)]:
     """Determines the region to crop the image for the model to run inference on.
 
     The algorithm uses the detected joints from the previous frame to
@@ -203,96 +349,141 @@ class Movenet(object):
     the function returns a default crop which is the full image padded to
     square.
 
+    If crop smoothing is enabled and the crop region of the previous frame is
+    given, the new box is blended with it. A frame without a visible torso
+    then widens the previous box instead of jumping straight back to the full
+    image, which only happens once the widened box covers the whole frame.
+
     Args:
       keypoints: Detection result of Movenet model.
       image_height (int): The input image width
       image_width (int): The input image height
+      previous_crop_region: The crop region used for the current frame.
 
     Returns:
       crop_region (dict): The crop region to run inference on.
     """
-    # Convert keypoint index to human-readable names.
-    target_keypoints = {}
-    for idx in range(len(BodyPart)):
-      target_keypoints[BodyPart(idx)] = [
-          keypoints[idx, 0] * image_height, keypoints[idx, 1] * image_width
-      ]
+    max_crop_length_half = max(image_width, image_height) / 2
+    smoothing = self._crop_smoothing if previous_crop_region else 0.0
+    if smoothing:
+      previous_center_y = (previous_crop_region['y_min'] +
+                           previous_crop_region['y_max']) / 2 * image_height
+      previous_center_x = (previous_crop_region['x_min'] +
+                           previous_crop_region['x_max']) / 2 * image_width
+      previous_length_half = previous_crop_region['height'] * image_height / 2
+
+    # Return the initial crop region if the torso isn't visible, unless the
+    # previous box can be widened to keep tracking.
+    if not self._torso_visible(keypoints):
+      if smoothing:
+        crop_length_half = previous_length_half * Movenet._CROP_MISS_EXPANSION
+        if crop_length_half < max_crop_length_half:
+          return self._crop_region_from_box(previous_center_y,
+                                            previous_center_x,
+                                            crop_length_half, image_height,
+                                            image_width)
+      return self.init_crop_region(image_height, image_width)
 
-    # Calculate crop region if the torso is visible.
-    if self._torso_visible(keypoints):
-      center_y = (target_keypoints[BodyPart.LEFT_HIP][0] +
-                  target_keypoints[BodyPart.RIGHT_HIP][0]) / 2
-      center_x = (target_keypoints[BodyPart.LEFT_HIP][1] +
-                  target_keypoints[BodyPart.RIGHT_HIP][1]) / 2
-
-      (max_torso_yrange, max_torso_xrange, max_body_yrange,
-       max_body_xrange) = self._determine_torso_and_body_range(
-           keypoints, target_keypoints, center_y, center_x)
-
-      fixed_padding = 0.2 # Adjust this value as needed
-      crop_length_half = np.amax([
-            max_torso_xrange * Movenet._TORSO_EXPANSION_RATIO + fixed_padding,
-            max_torso_yrange * Movenet._TORSO_EXPANSION_RATIO + fixed_padding,
-            max_body_yrange * Movenet._BODY_EXPANSION_RATIO + fixed_padding,
-            max_body_xrange * Movenet._BODY_EXPANSION_RATIO + fixed_padding
-        ])
-
-      # Adjust crop length so that it is still within the image border
-      distances_to_border = np.array(
-          [center_x, image_width - center_x, center_y, image_height - center_y])
-      crop_length_half = np.amin(
-          [crop_length_half, np.amax(distances_to_border)])
-
-      # If the body is large enough, there's no need to apply cropping logic.
-      if crop_length_half > max(image_width, image_height) / 2:
-        return self.init_crop_region(image_height, image_width)
-      # Calculate the crop region that nicely covers the full body.
-      else:
-        crop_length = crop_length_half * 2
-      crop_corner = [center_y - crop_length_half, center_x - crop_length_half]
-      return {
-          'y_min':
-              crop_corner[0] / image_height,
-          'x_min':
-              crop_corner[1] / image_width,
-          'y_max': (crop_corner[0] + crop_length) / image_height,
-          'x_max': (crop_corner[1] + crop_length) / image_width,
-          'height': (crop_corner[0] + crop_length) / image_height -
-                    crop_corner[0] / image_height,
-          'width': (crop_corner[1] + crop_length) / image_width -
-                   crop_corner[1] / image_width
-      }
-    # Return the initial crop regsion if the torso isn't visible.
-    else:
+    # Convert keypoints to pixel coordinates.
+    target_keypoints = keypoints[:, :2] * np.array([image_height, image_width])
+    center_y, center_x = target_keypoints[_HIP_JOINTS].mean(axis=0)
+
+    (max_torso_yrange, max_torso_xrange, max_body_yrange,
+     max_body_xrange) = self._determine_torso_and_body_range(
+         keypoints, target_keypoints, center_y, center_x)
+
+    fixed_padding = 0.2  # Adjust this value as needed
+    crop_length_half = max(
+        max(max_torso_xrange, max_torso_yrange) *
+        Movenet._TORSO_EXPANSION_RATIO,
+        max(max_body_xrange, max_body_yrange) *
+        Movenet._BODY_EXPANSION_RATIO) + fixed_padding
+
+    # Adjust crop length so that it is still within the image border
+    distances_to_border = np.array(
+        [center_x, image_width - center_x, center_y, image_height - center_y])
+    crop_length_half = min(crop_length_half, np.amax(distances_to_border))
+
+    if smoothing:
+      center_y = smoothing * previous_center_y + (1 - smoothing) * center_y
+      center_x = smoothing * previous_center_x + (1 - smoothing) * center_x
+      crop_length_half = (smoothing * previous_length_half +
+                          (1 - smoothing) * crop_length_half)
+
+    # If the body is large enough, there's no need to apply cropping logic.
+    if crop_length_half > max_crop_length_half:
       return self.init_crop_region(image_height, image_width)
 
+    # Calculate the crop region that nicely covers the full body.
+    return self._crop_region_from_box(center_y, center_x, crop_length_half,
+                                      image_height, image_width)
+
+  def _to_image_coordinates(self, keypoints_with_scores: np.ndarray,
+                            crop_region: Dict[(str, float)]) -> np.ndarray:
+    """Maps keypoints from crop coordinates back to the image in place."""
+    keypoints_with_scores[:, 0] *= crop_region['height']
+    keypoints_with_scores[:, 0] += crop_region['y_min']
+    keypoints_with_scores[:, 1] *= crop_region['width']
+    keypoints_with_scores[:, 1] += crop_region['x_min']
+    return keypoints_with_scores
+
   def _crop_and_resize(
       self, image: np.ndarray, crop_region: Dict[(str, float)],
-      crop_size: Tuple[int, int]) -> np.ndarray:
-    """Crops and resize the image to prepare for the model input."""
-    y_min, x_min, y_max, x_max = [
-        crop_region['y_min'], crop_region['x_min'], crop_region['y_max'],
-        crop_region['x_max']
-    ]
+      crop_size: Tuple[int, int],
+      output: np.ndarray = None) -> np.ndarray:
+    """Crops and resize the image to prepare for the model input.
 
-    crop_top = int(0 if y_min < 0 else y_min * image.shape[0])
-    crop_bottom = int(image.shape[0] if y_max >= 1 else y_max * image.shape[0])
-    crop_left = int(0 if x_min < 0 else x_min * image.shape[1])
-    crop_right = int(image.shape[1] if x_max >= 1 else x_max * image.shape[1])
+    Cropping, zero padding outside the image border and resizing are done by
+    a single affine warp that samples the crop region straight from the input
+    image. When the Movenet was created with `bgr_input=True` the colour
+    conversion to RGB is applied while copying the warped crop out, so the
+    frames from `cv2.VideoCapture` can be passed in unchanged.
 
-    padding_top = int(0 - y_min * image.shape[0] if y_min < 0 else 0)
-    padding_bottom = int((y_max - 1) * image.shape[0] if y_max >= 1 else 0)
-    padding_left = int(0 - x_min * image.shape[1] if x_min < 0 else 0)
-    padding_right = int((x_max - 1) * image.shape[1] if x_max >= 1 else 0)
+    Args:
+      image: The input image.
+      crop_region: The region of interest to run inference on.
+      crop_size: The size of the model input.
+      output: Optional [height, width, 3] uint8 buffer to write into, e.g. a
+        view of the interpreter input tensor. A buffer owned by this instance
+        is used if not given.
 
-    # Crop and resize image
-    output_image = image[crop_top:crop_bottom, crop_left:crop_right]
-    output_image = cv2.copyMakeBorder(output_image, padding_top, padding_bottom,
-                                      padding_left, padding_right,
-                                      cv2.BORDER_CONSTANT)
-    output_image = cv2.resize(output_image, (crop_size[0], crop_size[1]))
+    Returns:
+      The buffer holding the model input image.
+    """
+    image_height, image_width = image.shape[0], image.shape[1]
+    scale_x = crop_region['width'] * image_width / crop_size[1]
+    scale_y = crop_region['height'] * image_height / crop_size[0]
+    offset_x = crop_region['x_min'] * image_width
+    offset_y = crop_region['y_min'] * image_height
+
+    # Maps source pixel centres to model input pixel centres, the same
+    # convention cv2.resize uses.
+    transform = self._warp_matrix
+    transform[0, 0] = 1.0 / scale_x
+    transform[0, 2] = (0.5 - offset_x) / scale_x - 0.5
+    transform[1, 1] = 1.0 / scale_y
+    transform[1, 2] = (0.5 - offset_y) / scale_y - 0.5
+
+    if output is None:
+      output = self._input_buffer
+
+    if self._bgr_input:
+      cv2.warpAffine(
+          image,
+          transform, (crop_size[1], crop_size[0]),
+          dst=self._warp_buffer,
+          flags=cv2.INTER_LINEAR,
+          borderMode=cv2.BORDER_CONSTANT)
+      cv2.cvtColor(self._warp_buffer, cv2.COLOR_BGR2RGB, dst=output)
+    else:
+      cv2.warpAffine(
+          image,
+          transform, (crop_size[1], crop_size[0]),
+          dst=output,
+          flags=cv2.INTER_LINEAR,
+          borderMode=cv2.BORDER_CONSTANT)
 
-    return output_image
+    return output
 
   def _run_detector(
       self, image: np.ndarray, crop_region: Dict[(str, float)],
@@ -312,24 +503,20 @@ class Movenet(object):
       and scores.
     """
 
-    input_image = self._crop_and_resize(image, crop_region, crop_size=crop_size)
-    input_image = input_image.astype(dtype=np.uint8)
+    # Write the model input straight into the interpreter's input tensor. The
+    # view must be released before invoking the interpreter.
+    input_tensor = self._interpreter.tensor(self._input_index)()
+    self._crop_and_resize(
+        image, crop_region, crop_size=crop_size, output=input_tensor[0])
+    del input_tensor
 
-    self._interpreter.set_tensor(self._input_index,
-                                 np.expand_dims(input_image, axis=0))
     self._interpreter.invoke()
 
     keypoints_with_scores = self._interpreter.get_tensor(self._output_index)
-    keypoints_with_scores = np.squeeze(keypoints_with_scores)
+    keypoints_with_scores = keypoints_with_scores.reshape(len(BodyPart), 3)
 
     # Update the coordinates.
-    for idx in range(len(BodyPart)):
-      keypoints_with_scores[idx, 0] = crop_region[
-          'y_min'] + crop_region['height'] * keypoints_with_scores[idx, 0]
-      keypoints_with_scores[idx, 1] = crop_region[
-          'x_min'] + crop_region['width'] * keypoints_with_scores[idx, 1]
-
-    return keypoints_with_scores
+    return self._to_image_coordinates(keypoints_with_scores, crop_region)
 
   def detect(self,
              input_image: np.ndarray,
@@ -337,9 +524,10 @@ class Movenet(object):
     """Run detection on an input image.
 
     Args:
-      input_image: A [height, width, 3] RGB image. Note that height and width
-        can be anything since the image will be immediately resized according to
-        the needs of the model within this function.
+      input_image: A [height, width, 3] RGB image, or BGR if the Movenet was
+        created with `bgr_input=True`. Note that height and width can be
+        anything since the image will be immediately resized according to the
+        needs of the model within this function.
       reset_crop_region: Whether to use the crop region inferred from the
         previous detection result to improve accuracy. Set to True if this is a
         frame from a video. Set to False if this is a static image. Default
@@ -349,7 +537,9 @@ class Movenet(object):
       An array of shape [17, 3] representing the keypoint coordinates and
       scores.
     """
+    start_time = time.perf_counter()
     image_height, image_width, _ = input_image.shape
+    self._resize_batch(1)
     if (self._crop_region is None) or reset_crop_region:
       # Set crop region for the first frame.
       self._crop_region = self.init_crop_region(image_height, image_width)
@@ -362,19 +552,164 @@ class Movenet(object):
         crop_size=(self._input_height, self._input_width))
     # Calculate the crop region for the next frame
     self._crop_region = self._determine_crop_region(keypoint_with_scores,
-                                                    image_height, image_width)
+                                                    image_height, image_width,
+                                                    self._crop_region)
 
     # Convert the keypoints with scores to a Person data type
+    person = person_from_keypoints_with_scores(keypoint_with_scores,
+                                               image_height, image_width)
 
-    return person_from_keypoints_with_scores(keypoint_with_scores, image_height,
-                                             image_width)
+    self._update_latency((time.perf_counter() - start_time) * 1000)
+    return person
 
-import cv2
-import numpy as np
+  def _resize_batch(self, batch_size: int) -> bool:
+    """Resizes the interpreter input to hold `batch_size` frames.
+
+    The interpreter is only re-allocated when the batch size actually changes,
+    so repeated calls with the same batch size are free. Some models and
+    delegates cannot be resized to a batch; the input then stays at a single
+    frame and later calls do not retry.
 
+    Args:
+      batch_size: Number of frames the next invocation will run on.
 
-def draw_pose(frame, pose, detected=True, highlighted_keypoints=None):
-    from data import BodyPart
+    Returns:
+      Whether the interpreter input now holds `batch_size` frames.
+    """
+    if batch_size > 1 and not self._supports_batch:
+      self._resize_batch(1)
+      return False
+    if batch_size == self._batch_size and self._batch_input is not None:
+      return True
+
+    try:
+      self._interpreter.resize_tensor_input(
+          self._input_index,
+          [batch_size, self._input_height, self._input_width, 3])
+      self._interpreter.allocate_tensors()
+    except (RuntimeError, ValueError):
+      if batch_size == 1:
+        raise
+      self._supports_batch = False
+      # Restore the single frame input the failed resize may have replaced.
+      self._batch_input = None
+      self._resize_batch(1)
+      return False
+
+    self._batch_size = batch_size
+    self._batch_input = np.zeros(
+        (batch_size, self._input_height, self._input_width, 3), dtype=np.uint8)
+    return True
+
+  def detect_batch(self,
+                   input_images: List[np.ndarray],
+                   reset_crop_region: bool = False) -> List[Person]:
+    """Run detection on a batch of input images with a single invocation.
+
+    All frames are cropped and resized into one preallocated uint8 input
+    tensor and the interpreter is invoked once for the whole batch. Frame `i`
+    of the batch uses (and updates) its own crop region, so consecutive calls
+    can carry N independent video streams, e.g. one recording per slot.
+
+    Args:
+      input_images: A list of [height, width, 3] images, in the colour order
+        given at construction. Frames do not need to share the same size.
+      reset_crop_region: Whether to discard the crop regions inferred from the
+        previous batch. Set to True when the frames are unrelated static
+        images.
+
+    Returns:
+      A list of Person instances, one per input image, in the same order.
+    """
+    batch_size = len(input_images)
+    if batch_size == 0:
+      return []
+
+    if reset_crop_region or len(self._batch_crop_regions) != batch_size:
+      self._batch_crop_regions = [None] * batch_size
+
+    crop_size = (self._input_height, self._input_width)
+    crop_regions = self._batch_crop_regions
+    for idx, image in enumerate(input_images):
+      if crop_regions[idx] is None:
+        image_height, image_width, _ = image.shape
+        crop_regions[idx] = self.init_crop_region(image_height, image_width)
+
+    if self._resize_batch(batch_size):
+      input_batch = self._batch_input
+      for idx, image in enumerate(input_images):
+        self._crop_and_resize(
+            image, crop_regions[idx], crop_size=crop_size,
+            output=input_batch[idx])
+
+      self._interpreter.set_tensor(self._input_index, input_batch)
+      self._interpreter.invoke()
+
+      keypoints_with_scores = self._interpreter.get_tensor(self._output_index)
+      keypoints_with_scores = keypoints_with_scores.reshape(
+          batch_size, len(BodyPart), 3)
+      # Update the coordinates.
+      for idx in range(batch_size):
+        self._to_image_coordinates(keypoints_with_scores[idx],
+                                   crop_regions[idx])
+    else:
+      # The model cannot run a batch with this delegate, so the frames are
+      # run one by one.
+      keypoints_with_scores = [
+          self._run_detector(image, crop_regions[idx], crop_size=crop_size)
+          for idx, image in enumerate(input_images)
+      ]
+
+    persons = []
+    for idx, image in enumerate(input_images):
+      image_height, image_width, _ = image.shape
+      keypoints = keypoints_with_scores[idx]
+
+      # Calculate the crop region for the next batch
+      crop_regions[idx] = self._determine_crop_region(keypoints, image_height,
+                                                      image_width,
+                                                      crop_regions[idx])
+      persons.append(
+          person_from_keypoints_with_scores(keypoints, image_height,
+                                            image_width))
+
+    return persons
+
+# Skeleton edges as [12, 2] keypoint indices
+SKELETON_EDGES = np.array([
+    (BodyPart.LEFT_SHOULDER.value, BodyPart.RIGHT_SHOULDER.value),
+    (BodyPart.LEFT_SHOULDER.value, BodyPart.LEFT_ELBOW.value),
+    (BodyPart.RIGHT_SHOULDER.value, BodyPart.RIGHT_ELBOW.value),
+    (BodyPart.LEFT_ELBOW.value, BodyPart.LEFT_WRIST.value),
+    (BodyPart.RIGHT_ELBOW.value, BodyPart.RIGHT_WRIST.value),
+    (BodyPart.LEFT_SHOULDER.value, BodyPart.LEFT_HIP.value),
+    (BodyPart.RIGHT_SHOULDER.value, BodyPart.RIGHT_HIP.value),
+    (BodyPart.LEFT_HIP.value, BodyPart.RIGHT_HIP.value),
+    (BodyPart.LEFT_HIP.value, BodyPart.LEFT_KNEE.value),
+    (BodyPart.RIGHT_HIP.value, BodyPart.RIGHT_KNEE.value),
+    (BodyPart.LEFT_KNEE.value, BodyPart.LEFT_ANKLE.value),
+    (BodyPart.RIGHT_KNEE.value, BodyPart.RIGHT_ANKLE.value),
+], dtype=np.intp)
+
+KEYPOINT_DRAW_THRESHOLD = 0.2
+EDGE_DRAW_THRESHOLD = 0.3
+KEYPOINT_RADIUS = 7
+EDGE_THICKNESS = 2
+
+_BODY_PART_INDEX = {part.name.lower(): part.value for part in BodyPart}
+
+
+def _highlight_mask(highlighted_keypoints):
+    """[17] boolean mask of the highlighted keypoint names (any case)."""
+    mask = np.zeros(len(BodyPart), dtype=bool)
+    for name in highlighted_keypoints or ():
+        index = _BODY_PART_INDEX.get(name.lower())
+        if index is not None:
+            mask[index] = True
+    return mask
+
+
+def draw_pose(frame, pose, detected=True, highlighted_keypoints=None, scale=1.0):
     """Draw keypoints and skeleton on the frame, highlighting only incorrect joints in red.
 
     Args:
@@ -382,69 +717,88 @@ def draw_pose(frame, pose, detected=True, highlighted_keypoints=None):
         pose: A Person object containing keypoints.
         detected: Boolean indicating whether a pose is detected.
         highlighted_keypoints: Set of keypoints to highlight in red (e.g., {'left_shoulder', 'right_knee'}).
+        scale: Factor, or (x, y) factors, from the keypoint coordinates to
+            the frame, e.g. to draw on a frame resized for display.
 
     Returns:
         Frame with keypoints and skeleton drawn, and incorrect joints highlighted.
     """
-    if not pose or not hasattr(pose, 'keypoints'):
+    if not has_keypoints(pose):
         return frame
 
-    if highlighted_keypoints is None:
-        highlighted_keypoints = set()
-    
-    # Convert all highlighted keypoints to lowercase for consistent comparison
-    highlighted_keypoints = {kp.lower() for kp in highlighted_keypoints}
-    
-    # Debug print - uncomment if needed
-    print(f"Highlighting keypoints: {highlighted_keypoints}")
+    keypoints = keypoints_array(pose)
+    points = (keypoints[:, :2] * scale if scale != 1.0 else keypoints[:, :2]).astype(np.int32)
+    scores = keypoints[:, 2]
 
     # Choose color based on whether a pose is detected
-    keypoint_color = (0, 255, 0) if detected else (255, 255, 255)  # Green or White
-    skeleton_color = (0, 255, 0) if detected else (255, 255, 255)  # Green or White
+    color = (0, 255, 0) if detected else (255, 255, 255)  # Green or White
     highlight_color = (0, 0, 255)  # Red for highlighted keypoints
 
     # Draw keypoints
-    for keypoint in pose.keypoints:
-        if keypoint.score > 0.2:  # Lowered from 0.3
-            x, y = int(keypoint.coordinate.x), int(keypoint.coordinate.y)
-            
-            # Get the part name in lowercase
-            part_name = keypoint.body_part.name.lower()
-            
-            # Check if this keypoint should be highlighted
-            color = highlight_color if part_name in highlighted_keypoints else keypoint_color
-            
-            # Draw larger circles for better visibility
-            cv2.circle(frame, (x, y), 7, color, -1)
-            
-            # Optionally add labels
-            # cv2.putText(frame, part_name, (x+10, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
-
-    # Draw skeleton connections (without highlighting)
-    skeleton = [
-        (BodyPart.LEFT_SHOULDER, BodyPart.RIGHT_SHOULDER),
-        (BodyPart.LEFT_SHOULDER, BodyPart.LEFT_ELBOW),
-        (BodyPart.RIGHT_SHOULDER, BodyPart.RIGHT_ELBOW),
-        (BodyPart.LEFT_ELBOW, BodyPart.LEFT_WRIST),
-        (BodyPart.RIGHT_ELBOW, BodyPart.RIGHT_WRIST),
-        (BodyPart.LEFT_SHOULDER, BodyPart.LEFT_HIP),
-        (BodyPart.RIGHT_SHOULDER, BodyPart.RIGHT_HIP),
-        (BodyPart.LEFT_HIP, BodyPart.RIGHT_HIP),
-        (BodyPart.LEFT_HIP, BodyPart.LEFT_KNEE),
-        (BodyPart.RIGHT_HIP, BodyPart.RIGHT_KNEE),
-        (BodyPart.LEFT_KNEE, BodyPart.LEFT_ANKLE),
-        (BodyPart.RIGHT_KNEE, BodyPart.RIGHT_ANKLE),
-    ]
+    highlighted = _highlight_mask(highlighted_keypoints)
+    centers = points.tolist()
+    for index in np.flatnonzero(scores > KEYPOINT_DRAW_THRESHOLD):
+        cv2.circle(frame, centers[index], KEYPOINT_RADIUS,
+                   highlight_color if highlighted[index] else color, -1)
 
-    for start_part, end_part in skeleton:
-        start_keypoint = next((kp for kp in pose.keypoints if kp.body_part == start_part), None)
-        end_keypoint = next((kp for kp in pose.keypoints if kp.body_part == end_part), None)
+    # Draw skeleton connections (without highlighting) in one call
+    visible = (scores[SKELETON_EDGES] > EDGE_DRAW_THRESHOLD).all(axis=1)
+    if visible.any():
+        cv2.polylines(frame, list(points[SKELETON_EDGES[visible]]), False, color, EDGE_THICKNESS)
 
-        if start_keypoint and end_keypoint and start_keypoint.score > 0.3 and end_keypoint.score > 0.3:  # Lowered from 0.5
-            start_point = (int(start_keypoint.coordinate.x), int(start_keypoint.coordinate.y))
-            end_point = (int(end_keypoint.coordinate.x), int(end_keypoint.coordinate.y))
-            
-            # Draw skeleton in default color (no highlighting)
-            cv2.line(frame, start_point, end_point, skeleton_color, 2)
+    return frame
+
+
+class PoseOverlay:
+    """Reusable layer the skeleton is drawn into and composited from.
+
+    The skeleton is only redrawn when the pose or its style changes, e.g. not
+    for frames that reuse the last result, and only the bounding box of the
+    drawing is cleared and copied onto the frame.
+    """
+
+    def __init__(self):
+        self._layer = None
+        self._mask = None
+        self._box = None
+        self._drawn = None
+
+    def draw(self, frame, pose, detected=True, highlighted_keypoints=None, scale=1.0):
+        """Draws the pose onto `frame` in place, see `draw_pose`."""
+        if self._layer is None or self._layer.shape != frame.shape:
+            self._layer = np.zeros_like(frame)
+            self._box = self._drawn = None
+
+        style = (detected, frozenset(highlighted_keypoints or ()), scale)
+        if self._drawn is None or self._drawn[0] is not pose or self._drawn[1] != style:
+            self._redraw(pose, detected, highlighted_keypoints, scale)
+            self._drawn = (pose, style)
+
+        if self._box is not None:
+            x_min, y_min, x_max, y_max = self._box
+            region = frame[y_min:y_max, x_min:x_max]
+            cv2.copyTo(self._layer[y_min:y_max, x_min:x_max], self._mask, region)
+        return frame
 
-    return frame
\ No newline at end of file
+    def _redraw(self, pose, detected, highlighted_keypoints, scale):
+        if self._box is not None:
+            x_min, y_min, x_max, y_max = self._box
+            self._layer[y_min:y_max, x_min:x_max] = 0
+            self._box = None
+        if not has_keypoints(pose):
+            return
+
+        draw_pose(self._layer, pose, detected, highlighted_keypoints, scale)
+        keypoints = keypoints_array(pose)
+        shown = keypoints[keypoints[:, 2] > KEYPOINT_DRAW_THRESHOLD, :2]
+        if len(shown) == 0:
+            return
+        points = (shown * scale).astype(np.int32)
+        height, width = self._layer.shape[:2]
+        margin = KEYPOINT_RADIUS + EDGE_THICKNESS
+        x_min, y_min = np.maximum(points.min(axis=0) - margin, 0)
+        x_max, y_max = np.minimum(points.max(axis=0) + margin + 1, (width, height))
+        if x_min < x_max and y_min < y_max:
+            self._box = (int(x_min), int(y_min), int(x_max), int(y_max))
+            # Pixels of the drawing, all its colors are non-zero
+            self._mask = (self._layer[y_min:y_max, x_min:x_max].max(axis=2) > 0).view(np.uint8)
@@ -0,0 +1,201 @@
+# Copyright 2021 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Code to run a multi-person pose estimation with a TFLite MoveNet model."""
+
+import os
+import time
+from typing import List
+
+import cv2
+from data import Person
+from data import Point
+from data import Rectangle
+from data import person_from_keypoints_with_scores
+from interpreter_tuning import DEFAULT_PROFILE_PATH
+from interpreter_tuning import create_tuned_interpreter
+import numpy as np
+from tracker import BoundingBoxTracker
+from tracker import KeypointTracker
+from tracker import TrackerConfig
+
+
+class MovenetMultiPose(object):
+  """A wrapper class for a MultiPose TFLite pose estimation model.
+
+  One inference returns up to 6 persons. The persons are passed through a
+  tracker so that the same student keeps the same `Person.id` across frames.
+  """
+
+  # MultiPose models return 6 detections with 17 keypoints (y, x, score)
+  # followed by the bounding box (y_min, x_min, y_max, x_max, score).
+  _MAX_DETECTIONS = 6
+  _NUM_KEYPOINTS = 17
+  # Dynamic shape models need input sizes that are a multiple of 32.
+  _SIZE_MULTIPLE = 32
+
+  def __init__(self,
+               model_name: str,
+               tracker_type: str = 'bounding_box',
+               input_size: int = 256,
+               bgr_input: bool = False,
+               tracker_config: TrackerConfig = TrackerConfig(),
+               profile_path: str = DEFAULT_PROFILE_PATH) -> None:
+    """Initialize a MultiPose pose estimation model.
+
+    Args:
+      model_name: Name of the TFLite multipose MoveNet model.
+      tracker_type: Type of tracker used to assign ids, 'bounding_box' (IoU),
+        'keypoint' (keypoint similarity) or None to disable tracking.
+      input_size: Length of the longer image side fed to models with a
+        dynamic input shape.
+      bgr_input: Whether the images passed to detect are BGR, as returned by
+        OpenCV. They are converted to RGB after being resized.
+      tracker_config: Parameters of the tracker.
+      profile_path: Device profile written by interpreter_tuning.calibrate.
+    """
+
+    # Append TFLITE extension to model_name if there's no extension
+    _, ext = os.path.splitext(model_name)
+    if not ext:
+      model_name += '.tflite'
+
+    interpreter = create_tuned_interpreter(model_name, profile_path)
+
+    input_details = interpreter.get_input_details()[0]
+    self._input_index = input_details['index']
+    self._input_type = input_details['dtype']
+    self._output_index = interpreter.get_output_details()[0]['index']
+
+    # Models with a [1, 1, 1, 3] input accept any size and are resized to
+    # match each frame.
+    self._input_height = input_details['shape'][1]
+    self._input_width = input_details['shape'][2]
+    self._is_dynamic_shape_model = self._input_height == 1
+    self._input_size = input_size
+    self._bgr_input = bgr_input
+    # Shape the dynamic input tensor was last resized and allocated to
+    self._allocated_shape = None
+
+    self._interpreter = interpreter
+
+    if tracker_type == 'keypoint':
+      self._tracker = KeypointTracker(tracker_config)
+    elif tracker_type == 'bounding_box':
+      self._tracker = BoundingBoxTracker(tracker_config)
+    elif tracker_type is None:
+      self._tracker = None
+    else:
+      raise ValueError('Tracker type not supported: {}'.format(tracker_type))
+
+  @property
+  def track_ids(self) -> List[int]:
+    """Ids of the live tracks, empty when tracking is disabled.
+
+    A track outlives the frames its person is missed in for up to
+    `TrackerConfig.max_age`, so per-person state can be dropped when its id
+    is no longer listed here.
+    """
+    return self._tracker.track_ids if self._tracker is not None else []
+
+  def _model_input_size(self, image_height: int, image_width: int):
+    """Returns the (height, width) the frame is resized to."""
+    if not self._is_dynamic_shape_model:
+      return self._input_height, self._input_width
+
+    # Scale the longer side to input_size, keep the aspect ratio and round
+    # both sides up to the next multiple of 32.
+    scale = self._input_size / max(image_height, image_width)
+    multiple = MovenetMultiPose._SIZE_MULTIPLE
+    target_height = int(np.ceil(image_height * scale / multiple) * multiple)
+    target_width = int(np.ceil(image_width * scale / multiple) * multiple)
+    return target_height, target_width
+
+  def detect(self,
+             input_image: np.ndarray,
+             detection_threshold: float = 0.11,
+             timestamp: int = None) -> List[Person]:
+    """Run detection on an input image.
+
+    Args:
+      input_image: A [height, width, 3] RGB image, or BGR when the model was
+        created with `bgr_input=True`.
+      detection_threshold: Minimum person score for a detection to be
+        returned.
+      timestamp: Time of the frame in milliseconds, used to expire stale
+        tracks. Defaults to the current time.
+
+    Returns:
+      A list of up to 6 Person instances, with `id` set when tracking is
+      enabled.
+    """
+    image_height, image_width, _ = input_image.shape
+    target_height, target_width = self._model_input_size(
+        image_height, image_width)
+
+    resized_image = cv2.resize(input_image, (target_width, target_height))
+    if self._bgr_input:
+      cv2.cvtColor(resized_image, cv2.COLOR_BGR2RGB, dst=resized_image)
+    input_tensor = np.expand_dims(resized_image, axis=0)
+    # Reallocating the interpreter is slow, only do it when the frame size
+    # changes.
+    if (self._is_dynamic_shape_model and
+        input_tensor.shape != self._allocated_shape):
+      self._interpreter.resize_tensor_input(
+          self._input_index, input_tensor.shape, strict=True)
+      self._interpreter.allocate_tensors()
+      self._allocated_shape = input_tensor.shape
+
+    self._interpreter.set_tensor(self._input_index,
+                                 input_tensor.astype(self._input_type))
+    self._interpreter.invoke()
+
+    detections = self._interpreter.get_tensor(self._output_index)
+    detections = detections.reshape(MovenetMultiPose._MAX_DETECTIONS, -1)
+
+    persons = self._persons_from_detections(detections, image_height,
+                                            image_width, detection_threshold)
+
+    if self._tracker is not None:
+      if timestamp is None:
+        timestamp = int(time.time() * 1000)
+      persons = self._tracker.apply(persons, timestamp)
+
+    return persons
+
+  def _persons_from_detections(self, detections: np.ndarray,
+                               image_height: int, image_width: int,
+                               detection_threshold: float) -> List[Person]:
+    """Converts the [6, 56] model output to a list of Person instances."""
+    num_keypoint_values = MovenetMultiPose._NUM_KEYPOINTS * 3
+    persons = []
+    for detection in detections:
+      person_score = detection[num_keypoint_values + 4]
+      if person_score < detection_threshold:
+        continue
+
+      keypoints_with_scores = detection[:num_keypoint_values].reshape(
+          MovenetMultiPose._NUM_KEYPOINTS, 3)
+      person = person_from_keypoints_with_scores(keypoints_with_scores,
+                                                 image_height, image_width)
+
+      # MultiPose models return their own bounding box and person score.
+      y_min, x_min, y_max, x_max = detection[num_keypoint_values:
+                                             num_keypoint_values + 4]
+      bounding_box = Rectangle(
+          Point(int(x_min * image_width), int(y_min * image_height)),
+          Point(int(x_max * image_width), int(y_max * image_height)))
+      persons.append(
+          person._replace(bounding_box=bounding_box, score=person_score))
+
+    return persons
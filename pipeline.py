@@ -0,0 +1,231 @@
+"""Staged capture -> inference -> render pipeline with latest-wins queues.
+
+Every stage runs on its own thread and hands its output to the next stage
+through a `LatestQueue`, which holds a single item: a new item replaces the
+one waiting, so a slow stage never builds up a backlog and always works on
+the newest frame. Each frame carries the time it was captured, frames older
+than `max_age` are dropped, and `Pipeline.poll` measures the glass-to-glass
+latency when the UI picks up a rendered frame on the main thread, where an
+optional display function is timed as the last stage.
+"""
+import threading
+import time
+from typing import Any, NamedTuple
+
+
+class Packet(NamedTuple):
+    """A frame, or what a stage made of it, on its way through the pipeline."""
+    index: int
+    capture_time: float  # time.perf_counter() right after the frame was read
+    data: Any
+
+
+class LatestQueue:
+    """Size-1 queue where a new item replaces the waiting one."""
+
+    def __init__(self):
+        self._item = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._condition:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        """Takes the waiting item, or returns None on timeout or when closed."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._item is not None or self._closed, timeout)
+            item, self._item = self._item, None
+            return item
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class StageStats(NamedTuple):
+    name: str
+    processed: int
+    stale: int
+    dropped: int
+    mean_ms: float
+
+
+class _Stage(threading.Thread):
+    """Runs a function on the newest item of its input queue."""
+
+    _SMOOTHING = 0.1
+
+    def __init__(self, name, function, input_queue, output_queue, max_age):
+        super().__init__(name=f"pipeline-{name}", daemon=True)
+        self._function = function
+        self._input = input_queue
+        self._output = output_queue
+        self._max_age = max_age
+        self._stopped = threading.Event()
+        self.processed = 0
+        self.stale = 0
+        self.mean_ms = 0.0
+
+    def stop(self):
+        self._stopped.set()
+
+    def _record(self, start):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.mean_ms = elapsed_ms if not self.processed else (
+            self.mean_ms + self._SMOOTHING * (elapsed_ms - self.mean_ms))
+        self.processed += 1
+
+    def run(self):
+        while not self._stopped.is_set():
+            packet = self._input.get(timeout=0.1)
+            if packet is None:
+                if self._input.closed:
+                    # The capture ended, let the next stages finish too
+                    self._output.close()
+                    break
+                continue
+            start = time.perf_counter()
+            if self._max_age is not None and start - packet.capture_time > self._max_age:
+                self.stale += 1
+                continue
+            try:
+                data = self._function(packet.data)
+            except Exception as e:
+                print(f"Error in {self.name}: {e}")
+                continue
+            self._record(start)
+            if data is not None:
+                self._output.put(packet._replace(data=data))
+
+    def stats(self):
+        return StageStats(self.name, self.processed, self.stale, self._input.dropped, self.mean_ms)
+
+
+class _CaptureStage(_Stage):
+    """Source stage that timestamps the frames of `read_frame`, unless it
+    returns their capture time itself."""
+
+    def __init__(self, read_frame, output_queue):
+        super().__init__("capture", read_frame, LatestQueue(), output_queue, None)
+
+    def run(self):
+        try:
+            while not self._stopped.is_set():
+                start = time.perf_counter()
+                result = self._function()
+                ret, frame = result[:2]
+                capture_time = result[2] if len(result) > 2 else time.perf_counter()
+                if not ret:
+                    print("Capture stopped: no more frames.")
+                    break
+                self._record(start)
+                self._output.put(Packet(self.processed, capture_time, frame))
+        except Exception as e:
+            print(f"Error in {self.name}: {e}")
+        finally:
+            # Lets the next stages finish, so that the pipeline stops running
+            self._output.close()
+
+
+class Pipeline:
+    """Capture, inference and render stages, consumed from the UI thread.
+
+    Args:
+        read_frame: Callable returning (ret, frame), e.g. VideoCapture.read,
+            or (ret, frame, capture_time) with the time.perf_counter() time
+            the frame was captured, e.g. CameraSource.read.
+        process: Inference function called with a captured frame.
+        render: Function that turns the inference result into what the UI
+            shows. Both run on their own threads and may return None to
+            drop a frame.
+        max_age: Frames older than this many seconds when a stage picks
+            them up are dropped.
+        display: Optional function called by `poll` on the UI thread with
+            the rendered data. It is timed as the display stage and may
+            return False to drop the frame.
+    """
+
+    _SMOOTHING = 0.1
+
+    def __init__(self, read_frame, process, render, max_age=0.5, display=None):
+        frames = LatestQueue()
+        results = LatestQueue()
+        self._rendered = LatestQueue()
+        self._stages = [
+            _CaptureStage(read_frame, frames),
+            _Stage("inference", process, frames, results, max_age),
+            _Stage("render", render, results, self._rendered, max_age),
+        ]
+        self._display = display
+        self._display_ms = 0.0
+        self._display_dropped = 0
+        self.displayed = 0
+        self.latency_ms = None
+        self.mean_latency_ms = None
+
+    def start(self):
+        for stage in self._stages:
+            stage.start()
+
+    def stop(self, timeout=1.0):
+        for stage in self._stages:
+            stage.stop()
+        for stage in self._stages:
+            stage.join(timeout)
+
+    @property
+    def running(self):
+        """False once the last stage stopped, e.g. at the end of a video."""
+        return self._stages[-1].is_alive()
+
+    def poll(self):
+        """Returns the newest rendered Packet, or None, without blocking.
+
+        Call it from the UI thread right before showing the frame: the
+        glass-to-glass latency is measured from capture to this call.
+        """
+        packet = self._rendered.get(timeout=0)
+        if packet is None:
+            return None
+        if self._display is not None:
+            start = time.perf_counter()
+            shown = self._display(packet.data)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._display_ms = elapsed_ms if not self.displayed else (
+                self._display_ms + self._SMOOTHING * (elapsed_ms - self._display_ms))
+            if shown is False:
+                self._display_dropped += 1
+                return None
+        self.latency_ms = (time.perf_counter() - packet.capture_time) * 1000
+        self.mean_latency_ms = self.latency_ms if self.mean_latency_ms is None else (
+            self.mean_latency_ms + self._SMOOTHING * (self.latency_ms - self.mean_latency_ms))
+        self.displayed += 1
+        return packet
+
+    def stats(self):
+        stats = [stage.stats() for stage in self._stages]
+        if self._display is not None:
+            # Frames replaced while the UI thread was busy count as dropped
+            stats.append(StageStats("display", self.displayed, self._display_dropped,
+                                    self._rendered.dropped, self._display_ms))
+        return stats
+
+    def report(self):
+        """One line summary of the latency and the per-stage timings."""
+        stages = ", ".join(
+            f"{s.name.replace('pipeline-', '')} {s.mean_ms:.1f} ms"
+            f" ({s.processed} done, {s.dropped} replaced, {s.stale} stale)"
+            for s in self.stats())
+        return (f"Glass-to-glass {self.latency_ms:.1f} ms (mean {self.mean_latency_ms:.1f} ms), "
+                f"{self.displayed} frames shown; {stages}")
@@ -0,0 +1,372 @@
+"""Pose classifiers converted once from Keras .h5 to cached TFLite models.
+
+`model.predict` builds a tf.data pipeline on every call, which costs
+milliseconds for the tiny per-pose classifiers. `load_classifier` converts
+`pose_models/<pose>/model.h5` to TFLite the first time it is used, caches the
+result on disk under the hash of the .h5 file, and returns a `TFLiteClassifier`
+that invokes the interpreter directly. `predict` keeps the Keras signature, so
+either backend can be used by the frame loop. The Keras backend stays
+available for debugging.
+
+`load_multi_classifier` merges several pose classifiers into one graph with a
+score per pose, so a free practice mode can score every pose in one call.
+
+`PoseModelRegistry` keeps a bounded LRU of loaded classifiers and can load the
+ones the user is likely to pick next in a background thread.
+"""
+import collections
+import concurrent.futures
+import gc
+import hashlib
+import os
+import threading
+import time
+from typing import NamedTuple
+
+import numpy as np
+import tensorflow as tf
+
+from interpreter_tuning import create_tuned_interpreter
+from interpreter_tuning import model_hash
+
+BACKEND_TFLITE = "tflite"
+BACKEND_KERAS = "keras"
+DEFAULT_CACHE_DIR = "./pose_models/.tflite_cache"
+
+
+def cached_tflite_path(h5_path, cache_dir=DEFAULT_CACHE_DIR):
+    """Path of the converted model, keyed by the content hash of the .h5."""
+    return os.path.join(cache_dir, f"{model_hash(h5_path)}.tflite")
+
+
+def _write_tflite(tflite_model, tflite_path):
+    # Write to a temporary file first so a crash never leaves a truncated model
+    os.makedirs(os.path.dirname(tflite_path) or ".", exist_ok=True)
+    temporary_path = f"{tflite_path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(tflite_model)
+    os.replace(temporary_path, tflite_path)
+
+
+def convert_to_tflite(h5_path, cache_dir=DEFAULT_CACHE_DIR):
+    """Converts a Keras .h5 model to TFLite unless it is already cached.
+
+    Returns:
+        str: Path of the cached TFLite model.
+    """
+    tflite_path = cached_tflite_path(h5_path, cache_dir)
+    if os.path.exists(tflite_path):
+        return tflite_path
+
+    model = tf.keras.models.load_model(h5_path, compile=False)
+    _write_tflite(tf.lite.TFLiteConverter.from_keras_model(model).convert(), tflite_path)
+    return tflite_path
+
+
+class TFLiteClassifier:
+    """Runs a converted pose classifier with the same `predict` as Keras."""
+
+    def __init__(self, tflite_path):
+        self.path = tflite_path
+        self._interpreter = create_tuned_interpreter(tflite_path)
+        self._input_details = self._interpreter.get_input_details()
+        self._output_index = self._interpreter.get_output_details()[0]["index"]
+        self._batch_size = 1
+
+    @property
+    def memory_bytes(self):
+        """Approximate memory held, i.e. the size of the flatbuffer model."""
+        return os.path.getsize(self.path)
+
+    def _input_order(self, inputs):
+        """Matches the Keras inputs to the interpreter inputs by feature size.
+
+        The converter does not keep the Keras input order, so inputs are
+        matched on their last dimension and fall back to the given order when
+        two inputs have the same size.
+        """
+        sizes = [detail["shape"][-1] for detail in self._input_details]
+        if len(set(sizes)) != len(sizes):
+            return self._input_details
+        by_size = {detail["shape"][-1]: detail for detail in self._input_details}
+        return [by_size[np.shape(value)[-1]] for value in inputs]
+
+    def _resize(self, batch_size):
+        for detail in self._input_details:
+            self._interpreter.resize_tensor_input(
+                detail["index"], [batch_size] + list(detail["shape"][1:]))
+        self._interpreter.allocate_tensors()
+        self._input_details = self._interpreter.get_input_details()
+        self._batch_size = batch_size
+
+    def predict(self, inputs, **kwargs):
+        """Classifies a batch like `tf.keras.Model.predict`.
+
+        Args:
+            inputs: List of [N, features] arrays in the Keras input order.
+            **kwargs: Ignored; accepted for compatibility with Keras.
+
+        Returns:
+            numpy.ndarray: The [N, outputs] classifier scores.
+        """
+        batch_size = len(inputs[0])
+        if batch_size != self._batch_size:
+            self._resize(batch_size)
+        for detail, value in zip(self._input_order(inputs), inputs):
+            self._interpreter.set_tensor(detail["index"], np.asarray(value, dtype=detail["dtype"]))
+        self._interpreter.invoke()
+        return self._interpreter.get_tensor(self._output_index)
+
+
+def load_classifier(h5_path, backend=BACKEND_TFLITE, cache_dir=DEFAULT_CACHE_DIR):
+    """Loads a pose classifier with the given backend.
+
+    Args:
+        h5_path: Path of the Keras .h5 model.
+        backend: BACKEND_TFLITE to run a cached TFLite conversion, or
+            BACKEND_KERAS to run the Keras model itself, e.g. for debugging.
+        cache_dir: Directory of the converted models.
+
+    Returns:
+        An object with a Keras compatible `predict`.
+    """
+    if backend == BACKEND_KERAS:
+        return tf.keras.models.load_model(h5_path)
+    if backend != BACKEND_TFLITE:
+        raise ValueError(f"Unknown classifier backend: {backend}")
+    return TFLiteClassifier(convert_to_tflite(h5_path, cache_dir))
+
+
+def merge_classifiers(h5_paths):
+    """Builds one Keras model that runs several pose classifiers side by side.
+
+    All classifiers must take the same inputs. The merged model has an
+    [N, len(h5_paths)] output with the score of each classifier.
+    """
+    models = [tf.keras.models.load_model(path, compile=False) for path in h5_paths]
+    inputs = [tf.keras.Input(shape=tuple(x.shape[1:]), name=f"input_{i}")
+              for i, x in enumerate(models[0].inputs)]
+    outputs = tf.keras.layers.Concatenate()([model(inputs) for model in models])
+    return tf.keras.Model(inputs, outputs)
+
+
+def convert_merged_to_tflite(h5_paths, cache_dir=DEFAULT_CACHE_DIR):
+    """Converts the merged classifiers to TFLite unless it is already cached.
+
+    Returns:
+        str: Path of the cached TFLite model, keyed by the hashes of all .h5 files.
+    """
+    digest = hashlib.sha256(":".join(model_hash(path) for path in h5_paths).encode())
+    tflite_path = os.path.join(cache_dir, f"merged-{digest.hexdigest()[:16]}.tflite")
+    if os.path.exists(tflite_path):
+        return tflite_path
+
+    model = merge_classifiers(h5_paths)
+    _write_tflite(tf.lite.TFLiteConverter.from_keras_model(model).convert(), tflite_path)
+    return tflite_path
+
+
+class MultiPoseClassifier:
+    """Scores every pose with one call of a merged classifier."""
+
+    def __init__(self, pose_names, model):
+        """
+        Args:
+            pose_names: Pose of each output column of the model.
+            model: Merged classifier with a Keras compatible `predict`.
+        """
+        self.pose_names = list(pose_names)
+        self._model = model
+
+    @property
+    def memory_bytes(self):
+        return model_memory_bytes(self._model)
+
+    def predict(self, inputs, **kwargs):
+        """Returns the [N, len(pose_names)] scores of all poses."""
+        return self._model.predict(inputs, **kwargs)
+
+    def recognise(self, inputs, thresholds):
+        """Finds the pose held in a single sample.
+
+        Args:
+            inputs: List of [1, features] arrays in the Keras input order.
+            thresholds: Decision threshold of each pose, in pose_names order.
+
+        Returns:
+            tuple: (pose_name, above_threshold, scores). The pose is the one
+            whose score is furthest above its threshold, relative to the room
+            left above the threshold, so that poses with very different
+            thresholds can be compared.
+        """
+        scores = np.asarray(self.predict(inputs))[0]
+        thresholds = np.asarray(thresholds, dtype=scores.dtype)
+        margins = (scores - thresholds) / np.maximum(1.0 - thresholds, 1e-6)
+        best = int(np.argmax(margins))
+        return self.pose_names[best], bool(scores[best] > thresholds[best]), scores
+
+
+def load_multi_classifier(pose_model_paths, backend=BACKEND_TFLITE, cache_dir=DEFAULT_CACHE_DIR):
+    """Loads the merged classifier of several poses.
+
+    Args:
+        pose_model_paths: Dict mapping pose names to Keras .h5 paths.
+        backend: BACKEND_TFLITE or BACKEND_KERAS, as in load_classifier.
+        cache_dir: Directory of the converted models.
+
+    Returns:
+        MultiPoseClassifier
+    """
+    pose_names = list(pose_model_paths)
+    h5_paths = [pose_model_paths[name] for name in pose_names]
+    if backend == BACKEND_KERAS:
+        return MultiPoseClassifier(pose_names, merge_classifiers(h5_paths))
+    if backend != BACKEND_TFLITE:
+        raise ValueError(f"Unknown classifier backend: {backend}")
+    return MultiPoseClassifier(pose_names, TFLiteClassifier(convert_merged_to_tflite(h5_paths, cache_dir)))
+
+
+def model_memory_bytes(model):
+    """Approximate memory held by a loaded classifier of either backend."""
+    if hasattr(model, "memory_bytes"):
+        return model.memory_bytes
+    return int(sum(np.asarray(weight).nbytes for weight in model.get_weights()))
+
+
+class ModelStats(NamedTuple):
+    """Load time and memory of a classifier held by the registry."""
+    pose_name: str
+    load_seconds: float
+    memory_bytes: int
+
+
+class PoseModelRegistry:
+    """Bounded LRU of pose classifiers with background preloading.
+
+    `preload` queues loads on a single worker thread, so they do not block
+    the UI, and `get` waits for a pending load instead of starting a second
+    one. When more than `max_models` classifiers are loaded, the least
+    recently used one is released.
+    """
+
+    def __init__(self, loader, max_models=3):
+        """
+        Args:
+            loader: Callable that loads the classifier of a pose name and
+                returns None when it fails.
+            max_models: Maximum number of classifiers kept loaded.
+        """
+        if max_models < 1:
+            raise ValueError("max_models must be at least 1.")
+        self._loader = loader
+        self._max_models = max_models
+        self._models = collections.OrderedDict()
+        self._stats = {}
+        self._pending = {}
+        # Loads in flight, from the worker thread or from `get`
+        self._loading = 0
+        self._history = collections.deque(maxlen=10)
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="pose-model-loader")
+
+    def _load(self, pose_name):
+        with self._lock:
+            self._loading += 1
+        start = time.perf_counter()
+        model = None
+        try:
+            model = self._loader(pose_name)
+        finally:
+            load_seconds = time.perf_counter() - start
+            evicted = []
+            with self._lock:
+                self._loading -= 1
+                self._pending.pop(pose_name, None)
+                if model is not None:
+                    self._models[pose_name] = model
+                    self._stats[pose_name] = ModelStats(pose_name, load_seconds, model_memory_bytes(model))
+                    while len(self._models) > self._max_models:
+                        evicted.append(self._models.popitem(last=False))
+        if model is None:
+            return None
+        for name, old_model in evicted:
+            self._released(name, old_model)
+        print(f"Loaded {pose_name} classifier in {load_seconds:.2f}s")
+        return model
+
+    def preload(self, pose_names):
+        """Starts loading the classifiers of the poses likely to be picked next.
+
+        Queued loads that were not started yet and are not in `pose_names`
+        are cancelled, so only the latest guess is loaded.
+        """
+        pose_names = list(pose_names)[:self._max_models]
+        with self._lock:
+            for name, future in list(self._pending.items()):
+                if name not in pose_names and future.cancel():
+                    del self._pending[name]
+            for name in pose_names:
+                if name not in self._models and name not in self._pending:
+                    self._pending[name] = self._executor.submit(self._load, name)
+
+    def get(self, pose_name):
+        """Returns the classifier of a pose, loading it if needed, or None."""
+        with self._lock:
+            if pose_name in self._history:
+                self._history.remove(pose_name)
+            self._history.append(pose_name)
+            if pose_name in self._models:
+                self._models.move_to_end(pose_name)
+                return self._models[pose_name]
+            future = self._pending.get(pose_name)
+        if future is not None and not future.cancelled():
+            return future.result()
+        return self._load(pose_name)
+
+    def _released(self, pose_name, model):
+        with self._lock:
+            self._stats.pop(pose_name, None)
+            # A load in flight may be building Keras layers, so the session is
+            # only cleared when nothing is loading. Holding the lock keeps a
+            # new load from starting meanwhile.
+            if (isinstance(model, tf.keras.Model) and not self._loading and not self._pending and
+                    not any(isinstance(m, tf.keras.Model) for m in self._models.values())):
+                # Drop the graph and layer name state Keras keeps globally
+                tf.keras.backend.clear_session()
+        del model
+        gc.collect()
+        print(f"Released {pose_name} classifier")
+
+    def release(self, pose_name=None):
+        """Releases one classifier, or all of them when pose_name is None."""
+        with self._lock:
+            names = list(self._models) if pose_name is None else [pose_name]
+            released = [(name, self._models.pop(name)) for name in names if name in self._models]
+        for name, model in released:
+            self._released(name, model)
+
+    def recent(self):
+        """Pose names requested with `get`, most recent first."""
+        with self._lock:
+            return list(reversed(self._history))
+
+    def loaded(self):
+        """Pose names of the loaded classifiers, least recently used first."""
+        with self._lock:
+            return list(self._models)
+
+    def stats(self):
+        """ModelStats of the loaded classifiers, least recently used first."""
+        with self._lock:
+            return [self._stats[name] for name in self._models]
+
+    @property
+    def memory_bytes(self):
+        """Approximate memory held by all loaded classifiers."""
+        return sum(stats.memory_bytes for stats in self.stats())
+
+    def shutdown(self):
+        """Cancels queued loads and releases every classifier."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.release()
@@ -0,0 +1,234 @@
+"""Per-pose decision thresholds, calibrated on recorded keypoint datasets.
+
+A pose counts as correct when its classifier scores above the pose threshold.
+`calibrate_thresholds` scores a labelled keypoint dataset with every pose
+classifier in one batched call and computes the ROC and precision/recall
+curves. For each pose it picks the lowest threshold that reaches a target
+precision, which gives the highest recall at that precision, and writes the
+results to a versioned JSON table. `load_thresholds` reads the table at
+startup; poses missing from it keep the built-in defaults.
+
+The dataset is an .npz file with:
+    keypoints: [N, 17, 3] float array of pixel (x, y, score) keypoints, as
+        returned by `data.keypoints_array`.
+    labels: [N] array with the pose name of each sample. Any name without a
+        classifier, e.g. "none", is a negative for every pose.
+
+Usage:
+    python pose_thresholds.py dataset.npz [--target-precision 0.9]
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from angle_calculator import angles_from_keypoints
+from pose_classifier import load_multi_classifier
+from preprocess import DEFAULT_ANGLE_SCALER_PATH
+from preprocess import PosePreprocessor
+from preprocess import pose_embedding
+
+DEFAULT_THRESHOLDS_PATH = "./pose_models/thresholds.json"
+DEFAULT_THRESHOLD = 0.4
+TABLE_FORMAT = 1
+
+# Hand-tuned thresholds, used for poses that were never calibrated
+DEFAULT_THRESHOLDS = {
+    "Bhujangasana": 0.75,
+    "Kumbhakasana": 0.46,
+    "Virabhadrasana": 0.3,
+    "Natarajasana": 0.092,
+    "Vrksasana": 0.83,
+    "Adhomukhasvanasana": 0.93,
+    "Trikonasana": 0.98,
+    "Utkatakonasana": 0.85,
+}
+
+
+def load_table(path=DEFAULT_THRESHOLDS_PATH):
+    """Loads the calibrated table, or None if there is none."""
+    try:
+        with open(path, "r") as f:
+            table = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if table.get("format") != TABLE_FORMAT:
+        print(f"Ignoring {path}: unsupported format {table.get('format')}")
+        return None
+    return table
+
+
+def load_thresholds(path=DEFAULT_THRESHOLDS_PATH, pose_names=()):
+    """Returns the thresholds of all poses, calibrated ones taking precedence.
+
+    Args:
+        path: Calibrated table.
+        pose_names: Poses expected to have a threshold. Those without one
+            are reported, since they use DEFAULT_THRESHOLD.
+    """
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    table = load_table(path)
+    if table is not None:
+        thresholds.update({pose: entry["threshold"] for pose, entry in table["poses"].items()})
+        print(f"Loaded pose thresholds version {table['version']} ({table['created_at']})")
+    missing = [pose for pose in pose_names if pose not in thresholds]
+    if missing:
+        print(f"No threshold for {', '.join(missing)}, using {DEFAULT_THRESHOLD}")
+    return thresholds
+
+
+def curves(scores, positives):
+    """ROC and precision/recall curves of one classifier, vectorised.
+
+    Args:
+        scores: [N] classifier scores.
+        positives: [N] boolean labels.
+
+    Returns:
+        dict of arrays over the distinct score values in decreasing order:
+        `thresholds` (a sample is positive when its score is >= the
+        threshold), `precision`, `recall` and `fpr`, plus the scalar `auc`
+        and `average_precision`.
+    """
+    order = np.argsort(-scores, kind="stable")
+    scores = scores[order]
+    positives = positives[order]
+
+    # Last index of every group of tied scores
+    ends = np.flatnonzero(np.diff(scores, append=-np.inf) != 0)
+    true_positives = np.cumsum(positives)[ends]
+    false_positives = (ends + 1) - true_positives
+    total_positives = max(int(positives.sum()), 1)
+    total_negatives = max(len(positives) - int(positives.sum()), 1)
+
+    precision = true_positives / (true_positives + false_positives)
+    recall = true_positives / total_positives
+    fpr = false_positives / total_negatives
+
+    roc_x = np.concatenate([[0.0], fpr])
+    roc_y = np.concatenate([[0.0], recall])
+    auc = float(np.sum(np.diff(roc_x) * (roc_y[1:] + roc_y[:-1]) / 2))
+    average_precision = float(np.sum(np.diff(np.concatenate([[0.0], recall])) * precision))
+    return {"thresholds": scores[ends], "precision": precision, "recall": recall,
+            "fpr": fpr, "auc": auc, "average_precision": average_precision}
+
+
+def pick_threshold(scores, positives, target_precision):
+    """Lowest threshold whose precision reaches the target.
+
+    Returns:
+        dict with the threshold and its precision and recall, or None when
+        the target precision is never reached.
+    """
+    result = curves(scores, positives)
+    reached = np.flatnonzero(result["precision"] >= target_precision)
+    if len(reached) == 0:
+        return None
+    index = reached[-1]
+    # The runtime compares with '>', so go halfway to the next lower score
+    lower = result["thresholds"][index + 1] if index + 1 < len(result["thresholds"]) else 0.0
+    return {
+        "threshold": float((result["thresholds"][index] + lower) / 2),
+        "precision": float(result["precision"][index]),
+        "recall": float(result["recall"][index]),
+        "auc": result["auc"],
+        "average_precision": result["average_precision"],
+    }
+
+
+def dataset_features(keypoints, angle_scaler_path=DEFAULT_ANGLE_SCALER_PATH):
+    """Classifier inputs of a whole [N, 17, 3] dataset at once."""
+    keypoints = np.asarray(keypoints, dtype=np.float32)
+    keypoints_input = pose_embedding(keypoints)
+    raw_angles = angles_from_keypoints(keypoints, dtype=np.float64)
+    scaled_angles = PosePreprocessor(angle_scaler_path).scale_angles(raw_angles)
+    return keypoints_input, scaled_angles
+
+
+def calibrate_thresholds(dataset_path, pose_model_paths, target_precision=0.9,
+                         table_path=DEFAULT_THRESHOLDS_PATH,
+                         angle_scaler_path=DEFAULT_ANGLE_SCALER_PATH):
+    """Calibrates the thresholds of every pose and writes a new table version.
+
+    Args:
+        dataset_path: Labelled keypoint dataset (.npz, see the module docstring).
+        pose_model_paths: Dict mapping pose names to their .h5 classifiers.
+        target_precision: Minimum precision of every threshold.
+        table_path: JSON table to write.
+        angle_scaler_path: Angle scaler used by the classifiers.
+
+    Returns:
+        dict: The written table.
+    """
+    with np.load(dataset_path) as dataset:
+        keypoints = dataset["keypoints"]
+        labels = dataset["labels"].astype(str)
+
+    inputs = dataset_features(keypoints, angle_scaler_path)
+    classifier = load_multi_classifier(pose_model_paths)
+    scores = np.asarray(classifier.predict(list(inputs)))
+
+    # Poses that cannot be calibrated now keep their entry of the previous version
+    previous = load_table(table_path)
+    poses = dict(previous["poses"]) if previous else {}
+    for column, pose in enumerate(classifier.pose_names):
+        positives = labels == pose
+        if not positives.any():
+            print(f"{pose}: no samples in the dataset, keeping the current threshold")
+            continue
+        entry = pick_threshold(scores[:, column], positives, target_precision)
+        if entry is None:
+            print(f"{pose}: precision {target_precision} is never reached, keeping the current threshold")
+            continue
+        entry["positives"] = int(positives.sum())
+        poses[pose] = entry
+        print(f"{pose}: threshold {entry['threshold']:.4f} -> precision {entry['precision']:.3f}, "
+              f"recall {entry['recall']:.3f}, ROC AUC {entry['auc']:.3f}")
+
+    with open(dataset_path, "rb") as f:
+        dataset_hash = hashlib.sha256(f.read()).hexdigest()[:16]
+    table = {
+        "format": TABLE_FORMAT,
+        "version": previous["version"] + 1 if previous else 1,
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "dataset": os.path.basename(dataset_path),
+        "dataset_hash": dataset_hash,
+        "samples": int(len(labels)),
+        "target_precision": target_precision,
+        "poses": poses,
+    }
+    os.makedirs(os.path.dirname(table_path) or ".", exist_ok=True)
+    with open(table_path, "w") as f:
+        json.dump(table, f, indent=4)
+    return table
+
+
+def main():
+    from feedback import FEEDBACK_POSES
+
+    parser = argparse.ArgumentParser(description="Calibrate the per-pose decision thresholds.")
+    parser.add_argument("dataset", help="Labelled keypoint dataset (.npz)")
+    parser.add_argument("--target-precision", type=float, default=0.9, help="Minimum precision per pose")
+    parser.add_argument("--models", default="./pose_models", help="Directory of the pose classifiers")
+    parser.add_argument("--table", default=DEFAULT_THRESHOLDS_PATH, help="Threshold table to write")
+    parser.add_argument("--scaler", default=DEFAULT_ANGLE_SCALER_PATH, help="Angle scaler of the classifiers")
+    args = parser.parse_args()
+
+    pose_model_paths = {}
+    for pose in FEEDBACK_POSES:
+        path = os.path.join(args.models, pose.lower(), "model.h5")
+        if os.path.exists(path):
+            pose_model_paths[pose] = path
+    if not pose_model_paths:
+        parser.error(f"No pose classifiers found in {args.models}")
+
+    table = calibrate_thresholds(args.dataset, pose_model_paths, args.target_precision,
+                                 args.table, args.scaler)
+    print(f"Saved version {table['version']} with {len(table['poses'])} poses to {args.table}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,21 @@
+import os
+import time
+
 import tensorflow as tf
 import numpy as np
 import joblib
 from data import BodyPart
-from angle_calculator import extract_angles_from_person
+from data import has_keypoints
+from data import keypoints_array
+from data import keypoints_to_pixels
+from angle_calculator import ANGLE_KEYS
+from angle_calculator import angles_from_keypoints
+
+DEFAULT_ANGLE_SCALER_PATH = './pose_models/angle_scaler.joblib'
+
+# The TensorFlow functions below are the reference implementation used in
+# training. The per-frame path uses the NumPy equivalents further down, which
+# give the same float32 results without eager op dispatch.
 
 def get_center_point(landmarks, left_bodypart, right_bodypart):
     """Calculates the center point of the two given landmarks."""
@@ -55,6 +68,63 @@ def landmarks_to_embedding(landmarks):
     embedding = tf.reshape(landmarks, (-1,))
     return embedding
 
+def _center_point_np(landmarks, left_bodypart, right_bodypart):
+    """NumPy version of get_center_point over the joint axis (-2)."""
+    half = np.float32(0.5)
+    return landmarks[..., left_bodypart.value, :] * half + landmarks[..., right_bodypart.value, :] * half
+
+def _norm_np(vectors):
+    """Euclidean norm over the last axis, in float32 like tf.linalg.norm."""
+    return np.sqrt(np.sum(vectors * vectors, axis=-1))
+
+def normalize_pose_landmarks_np(landmarks, torso_size_multiplier=2.5, out=None):
+    """NumPy version of normalize_pose_landmarks.
+
+    Args:
+        landmarks: [17, 2] or [N, 17, 2] float32 (x, y) coordinates.
+        torso_size_multiplier: Same as in get_pose_size.
+        out: Optional float32 array of the input shape to write the result into.
+
+    Returns:
+        numpy.ndarray: The normalized landmarks, with the input shape.
+    """
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+
+    # Move landmarks so that the pose center becomes (0,0)
+    pose_center = _center_point_np(landmarks, BodyPart.LEFT_HIP, BodyPart.RIGHT_HIP)
+    landmarks = landmarks - pose_center[..., np.newaxis, :]
+
+    # Pose size, computed on the centered landmarks as in get_pose_size
+    hips_center = _center_point_np(landmarks, BodyPart.LEFT_HIP, BodyPart.RIGHT_HIP)
+    shoulders_center = _center_point_np(landmarks, BodyPart.LEFT_SHOULDER, BodyPart.RIGHT_SHOULDER)
+    torso_size = _norm_np(shoulders_center - hips_center)
+    max_dist = np.max(_norm_np(landmarks - hips_center[..., np.newaxis, :]), axis=-1)
+    pose_size = np.maximum(torso_size * np.float32(torso_size_multiplier), max_dist)
+
+    # A pose with all keypoints on one point gives NaN, as in TensorFlow
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.divide(landmarks, np.asarray(pose_size)[..., np.newaxis, np.newaxis], out=out)
+
+def pose_embedding(keypoints, out=None):
+    """NumPy version of landmarks_to_embedding.
+
+    Args:
+        keypoints: [17, 3] (x, y, score) keypoints of one pose, or a
+            [N, 17, 3] batch of poses.
+        out: Optional contiguous float32 array of the output size to write the
+            embedding into, e.g. a [1, 34] model input buffer.
+
+    Returns:
+        numpy.ndarray: float32 embedding of shape [34], or [N, 34] for a batch.
+    """
+    keypoints = np.asarray(keypoints, dtype=np.float32)
+    if out is not None:
+        # Write through a [..., 17, 2] view of the output buffer
+        normalize_pose_landmarks_np(keypoints[..., :2], out=out.reshape(keypoints.shape[:-1] + (2,)))
+        return out
+    landmarks = normalize_pose_landmarks_np(keypoints[..., :2])  # Use only (x, y), ignore score
+    return landmarks.reshape(keypoints.shape[:-2] + (-1,))
+
 def extract_angle_features(pose):
     """
     Extract raw angle features from a Person object.
@@ -66,28 +136,15 @@ def extract_angle_features(pose):
         numpy.ndarray: Raw angle features array with shape (1, num_angles)
     """
     # Skip processing if pose is None or doesn't have keypoints
-    if pose is None or not hasattr(pose, 'keypoints'):
+    if not has_keypoints(pose):
         # Return zeros array with the expected shape for angles
         return np.zeros((1, 9))  # 9 angles
     
-    # Calculate angles
-    angles = extract_angles_from_person(pose)
-    
-    # Convert angles dictionary to a list in a consistent order
-    angle_features = [
-        angles.get('left_elbow', 0),
-        angles.get('right_elbow', 0),
-        angles.get('left_shoulder', 0),
-        angles.get('right_shoulder', 0),
-        angles.get('left_hip', 0),
-        angles.get('right_hip', 0),
-        angles.get('left_knee', 0),
-        angles.get('right_knee', 0),
-        angles.get('neck', 0)
-    ]
+    # All angles at once, in the order the classifiers expect
+    angles = angles_from_keypoints(keypoints_array(pose), dtype=np.float64)
     
-    # Convert to numpy array and reshape for model input
-    return np.array(angle_features).reshape(1, -1)
+    # Reshape for model input
+    return angles.reshape(1, -1)
 
 def extract_normalized_keypoints(pose):
     """
@@ -100,32 +157,134 @@ def extract_normalized_keypoints(pose):
         numpy.ndarray: Normalized keypoint features array with shape (1, 34)
     """
     # Skip processing if pose is None or doesn't have keypoints
-    if pose is None or not hasattr(pose, 'keypoints'):
+    if not has_keypoints(pose):
         # Return zeros array with the expected shape for normalized keypoints
         return np.zeros((1, 34))  # 17 keypoints * 2 (x,y) after normalization
     
-    # Extract raw keypoints from the pose
-    keypoint_coords = []
-    for keypoint in pose.keypoints:
-        x = keypoint.coordinate.x
-        y = keypoint.coordinate.y
-        score = keypoint.score
-        keypoint_coords.append([x, y, score])
+    # Raw [17, 3] (x, y, score) keypoints of the pose
+    keypoints = keypoints_array(pose)
     
-    # Convert to numpy array and reshape to [17, 3]
-    keypoints = np.array(keypoint_coords)
-    
-    # Convert to tensor for normalization
-    keypoints_tensor = tf.convert_to_tensor(keypoints, dtype=tf.float32)
-    
-    # Use landmarks_to_embedding to normalize keypoints
-    # This uses the same normalization as in the training code
-    normalized_keypoints = landmarks_to_embedding(keypoints_tensor).numpy()
+    # Same normalization as landmarks_to_embedding in the training code
+    normalized_keypoints = pose_embedding(keypoints)
     
     # Reshape for model input (batch size of 1)
     return normalized_keypoints.reshape(1, -1)
 
-def preprocess_for_prediction(pose, angle_scaler_path='./pose_models/angle_scaler.joblib'):
+class PosePreprocessor:
+    """Turns a Person into classifier inputs, with the angle scaler cached.
+
+    The scaler is unpickled once; a StandardScaler is folded into a NumPy
+    mean/scale pair. The file is re-read only when its modification time
+    changes, which is checked at most every `reload_check_interval` seconds.
+
+    `features_from_keypoints` and `features_from_pose` write into buffers
+    owned by the preprocessor, so their arrays are only valid until the next
+    call.
+    """
+
+    def __init__(self, angle_scaler_path=DEFAULT_ANGLE_SCALER_PATH, reload_check_interval=1.0):
+        self.angle_scaler_path = angle_scaler_path
+        self._reload_check_interval = reload_check_interval
+        self._last_check_time = None
+        self._mtime = None
+        self._scaler = None
+        self._mean = None
+        self._scale = None
+
+        # Preallocated outputs of the fused feature path
+        self._pixel_keypoints = np.empty((len(BodyPart), 3), dtype=np.float32)
+        self._keypoints_input = np.empty((1, 2 * len(BodyPart)), dtype=np.float32)
+        self._raw_angles = np.empty((1, len(ANGLE_KEYS)), dtype=np.float64)
+        self._scaled_angles = np.empty((1, len(ANGLE_KEYS)), dtype=np.float64)
+
+    def _load_scaler(self, mtime):
+        scaler = joblib.load(self.angle_scaler_path)
+        if hasattr(scaler, 'mean_') and hasattr(scaler, 'scale_'):
+            # StandardScaler.transform is (x - mean_) / scale_ for the enabled steps
+            self._mean = scaler.mean_ if scaler.with_mean else 0.0
+            self._scale = scaler.scale_ if scaler.with_std and scaler.scale_ is not None else 1.0
+            self._scaler = None
+        else:
+            self._mean = self._scale = None
+            self._scaler = scaler
+        self._mtime = mtime
+
+    def _refresh(self):
+        """Loads the scaler on first use and reloads it when the file changed."""
+        now = time.monotonic()
+        if (self._mtime is not None and
+                now - self._last_check_time < self._reload_check_interval):
+            return
+        self._last_check_time = now
+        mtime = os.stat(self.angle_scaler_path).st_mtime
+        if mtime != self._mtime:
+            self._load_scaler(mtime)
+
+    def scale_angles(self, raw_angles, out=None):
+        """Scales [N, 9] raw angles like the training scaler."""
+        self._refresh()
+        if self._scaler is not None:
+            scaled = self._scaler.transform(raw_angles)
+            if out is None:
+                return scaled
+            out[...] = scaled
+            return out
+        out = np.subtract(np.asarray(raw_angles, dtype=np.float64), self._mean, out=out)
+        return np.divide(out, self._scale, out=out)
+
+    def _features(self, keypoints):
+        """Fused features of [17, 3] pixel (x, y, score) keypoints."""
+        pose_embedding(keypoints, out=self._keypoints_input)
+        self._raw_angles[0] = angles_from_keypoints(keypoints, dtype=np.float64)
+        self.scale_angles(self._raw_angles, out=self._scaled_angles)
+        angle_dict = dict(zip(ANGLE_KEYS, self._raw_angles[0]))
+        return self._keypoints_input, self._scaled_angles, angle_dict
+
+    def features_from_keypoints(self, keypoints_with_scores, image_height, image_width):
+        """
+        Classifier inputs straight from the MoveNet output.
+
+        Args:
+            keypoints_with_scores: [17, 3] model output rows of normalized [y, x, score].
+            image_height: Height of the frame in pixels.
+            image_width: Width of the frame in pixels.
+
+        Returns:
+            tuple: (keypoints_input [1, 34], scaled_angles [1, 9], angle_dict)
+        """
+        keypoints = keypoints_to_pixels(keypoints_with_scores, image_height, image_width,
+                                        out=self._pixel_keypoints)
+        return self._features(keypoints)
+
+    def features_from_pose(self, pose):
+        """Same as features_from_keypoints for an already detected Person."""
+        return self._features(keypoints_array(pose))
+
+    def __call__(self, pose):
+        """
+        Preprocess a Person object to get model inputs.
+
+        Args:
+            pose: A Person object from MoveNet.
+
+        Returns:
+            tuple: (normalized_keypoints, scaled_angles, raw_angles) numpy arrays
+        """
+        # Get normalized keypoints (shape: [1, 34])
+        keypoints_input = extract_normalized_keypoints(pose)
+
+        # Get raw angle features
+        raw_angles = extract_angle_features(pose)
+
+        # Scale angle features using the same scaler as during training
+        scaled_angles = self.scale_angles(raw_angles)
+
+        return keypoints_input, scaled_angles, raw_angles
+
+# Shared preprocessors of preprocess_for_prediction, by scaler path
+_preprocessors = {}
+
+def preprocess_for_prediction(pose, angle_scaler_path=DEFAULT_ANGLE_SCALER_PATH):
     """
     Preprocess a Person object to get model inputs.
     
@@ -134,18 +293,9 @@ def preprocess_for_prediction(pose, angle_scaler_path='./pose_models/angle_scale
         angle_scaler_path: Path to the saved StandardScaler for angles
     
     Returns:
-        tuple: (normalized_keypoints, scaled_angles) - Two numpy arrays ready for model input
+        tuple: (normalized_keypoints, scaled_angles, raw_angles) - numpy arrays ready for model input
     """
-    # Load the angle scaler
-    angle_scaler = joblib.load(angle_scaler_path)
-    
-    # Get normalized keypoints (shape: [1, 34])
-    keypoints_input = extract_normalized_keypoints(pose)
-    
-    # Get raw angle features
-    raw_angles = extract_angle_features(pose)
-    
-    # Scale angle features using the same scaler as during training
-    scaled_angles = angle_scaler.transform(raw_angles)
-    
-    return keypoints_input, scaled_angles, raw_angles
\ No newline at end of file
+    preprocessor = _preprocessors.get(angle_scaler_path)
+    if preprocessor is None:
+        preprocessor = _preprocessors[angle_scaler_path] = PosePreprocessor(angle_scaler_path)
+    return preprocessor(pose)
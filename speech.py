@@ -0,0 +1,140 @@
+"""Spoken feedback from a single text-to-speech worker thread.
+
+`SpeechWorker` owns the pyttsx3 engine, which is created and only used on the
+worker thread. `say` never blocks: the queue holds a single pending message
+that every new message replaces, except that a normal message never replaces
+a pending priority one such as "Correct Pose!". When idle, the worker
+pre-renders the known phrases to audio files in a disk cache, so they are
+played back instead of synthesised again.
+"""
+import hashlib
+import os
+import shutil
+import subprocess
+import threading
+
+import pyttsx3
+
+try:
+    import winsound
+except ImportError:  # Not on Windows
+    winsound = None
+
+DEFAULT_CACHE_DIR = "./speech_cache"
+
+
+def _player():
+    """Function that plays a .wav file and blocks, or None if there is none."""
+    if winsound is not None:
+        return lambda path: winsound.PlaySound(path, winsound.SND_FILENAME)
+    aplay = shutil.which("aplay")
+    if aplay is not None:
+        return lambda path: subprocess.run([aplay, "-q", path], check=False)
+    return None
+
+
+class SpeechWorker(threading.Thread):
+    """Speaks the newest feedback message on its own thread.
+
+    Args:
+        phrases: Phrases to pre-render to the cache, e.g. every static
+            feedback message.
+        cache_dir: Directory of the pre-rendered audio files, None to
+            always synthesise.
+        rate: Speed of speech (words per minute).
+        volume: Volume level (0.0 to 1.0).
+    """
+
+    def __init__(self, phrases=(), cache_dir=DEFAULT_CACHE_DIR, rate=150, volume=1.0):
+        super().__init__(name="speech", daemon=True)
+        self.cache_dir = cache_dir
+        self.rate = rate
+        self.volume = volume
+        self._play = _player() if cache_dir else None
+        self._to_render = list(dict.fromkeys(phrases)) if self._play else []
+        self._condition = threading.Condition()
+        self._pending = None  # (text, priority)
+        self._speaking = False
+        self._stopped = False
+        self.spoken = 0
+        self.replaced = 0
+        self.cache_hits = 0
+
+    def say(self, text, priority=False):
+        """Queues `text`, replacing the pending message unless that one has priority."""
+        with self._condition:
+            if self._pending is not None:
+                if self._pending[1] and not priority:
+                    return
+                self.replaced += 1
+            self._pending = (text, priority)
+            self._condition.notify()
+
+    @property
+    def speaking(self):
+        """Whether a message is being spoken or waiting to be."""
+        with self._condition:
+            return self._speaking or self._pending is not None
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._pending = None
+            self._condition.notify()
+
+    def cache_path(self, text):
+        """Audio file of a phrase; the engine settings are part of the key."""
+        key = f"{self.rate}|{self.volume}|{text}".encode("utf-8")
+        return os.path.join(self.cache_dir, hashlib.sha1(key).hexdigest()[:16] + ".wav")
+
+    def run(self):
+        engine = pyttsx3.init()
+        engine.setProperty('rate', self.rate)
+        engine.setProperty('volume', self.volume)
+        if self._to_render:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+        while True:
+            with self._condition:
+                # Pre-render one phrase at a time while nothing is waiting
+                self._condition.wait_for(
+                    lambda: self._stopped or self._pending is not None or self._to_render)
+                if self._stopped:
+                    break
+                if self._pending is None:
+                    phrase = self._to_render.pop()
+                    text = None
+                else:
+                    (text, _), self._pending = self._pending, None
+                    self._speaking = True
+
+            try:
+                if text is None:
+                    self._render(engine, phrase)
+                else:
+                    self._speak(engine, text)
+            except Exception as e:
+                print(f"Speech error: {e}")
+            finally:
+                with self._condition:
+                    self._speaking = False
+
+    def _render(self, engine, phrase):
+        path = self.cache_path(phrase)
+        if not os.path.exists(path):
+            # Written next to the cache file and renamed, so a partial file is never played
+            temporary = path + ".tmp.wav"
+            engine.save_to_file(phrase, temporary)
+            engine.runAndWait()
+            if os.path.exists(temporary):
+                os.replace(temporary, path)
+
+    def _speak(self, engine, text):
+        path = self.cache_path(text) if self._play else None
+        if path is not None and os.path.exists(path):
+            self.cache_hits += 1
+            self._play(path)
+        else:
+            engine.say(text)
+            engine.runAndWait()
+        self.spoken += 1
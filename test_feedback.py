@@ -0,0 +1,146 @@
+"""Parity of the single-frame and batched feedback paths, known feedback and
+the feedback stabilizer."""
+import json
+import os
+
+import numpy as np
+import pytest
+
+from angle_calculator import ANGLE_KEYS
+from feedback import COMPILED_RULES
+from feedback import FEEDBACK_RULES
+from feedback import FeedbackStabilizer
+from feedback import angle_values
+from feedback import get_feedback
+
+
+def random_angles(rng, pose_name, count):
+    """Random angle dictionaries, biased towards the range boundaries of the pose."""
+    boundaries = sorted({float(v) for rule in FEEDBACK_RULES[pose_name].rules
+                         for v in (rule.lo, rule.hi, rule.target) + (rule.also_correct or ())
+                         if np.isfinite(v)})
+    samples = []
+    for _ in range(count):
+        angles = {}
+        for key in ANGLE_KEYS:
+            choice = rng.random()
+            if choice < 0.3:
+                angles[key] = rng.choice(boundaries)
+            elif choice < 0.35:
+                angles[key] = 0.0
+            else:
+                angles[key] = float(rng.uniform(0, 180))
+        if rng.random() < 0.1:
+            del angles[rng.choice(ANGLE_KEYS)]
+        samples.append(angles)
+    return samples
+
+
+def load_golden_cases():
+    """Feedback recorded from the hand-written functions the rule table replaced.
+
+    Each case is [pose name, angles in ANGLE_KEYS order with null for NaN,
+    messages, highlighted keypoints]. The angles are each pose's targets,
+    every range boundary and 0.5 degrees either side of it, random angles
+    and a NaN angle. The old functions ranked NaN deviations by their
+    position in the list, so only the NaN cases where they ranked as if the
+    NaN angle did not fire were recorded.
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_feedback_golden.json")
+    with open(path, encoding="utf-8") as f:
+        cases = json.load(f)
+    return [(pose_name, {key: np.nan if angle is None else angle for key, angle in zip(ANGLE_KEYS, angles)},
+             (messages, set(highlighted)))
+            for pose_name, angles, messages, highlighted in cases]
+
+
+GOLDEN_CASES = load_golden_cases()
+
+
+def pose_angles(default, **angles):
+    return {key: angles.get(key, default) for key in ANGLE_KEYS}
+
+
+@pytest.mark.parametrize("pose_name, angles, expected", [
+    ("Adhomukhasvanasana",
+     pose_angles(0, left_shoulder=120, right_shoulder=120, left_hip=80, right_hip=80, left_knee=175, right_knee=175),
+     (["Perfect pose!"], set())),
+    ("Virabhadrasana", pose_angles(170, left_knee=130),
+     (["Don't extend your left leg too much."], {'left_knee'})),
+    ("Virabhadrasana", pose_angles(170, left_knee=80),
+     (["Bend your left knee to form a right angle."], {'left_knee'})),
+    # Tied deviations keep the table order
+    ("Trikonasana", pose_angles(150, left_knee=160, right_knee=160, left_shoulder=170, right_shoulder=170),
+     (["Straighten your left leg."], {'left_knee'})),
+    ("Vrksasana", pose_angles(170, left_knee=90),
+     (["Keep your left leg strong and straight."], {'left_knee'})),
+    ("Vrksasana", pose_angles(175, left_shoulder=150, right_shoulder=150),
+     ([], set())),
+    ("Natarajasana", pose_angles(175, neck=50, right_knee=145),
+     (["Reduce the arch in your back slightly."], {'neck'})),
+    ("Unknown", pose_angles(0), (["No feedback available for this pose."], set())),
+])
+def test_known_feedback(pose_name, angles, expected):
+    assert get_feedback(pose_name, angles) == expected
+
+
+@pytest.mark.parametrize("pose_name", sorted(COMPILED_RULES))
+def test_matches_previous_feedback_functions(pose_name):
+    cases = [(angles, expected) for name, angles, expected in GOLDEN_CASES if name == pose_name]
+    assert cases
+    single = [get_feedback(pose_name, angles) for angles, _ in cases]
+    batch = COMPILED_RULES[pose_name].evaluate_batch(np.stack([angle_values(angles) for angles, _ in cases]))
+    expected = [expected for _, expected in cases]
+    assert single == expected
+    assert batch == expected
+
+
+@pytest.mark.parametrize("pose_name", sorted(COMPILED_RULES))
+def test_nan_angle_never_fires(pose_name):
+    compiled = COMPILED_RULES[pose_name]
+    samples = random_angles(np.random.default_rng(2), pose_name, 500)
+    for angles in samples:
+        angles[ANGLE_KEYS[len(angles) % len(ANGLE_KEYS)]] = np.nan
+    batch = compiled.evaluate_batch(np.stack([angle_values(angles) for angles in samples]))
+    assert [get_feedback(pose_name, angles) for angles in samples] == batch
+
+
+def test_missing_angles_count_as_zero():
+    angles = pose_angles(170, left_knee=90)
+    del angles['right_elbow']
+    assert get_feedback("Vrksasana", angles) == (["Straighten your right arm upward."], {'right_elbow'})
+
+
+@pytest.mark.parametrize("pose_name", sorted(COMPILED_RULES))
+def test_single_frame_matches_batch(pose_name):
+    compiled = COMPILED_RULES[pose_name]
+    samples = random_angles(np.random.default_rng(0), pose_name, 2000)
+    batch = compiled.evaluate_batch(np.stack([angle_values(angles) for angles in samples]))
+    assert [get_feedback(pose_name, angles) for angles in samples] == batch
+
+
+@pytest.mark.parametrize("pose_name", sorted(COMPILED_RULES))
+def test_single_frame_hysteresis_matches_arrays(pose_name):
+    compiled = COMPILED_RULES[pose_name]
+    firing = array_firing = None
+    for angles in random_angles(np.random.default_rng(1), pose_name, 2000):
+        deviations, value = compiled.deviations(angle_values(angles), array_firing)
+        array_firing = deviations >= 0
+        messages, highlighted, firing = compiled.evaluate(angles, firing)
+        assert (messages, highlighted) == compiled.select(deviations, value)
+        assert firing == array_firing.tolist()
+
+
+def test_correct_pose_ignores_hidden_messages():
+    now = [0.0]
+    stabilizer = FeedbackStabilizer(window=3, min_dwell=0.0, clock=lambda: now[0])
+    keys = set()
+    changes = 0
+    # The angles move between rules while the classifier accepts the pose
+    for left_knee in [130, 80] * 10:
+        now[0] += 0.1
+        state, changed = stabilizer.update("Virabhadrasana", pose_angles(170, left_knee=left_knee), True)
+        keys.add(state.key)
+        changes += changed
+    assert keys == {(True, True, ())}
+    assert changes == 1
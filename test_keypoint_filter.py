@@ -0,0 +1,31 @@
+"""Detection cadence of PoseFilter."""
+import numpy as np
+import pytest
+
+from data import pose_from_keypoint_array
+from keypoint_filter import PoseFilter
+
+
+class StaticMovenet:
+    """Detector that always finds the same confident pose."""
+
+    def __init__(self):
+        rng = np.random.default_rng(0)
+        keypoints = np.column_stack([rng.uniform(100, 300, size=(17, 2)), np.full(17, 0.9)])
+        self.person = pose_from_keypoint_array(keypoints)
+        self.calls = 0
+
+    def detect(self, image):
+        self.calls += 1
+        return self.person
+
+
+@pytest.mark.parametrize("detect_every, expected_calls", [(1, 12), (2, 6), (3, 4)])
+def test_detects_once_every_detect_every_frames(detect_every, expected_calls):
+    movenet = StaticMovenet()
+    pose_filter = PoseFilter(movenet, detect_every=detect_every)
+    image = np.zeros((480, 640, 3), dtype=np.uint8)
+    for frame in range(12):
+        pose_filter.detect(image, timestamp=frame / 30)
+    assert movenet.calls == expected_calls
+    assert pose_filter.detection_ratio == pytest.approx(1 / detect_every)
@@ -0,0 +1,73 @@
+"""The NumPy pose embedding against the TensorFlow one of the training code."""
+import numpy as np
+import pytest
+
+from preprocess import landmarks_to_embedding
+from preprocess import normalize_pose_landmarks_np
+from preprocess import pose_embedding
+
+
+def random_poses(count, seed=0):
+    """[count, 17, 3] pixel (x, y, score) keypoints."""
+    rng = np.random.default_rng(seed)
+    poses = rng.uniform(0, 480, size=(count, 17, 3)).astype(np.float32)
+    poses[..., 2] = rng.uniform(0, 1, size=(count, 17))
+    return poses
+
+
+def reference_embedding(keypoints):
+    return landmarks_to_embedding(keypoints).numpy()
+
+
+def test_single_pose_matches_tensorflow():
+    keypoints = random_poses(1)[0]
+    embedding = pose_embedding(keypoints)
+    assert embedding.shape == (34,)
+    assert embedding.dtype == np.float32
+    np.testing.assert_array_equal(embedding, reference_embedding(keypoints))
+
+
+def test_batch_matches_tensorflow():
+    poses = random_poses(16, seed=1)
+    embeddings = pose_embedding(poses)
+    assert embeddings.shape == (16, 34)
+    for embedding, keypoints in zip(embeddings, poses):
+        np.testing.assert_array_equal(embedding, reference_embedding(keypoints))
+    normalized = normalize_pose_landmarks_np(poses[..., :2])
+    np.testing.assert_array_equal(normalized.reshape(16, 34), embeddings)
+
+
+def test_output_buffer():
+    poses = random_poses(4, seed=2)
+    out = np.empty((4, 34), dtype=np.float32)
+    assert pose_embedding(poses, out=out) is out
+    np.testing.assert_array_equal(out, pose_embedding(poses))
+
+
+@pytest.mark.parametrize("keypoints", [
+    # Every keypoint on one point, so the pose size is zero
+    np.tile(np.float32([100, 200, 0.5]), (17, 1)),
+    np.zeros((17, 3), dtype=np.float32),
+])
+def test_degenerate_pose_is_nan_like_tensorflow(keypoints):
+    with np.errstate(all='raise'):
+        embedding = pose_embedding(keypoints)
+    reference = reference_embedding(keypoints)
+    assert np.isnan(reference).all()
+    np.testing.assert_array_equal(embedding, reference)
+
+
+def test_nan_keypoint_matches_tensorflow():
+    keypoints = random_poses(1, seed=3)[0]
+    keypoints[5, 0] = np.nan
+    # assert_array_equal treats NaNs in the same places as equal
+    np.testing.assert_array_equal(pose_embedding(keypoints), reference_embedding(keypoints))
+
+
+def test_degenerate_pose_in_batch_leaves_others_intact():
+    poses = random_poses(3, seed=4)
+    poses[1] = 0
+    embeddings = pose_embedding(poses)
+    assert np.isnan(embeddings[1]).all()
+    for i in (0, 2):
+        np.testing.assert_array_equal(embeddings[i], reference_embedding(poses[i]))
@@ -0,0 +1,69 @@
+"""Track ids of the multi-person trackers and the feedback kept per track."""
+import numpy as np
+import pytest
+
+from data import pose_from_keypoint_array
+from feedback import TrackedFeedback
+from tracker import BoundingBoxTracker
+from tracker import KeypointTracker
+from tracker import TrackerConfig
+
+# A standing pose centred on (0, 0), 17 (x, y) keypoints in pixels
+_TEMPLATE = np.random.default_rng(0).uniform([-40, -120], [40, 120], size=(17, 2))
+_TEMPLATE -= _TEMPLATE.mean(axis=0)
+
+
+def person_at(x, y):
+    keypoints = np.column_stack([_TEMPLATE + (x, y), np.full(17, 0.9)])
+    return pose_from_keypoint_array(keypoints)
+
+
+def two_people(frame):
+    """Two people walking towards each other, listed in alternating order.
+
+    Returns:
+        [(name, person)]
+    """
+    people = [('alice', person_at(150 + 6 * frame, 240)), ('bob', person_at(500 - 6 * frame, 250))]
+    return people if frame % 2 else people[::-1]
+
+
+def is_alice(person):
+    return person.coordinates[:, 1].mean() < 245
+
+
+@pytest.mark.parametrize("tracker_class", [BoundingBoxTracker, KeypointTracker])
+def test_ids_stay_stable_for_two_people_moving(tracker_class):
+    tracker = tracker_class()
+    ids = {'alice': set(), 'bob': set()}
+    for frame in range(20):
+        names, persons = zip(*two_people(frame))
+        for name, person in zip(names, tracker.apply(list(persons), timestamp=frame * 33)):
+            ids[name].add(person.id)
+    assert len(ids['alice']) == 1
+    assert len(ids['bob']) == 1
+    assert ids['alice'] != ids['bob']
+    assert sorted(tracker.track_ids) == sorted(ids['alice'] | ids['bob'])
+
+
+def test_tracked_feedback_per_track():
+    tracker = BoundingBoxTracker(TrackerConfig(max_age=100))
+    # Alice holds the pose, Bob does not
+    tracked_feedback = TrackedFeedback(lambda person: (is_alice(person), {}),
+                                       min_dwell=0.0, clock=lambda: 0.0)
+    for frame in range(5):
+        persons = tracker.apply([person for _, person in two_people(frame)], timestamp=frame * 33)
+        results = tracked_feedback.update("Vrksasana", persons, tracker.track_ids)
+    correct = {is_alice(person): results[person.id][0].pose_correct for person in persons}
+    assert correct == {True: True, False: False}
+    assert len(tracked_feedback) == 2
+
+    # Bob leaves: his stabilizer outlives the missed frames until the track expires
+    alice = [person_at(200, 240)]
+    persons = tracker.apply(alice, timestamp=5 * 33)
+    tracked_feedback.update("Vrksasana", persons, tracker.track_ids)
+    assert len(tracked_feedback) == 2
+    persons = tracker.apply(alice, timestamp=10 * 33)
+    results = tracked_feedback.update("Vrksasana", persons, tracker.track_ids)
+    assert len(tracked_feedback) == 1
+    assert list(results) == [persons[0].id]
@@ -0,0 +1,199 @@
+# Copyright 2021 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Trackers that assign stable ids to the persons detected in a video."""
+
+import abc
+from typing import List, NamedTuple
+
+from data import Person
+from data import keypoints_array
+import numpy as np
+
+
+class TrackerConfig(NamedTuple):
+  """Parameters shared by all trackers.
+
+  max_tracks: Maximum number of tracks kept at the same time.
+  max_age: Time in milliseconds after which an unmatched track is dropped.
+  min_similarity: Minimum similarity for a detection to join a track.
+  keypoint_confidence_threshold: Keypoints below this score are ignored by the
+    keypoint tracker.
+  keypoint_falloff: Per-keypoint falloff constants of the object keypoint
+    similarity (OKS), in the BodyPart order.
+  min_number_of_keypoints: Minimum number of confident keypoints shared by a
+    detection and a track for the keypoint tracker to compare them.
+  """
+  max_tracks: int = 18
+  max_age: int = 1000
+  min_similarity: float = 0.15
+  keypoint_confidence_threshold: float = 0.3
+  keypoint_falloff: tuple = (0.026, 0.025, 0.025, 0.035, 0.035, 0.079, 0.079,
+                             0.072, 0.072, 0.062, 0.062, 0.107, 0.107, 0.087,
+                             0.087, 0.089, 0.089)
+  min_number_of_keypoints: int = 4
+
+
+class Track(object):
+  """A tracked person and the time it was last matched."""
+
+  def __init__(self, person: Person, last_timestamp: int) -> None:
+    self.person = person
+    self.last_timestamp = last_timestamp
+
+
+class Tracker(abc.ABC):
+  """Base class that greedily matches detections to tracks.
+
+  Subclasses only define the similarity between detections and tracks.
+  """
+
+  def __init__(self, config: TrackerConfig = TrackerConfig()) -> None:
+    self._config = config
+    self._tracks = []
+    self._next_track_id = 0
+
+  def apply(self, persons: List[Person], timestamp: int) -> List[Person]:
+    """Assigns track ids to the persons detected at `timestamp`.
+
+    Args:
+      persons: Persons detected in the current frame.
+      timestamp: Time of the frame in milliseconds.
+
+    Returns:
+      The same persons with their `id` field set to the matched track id.
+    """
+    self._filter_old_tracks(timestamp)
+    if not persons:
+      return []
+
+    similarity = self._compute_similarity(persons)
+    return self._assign_tracks(persons, similarity, timestamp)
+
+  @property
+  def track_ids(self) -> List[int]:
+    """Ids of the live tracks, including the ones unmatched in the last frame."""
+    return [track.person.id for track in self._tracks]
+
+  @abc.abstractmethod
+  def _compute_similarity(self, persons: List[Person]) -> np.ndarray:
+    """Returns a [len(persons), len(tracks)] similarity matrix."""
+
+  def _filter_old_tracks(self, timestamp: int) -> None:
+    """Drops the tracks that have not been matched for too long."""
+    self._tracks = [
+        track for track in self._tracks
+        if timestamp - track.last_timestamp <= self._config.max_age
+    ]
+
+  def _assign_tracks(self, persons: List[Person], similarity: np.ndarray,
+                     timestamp: int) -> List[Person]:
+    """Greedily matches the most similar detection/track pairs first."""
+    assigned_ids = [None] * len(persons)
+    matched_tracks = set()
+    if similarity.size:
+      similarity = np.where(similarity >= self._config.min_similarity,
+                            similarity, -1.0)
+      for flat_index in np.argsort(-similarity, axis=None):
+        person_idx, track_idx = np.unravel_index(flat_index, similarity.shape)
+        if similarity[person_idx, track_idx] < 0:
+          break
+        if assigned_ids[person_idx] is not None or track_idx in matched_tracks:
+          continue
+        matched_tracks.add(track_idx)
+        track = self._tracks[track_idx]
+        assigned_ids[person_idx] = track.person.id
+        track.person = persons[person_idx]._replace(id=track.person.id)
+        track.last_timestamp = timestamp
+
+    # Start new tracks for the unmatched detections.
+    for person_idx, person in enumerate(persons):
+      if assigned_ids[person_idx] is None:
+        assigned_ids[person_idx] = self._next_track_id
+        self._tracks.append(
+            Track(person._replace(id=self._next_track_id), timestamp))
+        self._next_track_id += 1
+
+    # Keep the most recently matched tracks.
+    if len(self._tracks) > self._config.max_tracks:
+      self._tracks.sort(key=lambda track: track.last_timestamp, reverse=True)
+      del self._tracks[self._config.max_tracks:]
+
+    return [
+        person._replace(id=track_id)
+        for person, track_id in zip(persons, assigned_ids)
+    ]
+
+
+class BoundingBoxTracker(Tracker):
+  """Tracks persons by the intersection over union of their bounding boxes."""
+
+  def _compute_similarity(self, persons: List[Person]) -> np.ndarray:
+    if not self._tracks:
+      return np.zeros((len(persons), 0), dtype=np.float32)
+
+    def boxes(people):
+      return np.array([[
+          p.bounding_box.start_point.x, p.bounding_box.start_point.y,
+          p.bounding_box.end_point.x, p.bounding_box.end_point.y
+      ] for p in people], dtype=np.float32)
+
+    detections = boxes(persons)[:, None, :]
+    tracks = boxes([track.person for track in self._tracks])[None, :, :]
+
+    intersection_w = np.clip(
+        np.minimum(detections[..., 2], tracks[..., 2]) -
+        np.maximum(detections[..., 0], tracks[..., 0]), 0, None)
+    intersection_h = np.clip(
+        np.minimum(detections[..., 3], tracks[..., 3]) -
+        np.maximum(detections[..., 1], tracks[..., 1]), 0, None)
+    intersection = intersection_w * intersection_h
+
+    def area(box):
+      return (box[..., 2] - box[..., 0]) * (box[..., 3] - box[..., 1])
+
+    union = area(detections) + area(tracks) - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-6), 0.0)
+
+
+class KeypointTracker(Tracker):
+  """Tracks persons by the object keypoint similarity (OKS) of their poses."""
+
+  def _compute_similarity(self, persons: List[Person]) -> np.ndarray:
+    if not self._tracks:
+      return np.zeros((len(persons), 0), dtype=np.float32)
+
+    config = self._config
+    detections = np.stack([keypoints_array(p) for p in persons])[:, None]
+    tracks = np.stack([keypoints_array(t.person) for t in self._tracks])[None]
+
+    confident = ((detections[..., 2] > config.keypoint_confidence_threshold) &
+                 (tracks[..., 2] > config.keypoint_confidence_threshold))
+    num_keypoints = confident.sum(axis=-1)
+
+    # The area of the track's confident keypoints normalizes the distances.
+    track_points = np.broadcast_to(tracks[..., :2], confident.shape + (2,))
+    mask = confident[..., None]
+    extent = (np.where(mask, track_points, -np.inf).max(axis=-2) -
+              np.where(mask, track_points, np.inf).min(axis=-2))
+    extent = np.where(num_keypoints[..., None] > 0, extent, 0.0)
+    area = extent[..., 0] * extent[..., 1] + 1e-6
+
+    squared_distance = np.sum(
+        (detections[..., :2] - tracks[..., :2])**2, axis=-1)
+    falloff = np.asarray(config.keypoint_falloff, dtype=np.float32)
+    oks = np.exp(-squared_distance / (2 * area[..., None] * falloff**2))
+    oks = np.sum(np.where(confident, oks, 0.0), axis=-1) / np.maximum(
+        num_keypoints, 1)
+
+    return np.where(num_keypoints >= config.min_number_of_keypoints, oks, 0.0)